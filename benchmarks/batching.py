@@ -0,0 +1,99 @@
+"""Throughput of concurrent searches and the batch sizes of the models, by concurrency.
+
+Clients send searches through a Scheduler with few workers, as run.py does. Models are
+offline stubs that also sleep, releasing the GIL as torch does, for a fixed cost per
+call and a smaller one per input, so that batching pays off as with real models. Each
+concurrency is measured with requests holding their worker while they wait for a batch,
+as before the scheduler freed it, and with the slot freed. Reports searches per second,
+latency percentiles and the histograms of batch sizes, by number of requests.
+
+    python -m benchmarks.batching --concurrency 1 2 8 32 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from crawler.retriever import Retriever
+from crawler.scheduler import Scheduler
+
+from .corpus import StubCrossEncoder, StubEncoder, synthetic_corpus
+from .lexical import percentiles
+
+
+class SlowEncoder(StubEncoder):
+    def __init__(self, call_seconds: float, input_seconds: float):
+        super().__init__()
+        self.call_seconds = call_seconds
+        self.input_seconds = input_seconds
+
+    def encode(self, texts, **kwargs):
+        time.sleep(self.call_seconds + self.input_seconds * (1 if isinstance(texts, str) else len(texts)))
+        return super().encode(texts, **kwargs)
+
+
+class SlowCrossEncoder(StubCrossEncoder):
+    def __init__(self, call_seconds: float, input_seconds: float):
+        self.call_seconds = call_seconds
+        self.input_seconds = input_seconds
+
+    def predict(self, pairs, **kwargs):
+        time.sleep(self.call_seconds + self.input_seconds * len(pairs))
+        return super().predict(pairs, **kwargs)
+
+
+async def clients(scheduler: Scheduler, retriever: Retriever, queries: list, concurrency: int) -> list:
+    latencies = []
+
+    async def client(offset: int):
+        for q in queries[offset::concurrency]:
+            start = time.perf_counter()
+            # Keys are unique, coalescing is not measured here.
+            await scheduler(object(), retriever.documents, q, 10)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*[client(offset) for offset in range(concurrency)])
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=2_000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 8, 32])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--call-ms", type=float, default=20.0)
+    parser.add_argument("--input-ms", type=float, default=0.2)
+    args = parser.parse_args()
+
+    corpus, text = synthetic_corpus(args.documents)
+    retriever = Retriever(documents=corpus, encoder=StubEncoder(), cross_encoder=StubCrossEncoder())
+    retriever._encoder = SlowEncoder(args.call_ms / 1000, args.input_ms / 1000)
+    retriever._cross_encoder = SlowCrossEncoder(args.call_ms / 1000, args.input_ms / 1000)
+    queries = [text(3) for _ in range(args.queries)]
+
+    report = {"documents": args.documents, "workers": args.workers, "runs": []}
+    for concurrency in args.concurrency:
+        for mode, slots in (("holding", args.workers), ("freed", max(concurrency, args.workers))):
+            retriever._batchers()
+            scheduler = Scheduler(workers=args.workers, timeout=600, concurrency=slots)
+            start = time.perf_counter()
+            latencies = asyncio.run(clients(scheduler, retriever, queries, concurrency))
+            seconds = time.perf_counter() - start
+            scheduler.shutdown()
+            batching = retriever.batching_statistics()
+            report["runs"].append(
+                {
+                    "concurrency": concurrency,
+                    "mode": mode,
+                    "searches_per_second": len(latencies) / seconds,
+                    **percentiles(latencies),
+                    "encoder_batches": batching["encoder"]["requests"],
+                    "cross_encoder_batches": batching["cross_encoder"]["requests"],
+                }
+            )
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
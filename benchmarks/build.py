@@ -0,0 +1,75 @@
+"""Full rebuild of the pipeline, in sequence in one process, and as stages run by the
+index build in worker processes.
+
+The sequential build runs get_extra_tags, get_tags_triples and Pipeline one after the
+other, as run.py did. The index build runs the same steps as a graph of stages, with
+extra tags and the sparse index built in one shard per worker. Reports the wall time of
+both, and for the index build the seconds of each stage and the critical path, the
+longest chain of dependent stages, which is its wall time with enough cores. Extra tags are skipped when
+neural_search is not installed.
+
+    python -m benchmarks.build --documents 10000 --workers 1 4
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from crawler.pipeline import Pipeline
+from crawler.pipeline.build import index_build
+from crawler.tags import get_extra_tags, get_tags_triples
+
+from .corpus import StubEncoder, synthetic_corpus
+
+EXCLUDED_TAGS = {"hackernews": True, "github": True, "google-research": True}
+
+
+def sequential(corpus: dict, extra_tags: bool) -> dict:
+    stages = {}
+    start = time.perf_counter()
+    if extra_tags:
+        corpus = get_extra_tags(data=corpus)
+        stages["extra_tags"] = time.perf_counter() - start
+    triples = get_tags_triples(data=corpus, excluded_tags=EXCLUDED_TAGS)
+    stages["triples"] = time.perf_counter() - start - sum(stages.values())
+    pipeline = Pipeline(documents=corpus, triples=triples, excluded_tags=EXCLUDED_TAGS, encoder=StubEncoder())
+    pipeline.speller
+    stages["pipeline"] = time.perf_counter() - start - sum(stages.values())
+    return {"wall_seconds": time.perf_counter() - start, "stages": stages}
+
+
+def staged(corpus: dict, workers: int, extra_tags: bool) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        build = index_build(
+            corpus,
+            excluded_tags=EXCLUDED_TAGS,
+            directory=directory,
+            workers=workers,
+            extra_tags=extra_tags,
+            encoder=StubEncoder(),
+        )
+        build("pipeline")
+        summary = build.summary()
+        summary["wall_seconds"] = time.perf_counter() - start
+        summary["stages"] = {name: round(timing["seconds"], 3) for name, timing in summary["stages"].items()}
+        return {"workers": workers, **summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    corpus, _ = synthetic_corpus(args.documents)
+    try:
+        report = {"documents": args.documents, "extra_tags": True, "sequential": sequential(corpus, True)}
+    except ImportError:
+        report = {"documents": args.documents, "extra_tags": False, "sequential": sequential(corpus, False)}
+    report["staged"] = [staged(corpus, workers, report["extra_tags"]) for workers in args.workers]
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
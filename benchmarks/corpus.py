@@ -0,0 +1,105 @@
+"""Synthetic corpora and offline stub models for the benchmarks."""
+import hashlib
+import itertools
+import random
+import re
+import typing
+
+import numpy as np
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+_WORDS = re.compile(r"\w+")
+
+
+def scale(name: str) -> int:
+    """Number of documents of a scale name such as 10k, or of a plain number."""
+    return SCALES[name.lower()] if name.lower() in SCALES else int(name)
+
+
+def synthetic_documents(n_documents: int, vocabulary_size: int = 20_000, seed: int = 0):
+    """Documents with a Zipfian word distribution, close to the shape of the real corpus."""
+    rng = random.Random(seed)
+    words = [
+        "".join(rng.choices(_LETTERS, k=rng.randint(3, 11)))
+        for _ in range(vocabulary_size)
+    ]
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(vocabulary_size)))
+
+    def text(n_words):
+        return " ".join(rng.choices(words, cum_weights=weights, k=n_words))
+
+    documents = [
+        {
+            "title": text(rng.randint(4, 12)),
+            "tags": text(rng.randint(2, 6)),
+            "summary": text(rng.randint(40, 80)),
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+        for _ in range(n_documents)
+    ]
+    return documents, text
+
+
+def synthetic_corpus(n_documents: int, n_tags: int = 5_000, seed: int = 0):
+    """Documents keyed by url, in the format of database/database.json.
+
+    Tags are hyphenated words drawn from a Zipfian tag vocabulary, like the tags of the
+    crawlers. Also returns a query generator drawing from the same words.
+    """
+    documents, text = synthetic_documents(n_documents=n_documents, seed=seed)
+    rng = random.Random(seed + 1)
+    tags = [
+        "-".join(text(1) for _ in range(rng.choice([1, 1, 2, 2, 3])))
+        for _ in range(n_tags)
+    ]
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(n_tags)))
+
+    corpus = {}
+    for idx, document in enumerate(documents):
+        corpus[f"https://example.com/{idx}"] = {
+            "title": document["title"],
+            "summary": document["summary"],
+            "date": document["date"],
+            "tags": sorted(set(rng.choices(tags, cum_weights=weights, k=rng.randint(1, 5)))),
+            "extra-tags": [],
+        }
+    return corpus, text
+
+
+def _vector(word: str, dimension: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+
+class StubEncoder:
+    """Offline stand-in for SentenceTransformer: normalized sums of random word vectors."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.vectors = {}
+
+    def encode(self, texts: typing.Union[str, typing.List[str]], **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        embeddings = np.zeros((1 if single else len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate([texts] if single else texts):
+            for word in _WORDS.findall(text.lower()):
+                vector = self.vectors.get(word)
+                if vector is None:
+                    vector = self.vectors[word] = _vector(word, self.dimension)
+                embeddings[row] += vector
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-9)
+        return embeddings[0] if single else embeddings
+
+
+class StubCrossEncoder:
+    """Offline stand-in for CrossEncoder: share of query words found in the document."""
+
+    def predict(self, pairs: typing.List[typing.List[str]], **kwargs) -> np.ndarray:
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        for row, (query, document) in enumerate(pairs):
+            words = set(_WORDS.findall(query.lower()))
+            if words:
+                scores[row] = len(words & set(_WORDS.findall(document.lower()))) / len(words)
+        return scores
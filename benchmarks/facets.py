@@ -0,0 +1,83 @@
+"""Lexical retrieval with tag and date filters, against unfiltered retrieval and
+filtering its results afterwards.
+
+Filters are a frequent tag, a frequent tag with a month, and two tags. Reports the size
+and build time of the facet bitmaps, the latency of each kind of query and the number of
+matching candidates found by pre-filtering and by post-filtering the unfiltered ones.
+
+    python -m benchmarks.facets --documents 10000 100000
+"""
+import argparse
+import collections
+import json
+import random
+import time
+
+from crawler.index import Facets
+from crawler.retriever import Retriever
+
+from .corpus import StubCrossEncoder, StubEncoder, synthetic_corpus
+from .lexical import percentiles
+
+
+def benchmark(n_documents: int, args) -> dict:
+    corpus, text = synthetic_corpus(n_documents)
+    retriever = Retriever(documents=corpus, encoder=StubEncoder(), cross_encoder=StubCrossEncoder())
+
+    start = time.perf_counter()
+    facets = Facets()
+    facets.add(retriever.table.tag_offsets, retriever.table.tag_postings, [document["date"] for document in corpus.values()])
+    report = {
+        "documents": n_documents,
+        "facets": {
+            "build_seconds": time.perf_counter() - start,
+            "bytes": facets.nbytes,
+            "tags": len(facets.tags),
+            "buckets": len(facets.buckets),
+        },
+    }
+
+    frequencies = collections.Counter(tag for document in corpus.values() for tag in document["tags"])
+    frequent = [tag for tag, _ in frequencies.most_common(20)]
+    rng = random.Random(1)
+    queries = [text(rng.randint(1, 4)) for _ in range(args.queries)]
+    filters = {
+        "tag": lambda: {"tags": [rng.choice(frequent)]},
+        "tag_month": lambda: {"tags": [rng.choice(frequent)], "dates": [f"2024-{rng.randint(1, 12):02d}"]},
+        "two_tags": lambda: {"tags": rng.sample(frequent[:5], 2)},
+    }
+
+    latencies = collections.defaultdict(list)
+    found = collections.defaultdict(int)
+    for q in queries:
+        start = time.perf_counter()
+        unfiltered = retriever.candidates(q)
+        latencies["unfiltered"].append(time.perf_counter() - start)
+
+        for name, draw in filters.items():
+            selected = draw()
+            start = time.perf_counter()
+            documents = retriever.candidates(q, filters=selected)
+            latencies[f"{name}_prefilter"].append(time.perf_counter() - start)
+            found[f"{name}_prefilter"] += len(documents)
+
+            allowed = retriever.allowed(selected)
+            found[f"{name}_postfilter"] += sum(
+                bool(allowed[retriever.url_to_row[document["url"]]]) for document in unfiltered
+            )
+
+    report["latencies"] = {name: percentiles(values) for name, values in latencies.items()}
+    report["candidates"] = {name: count / len(queries) for name, count in found.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps([benchmark(n, args) for n in args.documents], indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Precomputed 3D layout of the tag graph, against networkx's spring layout.
+
+Reports the layout time and size, and its quality as the median distance of random
+pairs of nodes over the median length of edges. The client pins the nodes of /plot at
+the layout coordinates, so it runs no simulation. For the subgraphs of /plot, a
+replica of the client's d3 simulation reports the ticks and the motion shown that the
+layout saves, and both layouts are compared on the spread of link lengths (standard
+deviation over mean) and on the distance of the closest nodes.
+
+    python -m benchmarks.graph_layout --documents 1000 10000 100000
+"""
+import argparse
+import collections
+import json
+import random
+import time
+
+import networkx as nx
+import numpy as np
+
+from crawler.graph import Graph
+from crawler.graph.layout import LINK_DISTANCE, layout
+from crawler.tags import get_tags_triples
+
+from .corpus import synthetic_corpus
+
+
+def spread(positions: np.ndarray, edges: np.ndarray, rng: np.random.Generator) -> float:
+    pairs = rng.integers(0, len(positions), size=(10_000, 2))
+    edge_lengths = np.linalg.norm(positions[edges[:, 0]] - positions[edges[:, 1]], axis=1)
+    pair_lengths = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    return float(np.median(pair_lengths) / np.median(edge_lengths))
+
+
+def d3_positions(n: int) -> np.ndarray:
+    """Initial positions of d3-force-3d, a spiral on a sphere of radius 10 * cbrt(i)."""
+    i = np.arange(n)
+    radius = 10 * np.cbrt(0.5 + i)
+    roll = i * np.pi * (3 - np.sqrt(5))
+    yaw = i * np.pi * 20 / (9 + np.sqrt(221))
+    return np.stack(
+        [radius * np.sin(roll) * np.cos(yaw), radius * np.cos(roll), radius * np.sin(roll) * np.sin(yaw)], axis=1
+    )
+
+
+def shape(positions: np.ndarray, pairs: np.ndarray) -> dict:
+    lengths = np.linalg.norm(positions[pairs[:, 0]] - positions[pairs[:, 1]], axis=1)
+    distances = np.linalg.norm(positions[:, None, :] - positions[None, :, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+    return {"link_spread": float(lengths.std() / lengths.mean()), "closest": float(distances.min())}
+
+
+def simulate(positions: np.ndarray, pairs: np.ndarray, warmup: int = 50) -> dict:
+    """Ticks of d3-force-3d with the forces and decays of the client: links, many-body, center."""
+    positions = positions.astype(np.float64).copy()
+    velocities = np.zeros_like(positions)
+    counts = np.bincount(pairs.ravel(), minlength=len(positions))
+    strengths = 1 / np.minimum(counts[pairs[:, 0]], counts[pairs[:, 1]])
+    bias = counts[pairs[:, 0]] / (counts[pairs[:, 0]] + counts[pairs[:, 1]])
+
+    alpha, tick, moved, settled = 1.0, 0, 0.0, None
+    while alpha >= 0.001:
+        alpha += -alpha * 0.02
+        delta = positions[pairs[:, 1]] + velocities[pairs[:, 1]] - positions[pairs[:, 0]] - velocities[pairs[:, 0]]
+        lengths = np.linalg.norm(delta, axis=1) + 1e-9
+        delta *= ((lengths - LINK_DISTANCE) / lengths * alpha * strengths)[:, None]
+        np.add.at(velocities, pairs[:, 1], -delta * bias[:, None])
+        np.add.at(velocities, pairs[:, 0], delta * (1 - bias)[:, None])
+
+        delta = positions[None, :, :] - positions[:, None, :]
+        squares = np.maximum((delta**2).sum(axis=2), 1.0)
+        velocities += (delta * (-30 * alpha / squares)[:, :, None]).sum(axis=1)
+
+        velocities *= 1 - 0.3
+        positions += velocities
+        positions -= positions.mean(axis=0)
+        if tick >= warmup:
+            step = float(np.linalg.norm(velocities, axis=1).mean())
+            moved += step
+            if settled is None and step < 0.1:
+                settled = tick - warmup
+        tick += 1
+    return {
+        "ticks": tick,
+        "moved": moved,
+        "settled_tick": tick - warmup if settled is None else settled,
+        **shape(positions, pairs),
+    }
+
+
+def plot_simulation(graph: Graph, corpus: dict, args, rng: random.Random) -> dict:
+    results = collections.defaultdict(lambda: collections.defaultdict(list))
+    documents = list(corpus.values())
+    for _ in range(args.queries):
+        counts = collections.Counter(tag for document in rng.sample(documents, 10) for tag in document["tags"])
+        tags = [tag for tag, _ in counts.most_common(args.k_tags)]
+        nodes, links = graph(tags=tags, retrieved_tags=[], k_yens=1)
+        index = {node["id"]: idx for idx, node in enumerate(nodes)}
+        if not links or any("x" not in node for node in nodes):
+            continue
+        pairs = np.asarray([(index[link["source"]], index[link["target"]]) for link in links])
+        pinned = np.asarray([(node["x"], node["y"], node["z"]) for node in nodes])
+        for name, metrics in [
+            ("layout", {"ticks": 0, "moved": 0.0, "settled_tick": 0, **shape(pinned, pairs)}),
+            ("d3", simulate(d3_positions(len(nodes)), pairs)),
+        ]:
+            for metric, value in metrics.items():
+                results[name][metric].append(value)
+    return {
+        name: {metric: float(np.mean(values)) for metric, values in metrics.items()}
+        for name, metrics in results.items()
+    }
+
+
+def benchmark(n_documents: int, args) -> dict:
+    corpus, _ = synthetic_corpus(n_documents, n_tags=max(n_documents // 2, 500))
+    graph = Graph(triples=get_tags_triples(data=corpus), n_landmarks=0, layout=False)
+    edges = np.asarray(list(graph.graph.edges()))
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    graph.positions = layout(graph.graph, iterations=args.iterations)
+    report = {
+        "documents": n_documents,
+        "nodes": graph.graph.number_of_nodes(),
+        "edges": graph.graph.number_of_edges(),
+        "layout": {
+            "seconds": time.perf_counter() - start,
+            "bytes": graph.positions.nbytes,
+            "spread": spread(graph.positions, edges, rng),
+        },
+    }
+
+    if graph.graph.number_of_nodes() <= args.max_networkx_nodes:
+        start = time.perf_counter()
+        positions = nx.spring_layout(graph.graph, dim=3, seed=0)
+        report["networkx"] = {
+            "seconds": time.perf_counter() - start,
+            "spread": spread(np.asarray([positions[node] for node in range(len(positions))]), edges, rng),
+        }
+
+    report["plot_simulation"] = plot_simulation(graph, corpus, args, random.Random(0))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k-tags", type=int, default=10)
+    parser.add_argument("--max-networkx-nodes", type=int, default=5_000)
+    args = parser.parse_args()
+    print(json.dumps([benchmark(n, args) for n in args.documents], indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Path queries of /plot on the tag graph, with networkx and with the landmark (ALT) index.
+
+Tag pairs are drawn as plot draws them, among the most frequent tags of a few random
+documents, which are mostly hubs, and uniformly among all tags. Reports the landmark
+build time and size, the pairs pruned before any search, the latency of Graph.yens per
+pair and whether both return paths of the same costs.
+
+    python -m benchmarks.graph_paths --documents 1000 10000 100000
+"""
+import argparse
+import collections
+import itertools
+import json
+import random
+import time
+
+import networkx as nx
+
+from crawler.graph import Graph, Landmarks
+from crawler.tags import get_tags_triples
+
+from .corpus import synthetic_corpus
+from .lexical import percentiles
+
+
+def plot_pairs(graph: Graph, corpus: dict, n_queries: int, k_tags: int, rng: random.Random):
+    documents = list(corpus.values())
+    pairs = []
+    for _ in range(n_queries):
+        counts = collections.Counter(
+            tag for document in rng.sample(documents, 10) for tag in document["tags"]
+        )
+        nodes = [graph.node_to_idx[tag] for tag, _ in counts.most_common(k_tags) if tag in graph.node_to_idx]
+        pairs.extend(itertools.combinations(nodes, 2))
+    return pairs
+
+
+def run(graph: Graph, pairs, k_yens: int):
+    elapsed, paths = [], []
+    for start, end in pairs:
+        begin = time.perf_counter()
+        paths.append(graph.yens(start=start, end=end, k=k_yens))
+        elapsed.append(time.perf_counter() - begin)
+    return elapsed, paths
+
+
+def cost(graph: nx.Graph, path) -> float:
+    return sum(graph[u][v]["weight"] for u, v in zip(path[:-1], path[1:]))
+
+
+def benchmark(n_documents: int, args) -> dict:
+    corpus, _ = synthetic_corpus(n_documents, n_tags=max(n_documents // 2, 500))
+    graph = Graph(triples=get_tags_triples(data=corpus), n_landmarks=0)
+    degrees = sorted((degree for _, degree in graph.graph.degree()), reverse=True)
+
+    start = time.perf_counter()
+    landmarks = Landmarks(graph.graph, n_landmarks=args.landmarks)
+    report = {
+        "documents": n_documents,
+        "nodes": graph.graph.number_of_nodes(),
+        "edges": graph.graph.number_of_edges(),
+        "max_degree": degrees[0] if degrees else 0,
+        "median_degree": degrees[len(degrees) // 2] if degrees else 0,
+        "landmarks": {
+            "count": len(landmarks.landmarks),
+            "build_seconds": time.perf_counter() - start,
+            "bytes": sum(
+                array.nbytes
+                for array in (landmarks.distances, landmarks.hops, landmarks.components,
+                              landmarks.indptr, landmarks.indices, landmarks.weights)
+            ),
+        },
+    }
+
+    rng = random.Random(0)
+    nodes = list(graph.graph.nodes)
+    for name, pairs in [
+        ("plot_pairs", plot_pairs(graph, corpus, args.queries, args.k_tags, rng)),
+        ("random_pairs", [tuple(rng.sample(nodes, 2)) for _ in range(args.random_pairs)]),
+    ]:
+        graph.landmarks = None
+        baseline, expected = run(graph, pairs, args.k_yens)
+        graph.landmarks = landmarks
+        elapsed, found = run(graph, pairs, args.k_yens)
+        report[name] = {
+            "pairs": len(pairs),
+            "pruned": sum(not landmarks.within(start, end, max_hops=3) for start, end in pairs),
+            "networkx": {"seconds": sum(baseline), **percentiles(baseline)},
+            "landmarks": {"seconds": sum(elapsed), **percentiles(elapsed)},
+            "speedup": sum(baseline) / max(sum(elapsed), 1e-9),
+            "same_costs": sum(
+                sorted(cost(graph.graph, path) for path in a) == sorted(cost(graph.graph, path) for path in b)
+                for a, b in zip(expected, found)
+            ),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--k-tags", type=int, default=10)
+    parser.add_argument("--k-yens", type=int, default=1)
+    parser.add_argument("--random-pairs", type=int, default=200)
+    parser.add_argument("--landmarks", type=int, default=48)
+    args = parser.parse_args()
+    print(json.dumps([benchmark(n, args) for n in args.documents], indent=4))
+
+
+if __name__ == "__main__":
+    main()
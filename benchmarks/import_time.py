@@ -0,0 +1,50 @@
+"""Import time of the API process and of the crawler modules, from python -X importtime.
+
+    python -m benchmarks.import_time --modules run crawler.pipeline --top 15
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+
+def import_time(module: str):
+    """Imports a module in a fresh interpreter and returns its imports by cumulative time."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imports.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+
+    total = next((row for row in imports if row["module"] == module), None)
+    return {
+        "total_ms": total["cumulative_ms"] if total is not None else None,
+        "error": process.stderr.strip().splitlines()[-1] if process.returncode else None,
+        "imports": sorted(imports, key=lambda row: -row["cumulative_ms"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", nargs="+", default=["run", "crawler.pipeline", "crawler.index"])
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    report = {}
+    for module in args.modules:
+        result = import_time(module)
+        result["imports"] = result["imports"][: args.top]
+        report[module] = result
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Incremental add and remove on the sparse index and the pipeline against a rebuild.
+
+Indexes a base corpus, adds batches of new documents as delta segments, removes some
+documents, and compares the top k of every lexical view with an index rebuilt from the
+live documents. Reports the time of each step and the share of queries whose top k is
+identical, before and after merging the segments.
+
+A pipeline, with its graph laid out, then gets a batch of documents added and removed
+again along with some of the base ones. Reports the time of each step and whether the
+edges and weights of the graph are those of a graph built from the live documents.
+
+    python -m benchmarks.incremental --documents 10000 --batches 30 500
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from crawler.graph import Graph
+from crawler.index import SparseIndex
+from crawler.pipeline import Pipeline
+from crawler.tags import get_tags_triples
+
+from .corpus import StubCrossEncoder, StubEncoder, synthetic_corpus, synthetic_documents
+from .lexical import FIELDS, VIEWS
+
+
+def agreement(index: SparseIndex, rebuilt: SparseIndex, rows: list, queries: list) -> dict:
+    """Share of queries whose top k rows and scores are those of the rebuilt index."""
+    report = {}
+    for name, (fields, ngram_range, k) in VIEWS.items():
+        identical = 0
+        for q in queries:
+            found = index.search(q=q, fields=fields, ngram_range=ngram_range, k=k)
+            expected = rebuilt.search(q=q, fields=fields, ngram_range=ngram_range, k=k)
+            identical += [row for row, _ in found] == [rows[row] for row, _ in expected] and np.allclose(
+                [score for _, score in found], [score for _, score in expected], atol=1e-6
+            )
+        report[name] = identical / len(queries)
+    return report
+
+
+def edges(graph: Graph) -> dict:
+    """Weights of the edges of a graph, keyed by the names of their nodes."""
+    return {
+        frozenset((graph.idx_to_node[head], graph.idx_to_node[tail])): weight
+        for head, tail, weight in graph.graph.edges(data="weight")
+    }
+
+
+def pipeline(n_documents: int, batch: int, remove_every: int) -> dict:
+    """Adds a batch of documents to a pipeline, removes them with some base documents, and
+    compares the graph with a rebuild."""
+    corpus, _ = synthetic_corpus(n_documents + batch)
+    urls = list(corpus)
+    base = {url: corpus[url] for url in urls[:n_documents]}
+    knowledge_pipeline = Pipeline(
+        documents=base,
+        triples=get_tags_triples(data=base),
+        encoder=StubEncoder(),
+        cross_encoder=StubCrossEncoder(),
+    )
+    report = {"documents": n_documents, "batch": batch}
+
+    start = time.perf_counter()
+    knowledge_pipeline.add(documents={url: corpus[url] for url in urls[n_documents:]})
+    report["add_s"] = time.perf_counter() - start
+
+    removed = urls[n_documents:] + urls[:n_documents:remove_every]
+    start = time.perf_counter()
+    knowledge_pipeline.remove(urls=removed)
+    report["remove_s"] = time.perf_counter() - start
+
+    graph = knowledge_pipeline.graph
+    live = {url: base[url] for url in base if url not in set(removed)}
+    report["graph_identical"] = edges(graph) == edges(Graph(triples=get_tags_triples(data=live), layout=False))
+    report["positions"] = graph.positions is not None and len(graph.positions) > max(graph.graph.nodes)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--batches", type=int, nargs="+", default=[30, 500])
+    parser.add_argument("--remove-every", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--pipeline-documents", type=int, default=3_000)
+    parser.add_argument("--pipeline-batch", type=int, default=30)
+    args = parser.parse_args()
+
+    documents, text = synthetic_documents(args.documents + sum(args.batches))
+    queries = [text(length) for length in np.random.default_rng(0).integers(1, 6, args.queries)]
+
+    start = time.perf_counter()
+    index = SparseIndex(documents=documents[: args.documents], fields=FIELDS)
+    for fields, ngram_range, _ in VIEWS.values():
+        index.statistics(fields=fields, ngram_range=ngram_range, k1=1.5, b=0.75)
+    report = {"documents": args.documents, "build_s": time.perf_counter() - start, "add_s": []}
+
+    n_rows = args.documents
+    for batch in args.batches:
+        start = time.perf_counter()
+        index.add(documents[n_rows : n_rows + batch])
+        index.refresh()
+        report["add_s"].append(time.perf_counter() - start)
+        n_rows += batch
+
+    removed = list(range(0, n_rows, args.remove_every))
+    start = time.perf_counter()
+    index.remove(removed)
+    index.refresh()
+    report["remove_s"] = time.perf_counter() - start
+
+    rows = sorted(set(range(n_rows)) - set(removed))
+    start = time.perf_counter()
+    rebuilt = SparseIndex(documents=[documents[row] for row in rows], fields=FIELDS)
+    report["rebuild_s"] = time.perf_counter() - start
+
+    report["segments"] = len(index.segments)
+    report["identical"] = agreement(index, rebuilt, rows, queries)
+    index.merge()
+    report["identical_merged"] = agreement(index, rebuilt, rows, queries)
+    report["pipeline"] = pipeline(args.pipeline_documents, args.pipeline_batch, args.remove_every)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Latency of the lexical stage by query length, with and without MaxScore pruning.
+
+Also compares the top k with the lexical retrievers used before the shared index:
+lenlp's BM25Vectorizer with its own char_wb analyzer and normalizer, on the fields
+joined by spaces. Its n-grams span words, which those of the index do not, so rankings
+differ. Reports the share of queries whose top k rows are identical, and the share of
+the rows of the lenlp top k found in the top k of the index. The comparison is skipped
+when lenlp is not installed.
+
+    python -m benchmarks.lexical --documents 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from crawler.index import SparseIndex
+
+from .corpus import synthetic_documents
+
+FIELDS = ["title", "tags", "summary", "date"]
+
+VIEWS = {
+    "union-4-7": (FIELDS, (4, 7), 100),
+    "union-2-5": (FIELDS, (2, 5), 20),
+    "tags-4-7": (["tags"], (4, 7), 60),
+}
+
+
+def percentiles(latencies):
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def baseline(documents, fields, ngram_range, k):
+    """Top k rows of a query as the lenlp retrievers ranked them, ties broken by row."""
+    from lenlp.sparse import BM25Vectorizer
+
+    vectorizer = BM25Vectorizer(normalize=True, analyzer="char_wb", ngram_range=ngram_range, k1=1.5, b=0.75)
+    matrix = vectorizer.fit_transform([" ".join(document[field] for field in fields) for document in documents])
+
+    def top_k(q):
+        scores = np.asarray((matrix @ vectorizer.transform([q]).T).todense()).ravel()
+        rows = np.flatnonzero(scores > 0)
+        return rows[np.lexsort((rows, -scores[rows]))][:k].tolist()
+
+    return top_k
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[1, 2, 3, 5, 8])
+    args = parser.parse_args()
+
+    documents, text = synthetic_documents(args.documents)
+
+    start = time.perf_counter()
+    index = SparseIndex(documents=documents, fields=FIELDS, ngram_range=(2, 7))
+    report = {"documents": args.documents, "build_s": time.perf_counter() - start, "views": {}}
+
+    for name, (fields, ngram_range, k) in VIEWS.items():
+        index.statistics(fields=fields, ngram_range=ngram_range, k1=1.5, b=0.75)
+        try:
+            lenlp = baseline(documents, fields, ngram_range, k)
+        except ImportError:
+            lenlp = None
+        report["views"][name] = {}
+        for length in args.lengths:
+            queries = [text(length) for _ in range(args.queries)]
+            latencies = {True: [], False: []}
+            identical, agreeing, overlap = True, 0, 0.0
+            for q in queries:
+                results = {}
+                for pruning in (True, False):
+                    start = time.perf_counter()
+                    results[pruning] = index.search(
+                        q=q, fields=fields, ngram_range=ngram_range, k=k, pruning=pruning
+                    )
+                    latencies[pruning].append(time.perf_counter() - start)
+                identical &= results[True] == results[False]
+                if lenlp is not None:
+                    expected = lenlp(q)
+                    rows = [row for row, _ in results[True]]
+                    agreeing += rows == expected
+                    overlap += len(set(rows) & set(expected)) / max(len(expected), 1)
+
+            report["views"][name][length] = {
+                "maxscore": percentiles(latencies[True]),
+                "exhaustive": percentiles(latencies[False]),
+                "identical": identical,
+            }
+            if lenlp is not None:
+                report["views"][name][length]["lenlp_identical"] = agreeing / len(queries)
+                report["views"][name][length]["lenlp_overlap"] = overlap / len(queries)
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
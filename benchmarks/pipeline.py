@@ -0,0 +1,160 @@
+"""End-to-end benchmark of the pipeline on synthetic corpora, with offline stub models.
+
+Times the construction stages, from near-duplicate detection to the graph,
+Pipeline.search, Pipeline.plot and get_extra_tags, and reports throughput,
+p50/p95/p99 latencies and peak RSS as JSON. Each scale runs in its own process, so
+peak RSS is per scale.
+
+    python -m benchmarks.pipeline --scales 1k 10k 100k
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from crawler.dedup import deduplicate
+from crawler.graph import Graph
+from crawler.index import SparseIndex, TagIndex
+from crawler.pipeline import Pipeline
+from crawler.retriever import Retriever
+from crawler.spelling import Speller, general_dictionary
+from crawler.tags import get_extra_tags, get_tags_triples
+
+from .corpus import StubCrossEncoder, StubEncoder, scale, synthetic_corpus
+from .lexical import percentiles
+
+EXCLUDED_TAGS = {"hackernews": True, "github": True, "google-research": True}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process, ru_maxrss is in kilobytes on Linux."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, {"seconds": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+
+
+def latencies(function, queries):
+    """Latency percentiles and sequential throughput of a function over queries."""
+    elapsed = []
+    start = time.perf_counter()
+    for q in queries:
+        begin = time.perf_counter()
+        function(q)
+        elapsed.append(time.perf_counter() - begin)
+    total = time.perf_counter() - start
+    return {"queries": len(queries), "throughput_qps": len(queries) / total, **percentiles(elapsed)}
+
+
+def benchmark(n_documents: int, args) -> dict:
+    report = {"documents": n_documents, "stages": {}}
+    (corpus, text), report["stages"]["corpus"] = timed(synthetic_corpus, n_documents)
+    documents = [{"url": url, **document} for url, document in corpus.items()]
+    encoder, cross_encoder = StubEncoder(), StubCrossEncoder()
+
+    if args.stages:
+        _, report["stages"]["dedup"] = timed(deduplicate, corpus)
+        _, report["stages"]["embedding"] = timed(
+            encoder.encode, [f"{document['title']} {document['summary']}" for document in documents]
+        )
+        _, report["stages"]["index"] = timed(
+            SparseIndex,
+            documents=Retriever._index_documents(documents),
+            fields=["title", "tags", "summary", "date"],
+            ngram_range=(2, 7),
+        )
+        frequencies = {}
+        for document in documents:
+            for tag in set(document["tags"]):
+                frequencies[tag] = frequencies.get(tag, 0) + 1
+        _, report["stages"]["tags_index"] = timed(TagIndex, frequencies)
+        _, report["stages"]["spelling"] = timed(
+            Speller.from_documents, documents, general=general_dictionary()
+        )
+        triples, report["stages"]["triples"] = timed(
+            get_tags_triples, data=corpus, excluded_tags=EXCLUDED_TAGS
+        )
+        _, report["stages"]["graph"] = timed(Graph, triples=triples)
+    else:
+        triples = get_tags_triples(data=corpus, excluded_tags=EXCLUDED_TAGS)
+
+    pipeline, report["stages"]["pipeline"] = timed(
+        Pipeline,
+        documents=corpus,
+        triples=triples,
+        excluded_tags=EXCLUDED_TAGS,
+        encoder=encoder,
+        cross_encoder=cross_encoder,
+    )
+
+    rng = random.Random(1)
+    queries = [text(rng.randint(1, 4)) for _ in range(args.queries)]
+    pipeline.warmup()
+    report["search"] = latencies(lambda q: pipeline.search(q=q), queries)
+    report["search_tags"] = latencies(lambda q: pipeline.search(q=q, tags=True), queries)
+    # Plot reuses the ranking of a preceding search, the cache is cleared to time it alone.
+    pipeline.retriever._forget_ranked()
+    report["plot"] = latencies(
+        lambda q: pipeline.plot(q=q, k_tags=args.k_tags, k_yens=1), queries[: args.plot_queries]
+    )
+    pipeline.retriever._forget_ranked()
+    report["plot_rerank"] = latencies(
+        lambda q: pipeline.plot(q=q, k_tags=args.k_tags, k_yens=1, rerank=True), queries[: args.plot_queries]
+    )
+
+    sample = dict(rng.sample(sorted(corpus.items()), min(args.extra_tags_documents, len(corpus))))
+    try:
+        _, report["stages"]["extra_tags"] = timed(get_extra_tags, data=sample)
+        report["stages"]["extra_tags"]["documents"] = len(sample)
+    except ImportError as error:
+        report["stages"]["extra_tags"] = {"error": str(error)}
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", nargs="+", default=["1k", "10k"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--plot-queries", type=int, default=20)
+    parser.add_argument("--k-tags", type=int, default=20)
+    parser.add_argument("--extra-tags-documents", type=int, default=1_000)
+    parser.add_argument(
+        "--no-stages",
+        dest="stages",
+        action="store_false",
+        help="Only time the whole pipeline construction, the stages build everything twice.",
+    )
+    args = parser.parse_args()
+
+    if len(args.scales) == 1:
+        print(json.dumps(benchmark(scale(args.scales[0]), args), indent=4))
+        return
+
+    reports = {}
+    for name in args.scales:
+        command = [
+            sys.executable, "-m", "benchmarks.pipeline",
+            "--scales", name,
+            "--queries", str(args.queries),
+            "--plot-queries", str(args.plot_queries),
+            "--k-tags", str(args.k_tags),
+            "--extra-tags-documents", str(args.extra_tags_documents),
+        ] + ([] if args.stages else ["--no-stages"])
+        process = subprocess.run(command, capture_output=True, text=True)
+        if process.returncode:
+            reports[name] = {"error": process.stderr.strip().splitlines()[-1]}
+        else:
+            reports[name] = json.loads(process.stdout)
+    print(json.dumps(reports, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Payload size and latency of /plot in the JSON and compact wire formats, whole and streamed.
+
+    python -m benchmarks.plot_wire --documents 10000 --k-tags 10 20 40
+"""
+import argparse
+import collections
+import gzip
+import json
+import random
+import time
+
+import numpy as np
+import orjson
+
+from crawler.graph import Graph, GraphEncoder
+from crawler.tags import get_tags_triples
+
+from .corpus import synthetic_documents
+from .lexical import percentiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k-tags", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--k-yens", type=int, default=1)
+    args = parser.parse_args()
+
+    documents, _ = synthetic_documents(args.documents)
+    data = {
+        str(idx): {"tags": document["tags"].split(), "extra-tags": []}
+        for idx, document in enumerate(documents)
+    }
+    graph = Graph(triples=get_tags_triples(data=data))
+    rng = random.Random(0)
+
+    report = {"documents": args.documents, "nodes": graph.graph.number_of_nodes(), "k_tags": {}}
+    for k_tags in args.k_tags:
+        sizes = collections.defaultdict(list)
+        latencies = collections.defaultdict(list)
+        for _ in range(args.queries):
+            # The tags of plot come from the top documents of a query.
+            counts = collections.Counter(
+                tag for document in rng.sample(list(data.values()), 10) for tag in document["tags"]
+            )
+            tags = [tag for tag, _ in counts.most_common(k_tags)]
+
+            start = time.perf_counter()
+            nodes, links = graph(tags=tags, retrieved_tags=[], k_yens=args.k_yens)
+            latencies["graph"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            payload = orjson.dumps({"nodes": nodes, "links": links})
+            latencies["json_encode"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            compact = orjson.dumps(GraphEncoder()(nodes=nodes, links=links))
+            latencies["compact_encode"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            stream = graph.stream(tags=tags, retrieved_tags=[], k_yens=args.k_yens)
+            first = orjson.dumps(GraphEncoder()(*next(stream)))
+            latencies["stream_first_increment"].append(time.perf_counter() - start)
+            for _ in stream:
+                pass
+
+            sizes["json_bytes"].append(len(payload))
+            sizes["compact_bytes"].append(len(compact))
+            sizes["json_gzip_bytes"].append(len(gzip.compress(payload)))
+            sizes["compact_gzip_bytes"].append(len(gzip.compress(compact)))
+            sizes["stream_first_increment_bytes"].append(len(first))
+
+        report["k_tags"][k_tags] = {
+            "sizes": {name: float(np.mean(values)) for name, values in sizes.items()},
+            "latencies": {name: percentiles(values) for name, values in latencies.items()},
+        }
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
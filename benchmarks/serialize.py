@@ -0,0 +1,92 @@
+"""Serialization of /search responses: FastAPI's default encoder, json, orjson, and
+fragments of JSON serialized once per document when the index is loaded.
+
+Responses hold the top_k documents of BM25 and their facets. FastAPI's encoder converts
+the response with jsonable_encoder, then json.dumps, as /search did, json.dumps alone is
+what /stream/search did, and /search now returns orjson. Fragments are joined in ranked
+order and inserted in the response with orjson.Fragment. Also reports the time and
+memory taken to serialize every document beforehand.
+
+    python -m benchmarks.serialize --documents 10000 --top-k 100
+"""
+import argparse
+import json
+import time
+
+import orjson
+
+from crawler.retriever import Retriever
+
+from .corpus import StubCrossEncoder, StubEncoder, synthetic_corpus
+from .lexical import percentiles
+
+
+def fastapi_encoder():
+    from fastapi.encoders import jsonable_encoder
+
+    def encode(documents, facets):
+        content = jsonable_encoder({"documents": documents, "facets": facets})
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    return encode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus, text = synthetic_corpus(args.documents)
+    retriever = Retriever(documents=corpus, encoder=StubEncoder(), cross_encoder=StubCrossEncoder())
+
+    start = time.perf_counter()
+    fragments = {
+        document["url"]: orjson.dumps(document)
+        for document in retriever.table.documents(range(len(retriever.table)))
+    }
+    fragments_seconds = time.perf_counter() - start
+
+    def joined(documents):
+        return b"[" + b",".join([fragments[document["url"]] for document in documents]) + b"]"
+
+    responses = []
+    while len(responses) < args.queries:
+        documents = retriever.candidates(text(1))[: args.top_k]
+        if len(documents) == args.top_k:
+            responses.append((documents, retriever.facet_counts(documents)))
+
+    encoders = {
+        "json": lambda documents, facets: json.dumps({"documents": documents, "facets": facets}).encode("utf-8"),
+        "orjson": lambda documents, facets: orjson.dumps({"documents": documents, "facets": facets}),
+        "fragments": lambda documents, facets: orjson.dumps(
+            {"documents": orjson.Fragment(joined(documents)), "facets": facets}
+        ),
+    }
+    try:
+        encoders = {"fastapi": fastapi_encoder(), **encoders}
+    except ImportError:
+        pass
+
+    report = {
+        "documents": args.documents,
+        "top_k": args.top_k,
+        "fragments_seconds": fragments_seconds,
+        "fragments_mb": sum(map(len, fragments.values())) / 2**20,
+        "table_mb": retriever.table.nbytes / 2**20,
+        "response_kb": len(encoders["orjson"](*responses[0])) / 1024,
+        "encoders": {},
+    }
+    for name, encode in encoders.items():
+        latencies = []
+        for documents, facets in responses:
+            start = time.perf_counter()
+            encode(documents, facets)
+            latencies.append(time.perf_counter() - start)
+        report["encoders"][name] = percentiles(latencies)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
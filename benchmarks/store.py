@@ -0,0 +1,78 @@
+"""Size and read latency of the content store by block size.
+
+Stores the full text of synthetic pages, of 300 to 3000 words, with one zstd frame per
+page (block size 1) and with larger blocks. Reports the size on disk against the text
+stored as JSON, as database/database.json would hold it, the write time, the latency of
+reading random pages and the throughput of reading every page in storage order, as an
+offline re-tagging does.
+
+Synthetic pages draw words at random from a Zipfian vocabulary, so they compress less
+than real pages, whose sentences repeat across documents.
+
+    python -m benchmarks.store --documents 10000 --block-sizes 1 16384 65536 262144
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from crawler.store import ContentStore
+
+from .corpus import synthetic_documents
+from .lexical import percentiles
+
+
+def benchmark(pages: dict, block_size: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        store = ContentStore(os.path.join(directory, "content"), block_size=block_size, level=args.level)
+        store.update(pages)
+        store.flush()
+        report = {"block_size": block_size, "write_seconds": time.perf_counter() - start}
+        report["blocks"] = len(store.blocks)
+        report["stored_mb"] = (
+            sum(os.path.getsize(os.path.join(store.path, name)) for name in os.listdir(store.path)) / 2**20
+        )
+
+        rng = random.Random(0)
+        urls = list(pages)
+        store = ContentStore(store.path, block_size=block_size, level=args.level)
+        latencies = []
+        for url in rng.choices(urls, k=args.reads):
+            start = time.perf_counter()
+            store.get(url)
+            latencies.append(time.perf_counter() - start)
+        report["random_read"] = percentiles(latencies)
+
+        start = time.perf_counter()
+        size = sum(len(text) for _, text in store.items())
+        report["scan_mb_per_second"] = size / 2**20 / (time.perf_counter() - start)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[1, 16 * 1024, 64 * 1024, 256 * 1024])
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--reads", type=int, default=2_000)
+    args = parser.parse_args()
+
+    _, text = synthetic_documents(args.documents)
+    rng = random.Random(1)
+    pages = {f"https://example.com/{idx}": text(rng.randint(300, 3000)) for idx in range(args.documents)}
+    report = {
+        "documents": args.documents,
+        "text_mb": sum(len(page.encode("utf-8")) for page in pages.values()) / 2**20,
+        "json_mb": len(json.dumps(pages).encode("utf-8")) / 2**20,
+        "stores": [benchmark(pages, block_size, args) for block_size in args.block_sizes],
+    }
+    for store in report["stores"]:
+        store["ratio"] = report["json_mb"] / store["stored_mb"]
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Memory of the documents held by the API, as dictionaries and in the columnar table.
+
+The documents of a synthetic corpus and their embeddings are pickled as the pipeline
+is, with crawler.pipeline.shared, in each layout. A fresh process then loads them as the
+API does, and reports its resident memory before and after loading, and after reading
+every document once, which maps every page of the table. The dictionaries layout is the
+one of the retriever before the table: a dictionary per document, with its own tag
+strings, and an embedding array per url.
+
+    python -m benchmarks.table --documents 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from crawler.pipeline import shared
+from crawler.table import DocumentTable
+
+from .corpus import StubEncoder, synthetic_corpus
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def dump(n_documents: int, directory: str) -> dict:
+    corpus, _ = synthetic_corpus(n_documents)
+    documents = [{"url": url, **document} for url, document in corpus.items()]
+    embeddings = StubEncoder().encode(
+        [f"{document['title']} {document['summary']}" for document in documents]
+    )
+
+    report = {}
+    start = time.perf_counter()
+    table = DocumentTable(documents)
+    report["table_build_seconds"] = time.perf_counter() - start
+    report["table_mb"] = table.nbytes / 2**20
+
+    shared.dump(
+        (documents, {document["url"]: embedding for document, embedding in zip(documents, embeddings)}),
+        os.path.join(directory, "dicts.pkl"),
+    )
+    shared.dump((table, embeddings), os.path.join(directory, "table.pkl"))
+    for layout in ("dicts", "table"):
+        path = os.path.join(directory, f"{layout}.pkl")
+        report[f"{layout}_file_mb"] = shared.nbytes(path) / 2**20
+    return report
+
+
+def load(layout: str, directory: str) -> dict:
+    report = {"start_rss_mb": rss_mb()}
+    start = time.perf_counter()
+    documents, embeddings = shared.load(os.path.join(directory, f"{layout}.pkl"))
+    report["load_seconds"] = time.perf_counter() - start
+    report["loaded_rss_mb"] = rss_mb()
+
+    start = time.perf_counter()
+    if layout == "dicts":
+        for document in documents:
+            embeddings[document["url"]].sum()
+    else:
+        for row in range(len(documents)):
+            documents[row]
+        embeddings.sum()
+    report["scan_seconds"] = time.perf_counter() - start
+    report["scanned_rss_mb"] = rss_mb()
+    report["documents_rss_mb"] = report["scanned_rss_mb"] - report["start_rss_mb"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--load", choices=["dicts", "table"], default=None)
+    parser.add_argument("--directory", default=None)
+    args = parser.parse_args()
+
+    if args.load is not None:
+        print(json.dumps(load(args.load, args.directory)))
+        return
+
+    reports = []
+    for n_documents in args.documents:
+        with tempfile.TemporaryDirectory() as directory:
+            report = {"documents": n_documents, **dump(n_documents, directory)}
+            for layout in ("dicts", "table"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.table", "--load", layout, "--directory", directory],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                report[layout] = json.loads(output)
+        reports.append(report)
+    print(json.dumps(reports, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,13 @@ __all__ = [
     "retriever",
     "graph",
     "pipeline",
-    "googleresearch"
+    "googleresearch",
+    "index",
+    "spelling",
+    "scheduler",
+    "metrics",
+    "crawl",
+    "dedup",
+    "table",
+    "store"
 ]
\ No newline at end of file
@@ -0,0 +1,5 @@
+from .checkpoint import Checkpoint
+from .ratelimit import RateLimiter
+from .telemetry import Telemetry
+
+__all__ = ["Checkpoint", "RateLimiter", "Telemetry"]
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import threading
+import time
+import typing
+from typing import Dict, Optional
+
+__all__ = ["Checkpoint"]
+
+
+class Checkpoint:
+    """State of a crawl saved to a JSON file, so an interrupted crawl resumes where it stopped.
+
+    Holds the pages already crawled, the urls already processed and their results. A
+    checkpoint saved with another key, such as other categories, is ignored. The file is
+    replaced atomically, at most every `interval` seconds while documents are added and
+    after each page, and removed once the crawl completes.
+
+    Parameters
+    ----------
+    path
+        JSON file of the checkpoint, no state is saved when None.
+    key
+        Identifies the crawl configuration the state belongs to.
+    interval
+        Minimum number of seconds between two saves while adding documents.
+    before_save
+        Called before each save, to make durable what the saved urls depend on, such
+        as their stored texts.
+
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        key: str = "",
+        interval: float = 5.0,
+        before_save: Optional[typing.Callable[[], None]] = None,
+    ):
+        self.path = path
+        self.key = key
+        self.interval = interval
+        self.before_save = before_save
+        self.pages = set()
+        self.urls = set()
+        self.results = {}
+        self.logger = logging.getLogger(__name__)
+        self._saved = time.monotonic()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return
+        if state.get("key") != self.key:
+            self.logger.info(f"Ignoring checkpoint {self.path} of another crawl")
+            return
+        self.pages = set(state["pages"])
+        self.urls = set(state["urls"])
+        self.results = state["results"]
+        self.logger.info(
+            f"Resuming crawl from {self.path}: {len(self.pages)} pages, {len(self.urls)} urls done"
+        )
+
+    def done(self, url: str) -> bool:
+        return url in self.urls
+
+    def add(self, url: str, result: Optional[Dict[str, typing.Any]] = None) -> None:
+        """Marks a url as processed, along with its result if any."""
+        with self._lock:
+            self.urls.add(url)
+            if result is not None:
+                self.results[url] = result
+            if time.monotonic() - self._saved >= self.interval:
+                self._save()
+
+    def page(self, page: typing.Hashable) -> None:
+        """Marks a page as fully crawled and saves the state."""
+        with self._lock:
+            self.pages.add(page)
+            self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        self._saved = time.monotonic()
+        if self.path is None:
+            return
+        if self.before_save is not None:
+            self.before_save()
+        state = {
+            "key": self.key,
+            "pages": sorted(self.pages),
+            "urls": sorted(self.urls),
+            "results": self.results,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            self.logger.warning(f"Failed to save checkpoint {self.path}: {e}")
+
+    def clear(self) -> None:
+        """Removes the saved state, once the crawl has completed."""
+        with self._lock:
+            if self.path is not None and os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Optional
+
+__all__ = ["RateLimiter"]
+
+# Statuses from which responses are errors, throttling (429, 503) included.
+ERROR = 400
+
+
+class RateLimiter:
+    """Token bucket shared by the threads fetching from one host, with an adaptive rate.
+
+    Each request takes a token, tokens come back at `rate` per second up to `burst`.
+    The rate grows by `increase` after each fast response and is multiplied by 0.75 when
+    a response takes longer than `slow` seconds. It halves on failed requests and error
+    statuses (400 and above, throttling with 429 and 503 included), whose Retry-After
+    header also pauses every request.
+
+    Parameters
+    ----------
+    rate
+        Initial number of requests per second.
+    burst
+        Number of requests sent at once, before the rate applies.
+
+    """
+
+    def __init__(
+        self,
+        rate: float = 4.0,
+        burst: int = 4,
+        min_rate: float = 0.5,
+        max_rate: float = 8.0,
+        increase: float = 0.1,
+        slow: float = 2.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.slow = slow
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def update(self, seconds: float, status: Optional[int] = None, retry_after: Optional[str] = None) -> None:
+        """Adapts the rate to a response, status is None when the request failed."""
+        with self._lock:
+            if status is None or status >= ERROR:
+                self.rate = max(self.min_rate, self.rate / 2)
+                if retry_after is not None and retry_after.isdigit():
+                    self._paused_until = max(self._paused_until, time.monotonic() + int(retry_after))
+            elif seconds > self.slow:
+                self.rate = max(self.min_rate, self.rate * 0.75)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
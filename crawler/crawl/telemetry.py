@@ -0,0 +1,123 @@
+import collections
+import contextlib
+import threading
+import time
+import typing
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from ..metrics import REGISTRY
+from .ratelimit import RateLimiter
+
+__all__ = ["Telemetry"]
+
+REGISTRY.describe("crawl_fetch_seconds", "Latency of the fetches of each crawler, by host.")
+REGISTRY.describe("crawl_bytes_total", "Bytes fetched by each crawler, by host.")
+REGISTRY.describe("crawl_document_seconds", "Time spent per document in each stage of a crawl.")
+REGISTRY.describe("crawl_failures_total", "Failed fetches and documents of each crawler, by type.")
+
+
+class Telemetry:
+    """Metrics of a crawl run: fetch latency and bytes per host, time spent per document
+    in each stage, and failures by type.
+
+    Every measure goes to the metrics registry, labelled by crawler, and is also summed
+    for the run so the end of a crawl can log what it cost.
+    """
+
+    def __init__(self, crawler: str):
+        self.crawler = crawler
+        self.fetches = collections.Counter()
+        self.fetch_seconds = collections.Counter()
+        self.bytes = collections.Counter()
+        self.stages = collections.Counter()
+        self.documents = collections.Counter()
+        self.failures = collections.Counter()
+        self._lock = threading.Lock()
+
+    def fetch(
+        self,
+        url: str,
+        session: Optional[requests.Session] = None,
+        method: str = "get",
+        limiter: Optional[RateLimiter] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Sends a request and raises for an error status, recording its latency and size.
+
+        With a rate limiter, waits for its turn and reports the response to it.
+        """
+        host = urlparse(url).netloc
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        response = None
+        try:
+            response = getattr(session or requests, method)(url, **kwargs)
+            response.raise_for_status()
+        except requests.RequestException as error:
+            self.failure(type(error).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if limiter is not None:
+                limiter.update(
+                    elapsed,
+                    status=None if response is None else response.status_code,
+                    retry_after=None if response is None else response.headers.get("Retry-After"),
+                )
+            REGISTRY.observe("crawl_fetch_seconds", elapsed, crawler=self.crawler, host=host)
+            with self._lock:
+                self.fetches[host] += 1
+                self.fetch_seconds[host] += elapsed
+
+        size = len(response.content)
+        REGISTRY.count("crawl_bytes_total", size, crawler=self.crawler, host=host)
+        with self._lock:
+            self.bytes[host] += size
+        return response
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Times the processing of one document, such as parse or nlp."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            REGISTRY.observe("crawl_document_seconds", elapsed, crawler=self.crawler, stage=name)
+            with self._lock:
+                self.stages[name] += elapsed
+                self.documents[name] += 1
+
+    def failure(self, kind: str) -> None:
+        REGISTRY.count("crawl_failures_total", crawler=self.crawler, type=kind)
+        with self._lock:
+            self.failures[kind] += 1
+
+    def summary(self) -> Dict[str, typing.Any]:
+        """Totals of the run, with mean fetch latency per host and mean time per document."""
+        with self._lock:
+            return {
+                "requests": sum(self.fetches.values()),
+                "bytes": sum(self.bytes.values()),
+                "hosts": {
+                    host: {
+                        "requests": count,
+                        "bytes": self.bytes[host],
+                        "mean_seconds": round(self.fetch_seconds[host] / count, 4),
+                    }
+                    for host, count in self.fetches.most_common()
+                },
+                "stages": {
+                    name: {
+                        "documents": self.documents[name],
+                        "seconds": round(seconds, 4),
+                        "mean_seconds": round(seconds / self.documents[name], 4),
+                    }
+                    for name, seconds in self.stages.items()
+                },
+                "failures": dict(self.failures),
+            }
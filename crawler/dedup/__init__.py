@@ -0,0 +1,3 @@
+from .dedup import MinHash, deduplicate, near_duplicates, shingles
+
+__all__ = ["MinHash", "deduplicate", "near_duplicates", "shingles"]
@@ -0,0 +1,150 @@
+import logging
+import re
+import typing
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+__all__ = ["MinHash", "deduplicate", "near_duplicates", "shingles"]
+
+logger = logging.getLogger(__name__)
+
+_WORDS = re.compile(r"\w+")
+_MULTIPLIER = np.uint64(1_000_003)
+
+
+def shingles(text: str, k: int = 3) -> np.ndarray:
+    """Distinct 64 bits hashes of the k-word shingles of a text, combined from crc32 of words."""
+    words = _WORDS.findall(text.lower())
+    hashes = np.fromiter(map(zlib.crc32, map(str.encode, words)), dtype=np.uint64, count=len(words))
+    k = min(k, len(hashes))
+    if k == 0:
+        return hashes
+
+    n = len(hashes) - k + 1
+    combined = hashes[:n].copy()
+    with np.errstate(over="ignore"):
+        for i in range(1, k):
+            combined = combined * _MULTIPLIER ^ hashes[i : i + n]
+    return np.unique(combined)
+
+
+class MinHash:
+    """MinHash signatures from `num_perm` random multiply-shift hash functions.
+
+    Each function keeps the high 32 bits of (a * x + b) mod 2^64, with a odd, which
+    avoids the modulo of a prime. The share of equal values between two signatures
+    estimates the Jaccard similarity of the two sets of shingles.
+    """
+
+    def __init__(self, num_perm: int = 128, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = (rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, None]
+        self.b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+
+    def __call__(self, hashes: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            values = (self.a * hashes[None, :] + self.b) >> np.uint64(32)
+        return values.min(axis=1).astype(np.uint32)
+
+
+def near_duplicates(
+    texts: typing.Sequence[str],
+    threshold: float = 0.5,
+    num_perm: int = 128,
+    bands: int = 32,
+    min_shingles: int = 5,
+) -> List[List[int]]:
+    """Clusters of texts whose estimated Jaccard similarity is at least threshold.
+
+    Signatures are split into bands, texts sharing a band are candidates, found by
+    sorting each band rather than comparing every pair. Each candidate is checked
+    against the first text of its bucket on the whole signature, and clusters are the
+    connected components of the checked pairs. Texts with fewer than min_shingles
+    shingles are never duplicates.
+
+    Parameters
+    ----------
+    bands
+        Number of bands, candidates have a similarity above about (1 / bands) ** (bands / num_perm).
+
+    """
+    minhash = MinHash(num_perm=num_perm)
+    rows = num_perm // bands
+
+    indices, signatures = [], []
+    for idx, text in enumerate(texts):
+        hashes = shingles(text)
+        if len(hashes) >= min_shingles:
+            indices.append(idx)
+            signatures.append(minhash(hashes))
+
+    if len(signatures) < 2:
+        return []
+
+    indices = np.asarray(indices)
+    signatures = np.stack(signatures)
+    parent = np.arange(len(signatures))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        if counts.max() < 2:
+            continue
+
+        order = np.argsort(inverse, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        for bucket in np.flatnonzero(counts > 1):
+            members = order[starts[bucket] : starts[bucket] + counts[bucket]]
+            first = members[0]
+            similarity = (signatures[members[1:]] == signatures[first]).mean(axis=1)
+            for member in members[1:][similarity >= threshold]:
+                root, other = find(first), find(member)
+                if root != other:
+                    parent[other] = root
+
+    clusters = {}
+    for row in range(len(signatures)):
+        clusters.setdefault(find(row), []).append(int(indices[row]))
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def deduplicate(data: Dict[str, Dict], **kwargs) -> Dict[str, Dict]:
+    """Keeps one document of each cluster of near-duplicates, with the tags of the cluster.
+
+    The canonical document is the one with the longest summary. It lists the urls of
+    the documents it replaces under "duplicates", so crawlers can skip them. Keyword
+    arguments are passed to near_duplicates.
+    """
+    urls = list(data)
+    clusters = near_duplicates(
+        [f"{data[url].get('title', '')} {data[url].get('summary', '')}" for url in urls], **kwargs
+    )
+
+    deduplicated = dict(data)
+    for cluster in clusters:
+        members = sorted((urls[idx] for idx in cluster), key=lambda url: (-len(data[url].get("summary", "")), url))
+        canonical, duplicates = members[0], members[1:]
+        document = dict(data[canonical])
+        document["tags"] = sorted(set().union(*(data[url].get("tags", []) for url in members)))
+        document["duplicates"] = sorted(
+            set(duplicates).union(*(data[url].get("duplicates", []) for url in members))
+        )
+        deduplicated[canonical] = document
+        for url in duplicates:
+            deduplicated.pop(url, None)
+
+    if clusters:
+        logger.info(
+            f"Merged {len(data) - len(deduplicated)} near-duplicate documents into {len(clusters)} documents"
+        )
+    return deduplicated
@@ -1,17 +1,19 @@
 import requests
 from bs4 import BeautifulSoup
 import datetime
+import threading
 from typing import Dict, Optional, List
 import logging
 import nltk
 from urllib.parse import urljoin
 import concurrent.futures
 from dataclasses import dataclass
-from time import sleep
 import re
 import os
 import math
 
+from ..crawl import Checkpoint, RateLimiter, Telemetry
+
 @dataclass
 class Publication:
     title: str
@@ -22,11 +24,28 @@ class Publication:
     research_areas: list[str]
 
 class GoogleResearch:
-    def __init__(self, timeout: int = 10, max_pages: int = 5, category: Optional[str] = None):
+    def __init__(
+        self,
+        timeout: int = 10,
+        max_pages: int = 5,
+        category: Optional[str] = None,
+        checkpoint: Optional[str] = None,
+        parallel_categories: bool = False,
+        workers: int = 5,
+        limiter: Optional[RateLimiter] = None,
+        retries: int = 2,
+    ):
         self.timeout = timeout
         self.max_pages = max_pages
         self.categories = self._parse_categories(category) if category else []
+        self.checkpoint = checkpoint
+        self.parallel_categories = parallel_categories
+        self.workers = workers
+        self.retries = retries
         self.logger = logging.getLogger(__name__)
+        self.telemetry = Telemetry("googleresearch")
+        # Listing and publication pages share the politeness budget of the host.
+        self.limiter = limiter if limiter is not None else RateLimiter()
         self.base_url = "https://research.google/pubs/"
         self._setup_nltk()
 
@@ -90,9 +109,16 @@ class GoogleResearch:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             }
-            response = requests.get(url, headers=headers, timeout=self.timeout)
-            response.raise_for_status()
-            return response.text
+            for attempt in range(self.retries + 1):
+                try:
+                    response = self.telemetry.fetch(
+                        url, headers=headers, timeout=self.timeout, limiter=self.limiter
+                    )
+                    return response.text
+                except requests.HTTPError as e:
+                    # The rate limiter has slowed down, throttled requests are tried again.
+                    if e.response is None or e.response.status_code not in (429, 503) or attempt == self.retries:
+                        raise
         except requests.RequestException as e:
             self.logger.error(f"Failed to fetch {url}: {e}")
             return None
@@ -180,52 +206,57 @@ class GoogleResearch:
         
         return sorted(list(final_tags))
 
-    def _parse_publication_page(self, url: str) -> Optional[Publication]:
+    def _category_tags(self, categories: List[str]) -> List[str]:
+        tags = []
+        for category in categories:
+            if '-and-' in category:
+                tags.extend(category.split('-and-'))
+            else:
+                tags.append(category)
+        return tags
+
+    def _parse_publication_page(self, url: str, categories: Optional[List[str]] = None) -> Optional[Publication]:
         try:
             html_content = self._fetch_page(url)
             if not html_content:
                 return None
 
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            title_elem = soup.select_one('h1')
-            if not title_elem:
-                return None
-            title = title_elem.get_text(strip=True)
-            
-            date = str(datetime.datetime.today().strftime("%Y-%m-%d"))
-            
-            abstract = ""
-            abstract_section = soup.find('h3', string='Abstract')
-            if abstract_section:
-                abstract_div = abstract_section.find_parent('section').select_one('.glue-grid__col--span-9-lg')
-                if abstract_div:
-                    abstract = abstract_div.get_text(strip=True)
-            
-            research_areas = []
-            area_tags = []
-            areas_section = soup.find('h3', string='Research Areas')
-            if areas_section:
-                areas_div = areas_section.find_parent('section').select_one('.glue-grid__col--span-9-lg')
-                if areas_div:
-                    area_links = areas_div.select('.glue-headline.body')
-                    for area in area_links:
-                        area_text = area.get_text(strip=True)
-                        research_areas.append(area_text)
-                        area_tags.append(self._normalize_research_area(area_text))
+            with self.telemetry.stage("parse"):
+                soup = BeautifulSoup(html_content, 'html.parser')
+                
+                title_elem = soup.select_one('h1')
+                if not title_elem:
+                    self.telemetry.failure("missing_title")
+                    return None
+                title = title_elem.get_text(strip=True)
+                
+                date = str(datetime.datetime.today().strftime("%Y-%m-%d"))
+                
+                abstract = ""
+                abstract_section = soup.find('h3', string='Abstract')
+                if abstract_section:
+                    abstract_div = abstract_section.find_parent('section').select_one('.glue-grid__col--span-9-lg')
+                    if abstract_div:
+                        abstract = abstract_div.get_text(strip=True)
+                
+                research_areas = []
+                area_tags = []
+                areas_section = soup.find('h3', string='Research Areas')
+                if areas_section:
+                    areas_div = areas_section.find_parent('section').select_one('.glue-grid__col--span-9-lg')
+                    if areas_div:
+                        area_links = areas_div.select('.glue-headline.body')
+                        for area in area_links:
+                            area_text = area.get_text(strip=True)
+                            research_areas.append(area_text)
+                            area_tags.append(self._normalize_research_area(area_text))
             
             # Extract tags from both title and abstract
-            title_tags = self._extract_tags(title) if title else []
-            abstract_tags = self._extract_tags(abstract) if abstract else []
+            with self.telemetry.stage("nlp"):
+                title_tags = self._extract_tags(title) if title else []
+                abstract_tags = self._extract_tags(abstract) if abstract else []
             
-            all_tags = []
-            if self.categories:
-                for category in self.categories:
-                    if '-and-' in category:
-                        category_parts = category.split('-and-')
-                        all_tags.extend(category_parts)
-                    else:
-                        all_tags.append(category)
+            all_tags = self._category_tags(self.categories if categories is None else categories)
             all_tags.extend(area_tags)
             all_tags.extend(title_tags)
             all_tags.extend(abstract_tags)
@@ -243,54 +274,152 @@ class GoogleResearch:
             )
             
         except Exception as e:
+            self.telemetry.failure("parse")
             self.logger.warning(f"Error parsing publication page {url}: {e}")
             return None
 
-    def _get_next_page_url(self, page_number: int) -> str:
+    def _get_next_page_url(self, page_number: int, categories: Optional[List[str]] = None) -> str:
+        categories = self.categories if categories is None else categories
         url = f"{self.base_url}?page={page_number}"
-        if self.categories:
-            url += ''.join(f"&category={cat}" for cat in self.categories)
+        if categories:
+            url += ''.join(f"&category={cat}" for cat in categories)
         return url
 
-    def __call__(self) -> Dict:
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        
-        publications_data = {}
-        
+    def _crawl_listing(
+        self,
+        categories: List[str],
+        executor: concurrent.futures.ThreadPoolExecutor,
+        checkpoint: Checkpoint,
+        submitted: Dict[str, concurrent.futures.Future],
+        found_in: Dict[str, List[str]],
+        lock: threading.Lock,
+    ) -> bool:
+        """Walks the listing pages of categories, submitting their publications as they are found.
+
+        A page is checkpointed once all its publications are parsed. Returns False when a
+        listing page could not be fetched, so the crawl is incomplete.
+        """
         for page in range(1, self.max_pages + 1):
-            current_url = self._get_next_page_url(page)
+            current_url = self._get_next_page_url(page, categories)
+            if current_url in checkpoint.pages:
+                continue
+
             self.logger.info(f"Crawling page {page}: {current_url}")
-            
             html_content = self._fetch_page(current_url)
-            if not html_content:
-                break
-                
+            if html_content is None:
+                return False
+
             soup = BeautifulSoup(html_content, 'html.parser')
             publication_links = self._get_publication_links(soup)
-            
+
             if not publication_links:
-                self.logger.info("No more publications found")
-                break
-                
+                self.logger.info(f"No more publications found for {current_url}")
+                return True
+
             self.logger.info(f"Found {len(publication_links)} publications on page {page}")
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                publications = list(executor.map(self._parse_publication_page, publication_links))
-            
-            for pub in publications:
-                if pub:
-                    publications_data[pub.url] = {
-                        "title": pub.title,
-                        "abstract": pub.abstract,
-                        "date": pub.date,
-                        "tags": pub.tags,
-                        "research_areas": pub.research_areas
-                    }
-            
-            sleep(1)
-            
+
+            futures = []
+            with lock:
+                for url in publication_links:
+                    found_in.setdefault(url, [])
+                    found_in[url].extend(category for category in categories if category not in found_in[url])
+                    if url in submitted or checkpoint.done(url):
+                        futures.append(submitted.get(url))
+                        continue
+                    submitted[url] = executor.submit(self._parse_publication, url, categories, checkpoint)
+                    futures.append(submitted[url])
+
+            pending = [future for future in futures if future is not None]
+            remaining = [len(pending)]
+
+            def complete(current_url=current_url, urls=publication_links):
+                # A publication that failed is not checkpointed, its page is crawled again next run.
+                if all(checkpoint.done(url) for url in urls):
+                    checkpoint.page(current_url)
+
+            def done(_, complete=complete, remaining=remaining):
+                with lock:
+                    remaining[0] -= 1
+                    finished = remaining[0] == 0
+                if finished:
+                    complete()
+
+            if not pending:
+                complete()
+            for future in pending:
+                future.add_done_callback(done)
+
+        return True
+
+    def _parse_publication(self, url: str, categories: List[str], checkpoint: Checkpoint) -> Optional[Dict]:
+        pub = self._parse_publication_page(url, categories)
+        if not pub:
+            return None
+        publication = {
+            "title": pub.title,
+            "abstract": pub.abstract,
+            "date": pub.date,
+            "tags": pub.tags,
+            "research_areas": pub.research_areas
+        }
+        checkpoint.add(pub.url, publication)
+        return publication
+
+    def __call__(self) -> Dict:
+        """Crawls the publications of the listing pages.
+
+        Listing pages are fetched while the publications already found are parsed by
+        `workers` threads, every request waiting on the rate limiter. With
+        `parallel_categories`, each category is listed on its own, in parallel, and a
+        publication gets the tags of every category listing it.
+
+        With a checkpoint path, pages crawled and publications parsed are saved as the
+        crawl goes, and an interrupted crawl of the same categories resumes from them.
+        The checkpoint is removed once the last page is reached.
+        """
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s'
+        )
+
+        listings = [[category] for category in self.categories] if self.parallel_categories else [self.categories]
+        checkpoint = Checkpoint(
+            self.checkpoint,
+            key=" ".join(self._get_next_page_url(0, categories) for categories in listings),
+        )
+        publications_data = dict(checkpoint.results)
+        submitted: Dict[str, concurrent.futures.Future] = {}
+        found_in: Dict[str, List[str]] = {}
+        lock = threading.Lock()
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(listings) or 1) as listing:
+                    completed = all(listing.map(
+                        lambda categories: self._crawl_listing(
+                            categories, executor, checkpoint, submitted, found_in, lock
+                        ),
+                        listings,
+                    ))
+
+                for url, future in submitted.items():
+                    publication = future.result()
+                    if publication:
+                        publications_data[url] = publication
+        except BaseException:
+            checkpoint.save()
+            raise
+
+        if self.parallel_categories:
+            for url, categories in found_in.items():
+                if url in publications_data:
+                    publication = publications_data[url]
+                    publication["tags"] = self._clean_tags(publication["tags"] + self._category_tags(categories))
+
+        if completed:
+            checkpoint.clear()
+        else:
+            checkpoint.save()
+
         self.logger.info(f"Crawling completed. Processed {len(publications_data)} publications")
-        return publications_data
\ No newline at end of file
+        return publications_data
@@ -1,3 +1,5 @@
 from .graph import Graph
+from .landmarks import Landmarks
+from .wire import GraphEncoder
 
-__all__ = ["Graph"]
\ No newline at end of file
+__all__ = ["Graph", "GraphEncoder", "Landmarks"]
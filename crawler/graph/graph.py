@@ -1,41 +1,111 @@
 import itertools
+import sys
 import typing
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import networkx as nx
 import numpy as np
+from ..metrics import span
+from .landmarks import Landmarks, shortest_simple_paths
+from .layout import layout as spread
+
+# Paths of plot have at most 4 nodes.
+MAX_HOPS = 3
 
 class Graph:
-    def __init__(self, triples):
+    def __init__(self, triples, n_landmarks: int = 48, layout: bool = True):
         self.graph = nx.Graph()
+        self.idx_to_node = {}
+        self.node_to_idx = {}
+        self.node_degrees = {}
+        self.n_landmarks = n_landmarks
+        self.landmarks = None
+        self.layout = layout
+        self.positions = None
+        self._stale = False
+        self.add(triples=triples)
 
-        nodes = {
-            **{node["head"]: True for node in triples},
-            **{node["tail"]: True for node in triples},
-        }
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("n_landmarks", 0)
+        self.__dict__.setdefault("landmarks", None)
+        self.__dict__.setdefault("layout", False)
+        self.__dict__.setdefault("positions", None)
+        self.__dict__.setdefault("_stale", False)
+
+    def add(self, triples, update: bool = True):
+        """Adds the edges of new triples, weighted by the degrees of their nodes.
 
-        self.idx_to_node = {idx: node for idx, node in enumerate(nodes)}
-        self.node_to_idx = {node: idx for idx, node in self.idx_to_node.items()}
+        Landmarks and the layout are computed again unless update is False, in which
+        case update is to be called once the changes are done.
+        """
+        for node in [triple["head"] for triple in triples] + [triple["tail"] for triple in triples]:
+            if node not in self.node_to_idx:
+                # Interned, tags of the graph and of the document table share their strings.
+                node = sys.intern(node)
+                self.node_to_idx[node] = len(self.idx_to_node)
+                self.idx_to_node[self.node_to_idx[node]] = node
 
-        node_degrees = {}
+        nodes = set()
         for triple in triples:
-            head, tail = triple["head"], triple["tail"]
-            node_degrees[head] = node_degrees.get(head, 0) + 1
-            node_degrees[tail] = node_degrees.get(tail, 0) + 1
-        
+            head, tail = self.node_to_idx[triple["head"]], self.node_to_idx[triple["tail"]]
+            if not self.graph.has_edge(head, tail):
+                self.graph.add_edge(head, tail)
+                nodes.update((head, tail))
+
+        if nodes:
+            self._reweight(nodes)
+            self._stale = True
+        if update:
+            self.update()
+
+    def remove(self, triples, update: bool = True):
+        """Removes the edges of triples, and the nodes they leave without edges."""
+        nodes = set()
         for triple in triples:
-            head = triple["head"]
-            tail = triple["tail"]
-            weight = (node_degrees.get(head, 1) + node_degrees.get(tail, 1)) / 2
-            self.graph.add_edge(
-                self.node_to_idx[head],
-                self.node_to_idx[tail],
-                weight=weight
-            )
-            self.graph.add_edge(
-                self.node_to_idx[tail],
-                self.node_to_idx[head],
-                weight=weight
-            )
+            head, tail = self.node_to_idx.get(triple["head"]), self.node_to_idx.get(triple["tail"])
+            if head is not None and tail is not None and self.graph.has_edge(head, tail):
+                self.graph.remove_edge(head, tail)
+                nodes.update((head, tail))
+                self._stale = True
+
+        for node in list(nodes):
+            if not self.graph.degree(node):
+                # Indices are not reused, idx_to_node keeps the name of the node.
+                self.graph.remove_node(node)
+                name = self.idx_to_node[node]
+                del self.node_to_idx[name]
+                del self.node_degrees[name]
+                nodes.discard(node)
+
+        if nodes:
+            self._reweight(nodes)
+        if update:
+            self.update()
+
+    def _reweight(self, nodes: typing.Set[int]) -> None:
+        """Weights the edges of nodes whose degree changed, as a graph built at once would."""
+        for node in nodes:
+            self.node_degrees[self.idx_to_node[node]] = self.graph.degree(node)
+
+        for head, tail in self.graph.edges(nodes):
+            self.graph[head][tail]["weight"] = (
+                self.node_degrees[self.idx_to_node[head]] + self.node_degrees[self.idx_to_node[tail]]
+            ) / 2
+
+    def update(self) -> None:
+        """Computes again the landmarks and the layout, when edges changed since the last time."""
+        if not self._stale:
+            return
+        self._stale = False
+
+        # Distances change with the edges, landmarks are computed again.
+        if self.n_landmarks:
+            self.landmarks = Landmarks(self.graph, n_landmarks=self.n_landmarks)
+
+        # Coordinates of the 3D view, the previous ones are refined rather than
+        # computed again so that known tags barely move.
+        if self.layout:
+            self.positions = spread(self.graph, initial=self.positions)
 
     def __call__(
         self,
@@ -44,6 +114,25 @@ class Graph:
         k_yens: int = 3,
         k_walk: int = 3,
     ):
+        nodes, links = [], []
+        for new_nodes, new_links in self.stream(
+            tags=tags, retrieved_tags=retrieved_tags, k_yens=k_yens, k_walk=k_walk
+        ):
+            nodes.extend(new_nodes)
+            links.extend(new_links)
+        return nodes, links
+
+    def stream(
+        self,
+        tags: typing.List,
+        retrieved_tags: typing.List,
+        k_yens: int = 3,
+        k_walk: int = 3,
+    ):
+        """Yields the nodes and links of the graph as they are found.
+
+        The tags of the query come first, then the new nodes and links of each path.
+        """
         nodes, lonely = [], []
         output_nodes = {}
 
@@ -67,25 +156,15 @@ class Graph:
                 output_nodes[tag] = {
                     "id": tag,
                     "color": color,
-                    "size": size
+                    "size": size,
+                    **self.position(idx),
                 }
 
-        paths = []
+        yield list(output_nodes.values()), []
 
-        if len(nodes) >= 2:
-            for start, end in itertools.combinations(nodes, 2):
-                if start != end:
-                    try:
-                        new_paths = self.yens(start=start, end=end, k=k_yens)
-                        paths.extend(new_paths)
-                    except:
-                        continue
-
-        if len(nodes) == 1 or len(paths) == 0:
-            for start in nodes:
-                paths.append(self.walk(start=start, k=k_walk))
-
-        for path in paths:
+        links = set()
+        for path in self.paths(nodes=nodes, k_yens=k_yens, k_walk=k_walk):
+            new_nodes = []
             for node in path:
                 node_name = self.idx_to_node[node]
                 if node_name not in output_nodes:
@@ -95,16 +174,63 @@ class Graph:
                     output_nodes[node_name] = {
                         "id": node_name,
                         "color": colors['neutral'],
-                        "size": size
+                        "size": size,
+                        **self.position(node),
                     }
+                    new_nodes.append(output_nodes[node_name])
+
+            new_links = self.format_triples(paths=[path], seen=links)
+            if new_nodes or new_links:
+                yield new_nodes, new_links
+
+    def position(self, node: Optional[int]) -> Dict[str, float]:
+        """Precomputed x, y and z of a node for the client, empty without a layout."""
+        if self.positions is None or node is None or node >= len(self.positions):
+            return {}
+        x, y, z = self.positions[node].tolist()
+        return {"x": round(x, 1), "y": round(y, 1), "z": round(z, 1)}
 
-        return list(output_nodes.values()), self.format_triples(paths=paths)
+    def paths(self, nodes: typing.List[int], k_yens: int, k_walk: int):
+        """Short paths between pairs of nodes, or walks around them when there are none."""
+        found = False
+
+        if len(nodes) >= 2:
+            for start, end in itertools.combinations(nodes, 2):
+                if start != end:
+                    try:
+                        with span("yens"):
+                            new_paths = self.yens(start=start, end=end, k=k_yens)
+                    except:
+                        continue
+                    for path in new_paths:
+                        found = True
+                        yield path
+
+        if len(nodes) == 1 or not found:
+            # A walk is the start node and its neighbours, linked to the start node.
+            for start in nodes:
+                with span("walk"):
+                    neighbours = self.walk(start=start, k=k_walk)
+                yield neighbours[:1]
+                for neighbour in neighbours[1:]:
+                    yield [start, neighbour]
 
     def yens(self, start: int, end: int, k: int):
+        """Paths of at most 4 nodes among the k + 1 shortest simple paths.
+
+        With landmarks, pairs too far apart are skipped without a search, and searches
+        are A* searches.
+        """
         paths = []
+        if self.landmarks is not None:
+            if not self.landmarks.within(start, end, max_hops=MAX_HOPS):
+                return paths
+            simple_paths = shortest_simple_paths(self.landmarks, start, end, k=k + 1)
+        else:
+            simple_paths = nx.shortest_simple_paths(self.graph, start, end, weight="weight")
         try:
-            for idx, path in enumerate(nx.shortest_simple_paths(self.graph, start, end, weight="weight")):
-                if len(path) <= 4:
+            for idx, path in enumerate(simple_paths):
+                if len(path) <= MAX_HOPS + 1:
                     paths.append(path)
                 if idx >= k:
                     break
@@ -120,12 +246,15 @@ class Graph:
                 break
         return neighbours
 
-    def format_triples(self, paths: typing.List[typing.List[str]]):
+    def format_triples(self, paths: typing.List[typing.List[str]], seen: Optional[typing.Set] = None):
+        """Links along paths, skipping the edges already in seen, which is updated."""
+        seen = set() if seen is None else seen
         triples = {}
         for path in paths:
             for start, end in zip(path[:-1], path[1:]):
                 key = f"{min(start, end)}_{max(start, end)}"
-                if key not in triples:
+                if key not in triples and key not in seen:
+                    seen.add(key)
                     weight = self.graph[start][end].get("weight", 1.0)
                     triples[key] = {
                         "start": start,
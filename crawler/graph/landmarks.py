@@ -0,0 +1,213 @@
+import heapq
+import itertools
+import typing
+from typing import List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+__all__ = ["Landmarks", "shortest_simple_paths"]
+
+_MAX_HOPS = 255
+_CACHE_SIZE = 64
+
+
+class Landmarks:
+    """Distances from a few landmark nodes, for lower bounds of distances in the graph (ALT).
+
+    By the triangle inequality, |d(l, u) - d(l, v)| <= d(u, v) for every landmark l, on
+    weights as on numbers of hops. Weighted bounds guide A*, hop bounds and connected
+    components rule out pairs of nodes without a short enough path before any search.
+    Two thirds of the landmarks are the nodes of highest degree: plot searches paths
+    between the tags of top documents, which are mostly hubs, and bounds to a landmark
+    are exact. The others are spread over the largest component by farthest-point
+    selection on hops. The adjacency is kept in CSR arrays for the searches.
+
+    Parameters
+    ----------
+    graph
+        Undirected graph whose nodes are the integers 0 to n - 1.
+    n_landmarks
+        Number of landmarks, distances take 5 bytes per node and landmark.
+
+    """
+
+    def __init__(self, graph: nx.Graph, n_landmarks: int = 48):
+        from scipy.sparse import csgraph, csr_matrix
+
+        n = max(graph.nodes, default=-1) + 1
+        edges = np.asarray(list(graph.edges(data="weight", default=1.0)), dtype=np.float64).reshape(-1, 3)
+        adjacency = csr_matrix(
+            (edges[:, 2], (edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64))), shape=(n, n)
+        )
+        adjacency = (adjacency + adjacency.T).tocsr()
+        self.indptr = adjacency.indptr.astype(np.int64)
+        self.indices = adjacency.indices.astype(np.int32)
+        self.weights = adjacency.data.astype(np.float64)
+        _, self.components = csgraph.connected_components(adjacency, directed=False)
+        self.components = self.components.astype(np.int32)
+
+        landmarks = []
+        if n and n_landmarks:
+            degrees = np.diff(self.indptr)
+            landmarks = np.argsort(-degrees, kind="stable")[: max(1, n_landmarks * 2 // 3)].tolist()
+            largest = np.flatnonzero(self.components == np.bincount(self.components).argmax())
+            nearest = csgraph.dijkstra(adjacency, directed=False, indices=landmarks, unweighted=True).min(axis=0)
+            while len(landmarks) < min(n_landmarks, n):
+                farthest = int(largest[nearest[largest].argmax()])
+                if nearest[farthest] == 0:
+                    break
+                landmarks.append(farthest)
+                nearest = np.minimum(
+                    nearest, csgraph.dijkstra(adjacency, directed=False, indices=farthest, unweighted=True)
+                )
+        self.landmarks = np.asarray(landmarks, dtype=np.int32)
+
+        # Nodes of a component are all reachable from a landmark, or none is, so
+        # unreachable distances can be set to 0 without breaking the bounds.
+        distances = csgraph.dijkstra(adjacency, directed=False, indices=self.landmarks)
+        hops = csgraph.dijkstra(adjacency, directed=False, indices=self.landmarks, unweighted=True)
+        distances[np.isinf(distances)] = 0
+        hops[np.isinf(hops)] = 0
+        self.distances = np.ascontiguousarray(distances.T, dtype=np.float32).reshape(n, len(landmarks))
+        self.hops = np.ascontiguousarray(np.minimum(hops, _MAX_HOPS).T, dtype=np.uint8).reshape(
+            n, len(landmarks)
+        )
+        self._bounds = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_bounds"] = {}
+        return state
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+    def within(self, start: int, end: int, max_hops: int) -> bool:
+        """False when start and end are surely not linked by a path of at most max_hops edges."""
+        if start >= len(self) or end >= len(self) or self.components[start] != self.components[end]:
+            return False
+        if not len(self.landmarks):
+            return True
+        bound = np.abs(self.hops[start].astype(np.int16) - self.hops[end]).max()
+        return int(bound) <= max_hops
+
+    def bounds(self, target: int) -> np.ndarray:
+        """Lower bounds of the weighted distances from every node to target."""
+        if not len(self.landmarks):
+            return np.zeros(len(self))
+
+        # Plot searches paths between a few tags, bounds to each of them are kept.
+        bounds = self._bounds.get(target)
+        if bounds is None:
+            if len(self._bounds) >= _CACHE_SIZE:
+                self._bounds.clear()
+            bounds = self._bounds[target] = np.abs(self.distances - self.distances[target]).max(axis=1)
+        return bounds
+
+    def weight(self, start: int, end: int) -> float:
+        """Weight of the edge between two nodes, infinite without one."""
+        neighbours = self.indices[self.indptr[start] : self.indptr[start + 1]]
+        position = np.flatnonzero(neighbours == end)
+        return float(self.weights[self.indptr[start] + position[0]]) if len(position) else float("inf")
+
+    def astar(
+        self,
+        start: int,
+        end: int,
+        bounds: np.ndarray,
+        banned_nodes: typing.Sequence[int] = (),
+        banned_edges: typing.Sequence[int] = (),
+        max_cost: float = float("inf"),
+    ) -> Optional[Tuple[List[int], List[float]]]:
+        """Cheapest path from start to end, with the cost to each of its nodes.
+
+        The path avoids banned nodes and the edges from start to banned_edges. Each
+        expanded node relaxes all its edges at once, which matters for hubs. Gives up
+        once every remaining path costs more than max_cost.
+        """
+        costs = np.full(len(self), np.inf)
+        parents = np.full(len(self), -1, dtype=np.int32)
+        costs[start] = 0.0
+        heap = [(float(bounds[start]), 0.0, start)]
+        banned_nodes = np.asarray(banned_nodes, dtype=np.int32)
+        banned_edges = np.asarray(banned_edges, dtype=np.int32)
+        while heap:
+            estimate, cost, node = heapq.heappop(heap)
+            if estimate > max_cost:
+                return None
+            if cost > costs[node]:
+                continue
+            if node == end:
+                path = [node]
+                while path[-1] != start:
+                    path.append(int(parents[path[-1]]))
+                path.reverse()
+                return path, costs[path].tolist()
+
+            neighbours = self.indices[self.indptr[node] : self.indptr[node + 1]]
+            candidates = cost + self.weights[self.indptr[node] : self.indptr[node + 1]]
+            estimates = candidates + bounds[neighbours]
+            keep = (candidates < costs[neighbours]) & (estimates <= max_cost)
+            if len(banned_nodes):
+                keep &= ~np.isin(neighbours, banned_nodes)
+            if node == start and len(banned_edges):
+                keep &= ~np.isin(neighbours, banned_edges)
+
+            selected = np.flatnonzero(keep)
+            if len(selected):
+                reached = neighbours[selected]
+                costs[reached] = candidates[selected]
+                parents[reached] = node
+                for item in zip(estimates[selected].tolist(), candidates[selected].tolist(), reached.tolist()):
+                    heapq.heappush(heap, item)
+        return None
+
+
+def shortest_simple_paths(landmarks: Landmarks, start: int, end: int, k: Optional[int] = None):
+    """Simple paths from start to end by increasing weight, as nx.shortest_simple_paths.
+
+    Yen's algorithm, whose shortest path searches are A* searches bounded by landmarks.
+    When only the first k paths are needed, a spur search stops as soon as its paths
+    cost more than the candidates already good enough. Paths of equal weight may come
+    in another order than with networkx.
+    """
+    bounds = landmarks.bounds(end)
+    # An edge between the nodes bounds the cost of the shortest path.
+    first = landmarks.astar(start, end, bounds, max_cost=landmarks.weight(start, end))
+    if first is None:
+        raise nx.NetworkXNoPath(f"No path between {start} and {end}.")
+
+    found = [first]
+    seen = {tuple(first[0])}
+    candidates = []
+    counter = itertools.count()
+    yield first[0]
+
+    while k is None or len(found) < k:
+        previous, prefix_costs = found[-1]
+        for i in range(len(previous) - 1):
+            root, root_cost = previous[: i + 1], prefix_costs[i]
+
+            # Paths costing more than the last candidate still needed are never output.
+            max_cost = float("inf")
+            if k is not None and len(candidates) >= k - len(found):
+                max_cost = heapq.nsmallest(k - len(found), candidates)[-1][0] - root_cost
+
+            banned_edges = [path[i + 1] for path, _ in found if path[: i + 1] == root]
+            spur = landmarks.astar(
+                root[-1], end, bounds, banned_nodes=root[:-1], banned_edges=banned_edges, max_cost=max_cost
+            )
+            if spur is None:
+                continue
+            path = root[:-1] + spur[0]
+            if tuple(path) not in seen:
+                seen.add(tuple(path))
+                costs = prefix_costs[:i] + [root_cost + cost for cost in spur[1]]
+                heapq.heappush(candidates, (costs[-1], next(counter), path, costs))
+
+        if not candidates:
+            return
+        _, _, path, costs = heapq.heappop(candidates)
+        found.append((path, costs))
+        yield path
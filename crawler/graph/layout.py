@@ -0,0 +1,108 @@
+from typing import Optional
+
+import networkx as nx
+import numpy as np
+
+__all__ = ["layout"]
+
+# Default distance of links in the d3 force simulation of the client.
+LINK_DISTANCE = 30.0
+
+
+def layout(
+    graph: nx.Graph,
+    dim: int = 3,
+    iterations: int = 50,
+    spectral_iterations: int = 100,
+    negative: int = 8,
+    initial: Optional[np.ndarray] = None,
+    seed: int = 0,
+) -> np.ndarray:
+    """Coordinates of every node of the graph, rows indexed by node, as float32.
+
+    Nodes are first placed on degree-normalized eigenvectors of the graph (Koren's
+    spectral drawing), found by power iteration on all dimensions at once, where edges
+    of lower weight, between nodes of lower degree, count more. A few force-directed
+    iterations then spread them out: edges pull their nodes together and each node is
+    pushed away from its neighbours and from `negative` random nodes, rather than from
+    every other node. Coordinates are scaled so the median edge has the length of a
+    link of the client, where all links have the same length.
+
+    Parameters
+    ----------
+    initial
+        Coordinates of a previous layout, kept for its nodes so that the layout of a
+        graph with new edges is close to the previous one. New nodes start at the
+        mean of their placed neighbours.
+
+    """
+    from scipy.sparse import csr_matrix, diags
+
+    # Nodes removed since the previous layout keep their row, indices are not reused.
+    n = max(max(graph.nodes, default=-1) + 1, 0 if initial is None else len(initial))
+    if n == 0:
+        return np.zeros((0, dim), dtype=np.float32)
+
+    edges = np.asarray(list(graph.edges(data="weight", default=1.0)), dtype=np.float64).reshape(-1, 3)
+    heads, tails = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+    affinity = csr_matrix((1 / edges[:, 2], (heads, tails)), shape=(n, n))
+    affinity = (affinity + affinity.T).tocsr()
+    degrees = np.asarray(affinity.sum(axis=1)).ravel()
+    degrees[degrees == 0] = 1.0
+    transition = diags(1 / degrees) @ affinity
+    rng = np.random.default_rng(seed)
+
+    if initial is not None and len(initial):
+        positions = np.zeros((n, dim))
+        placed = np.zeros(n, dtype=bool)
+        positions[: len(initial)] = initial / LINK_DISTANCE
+        placed[: len(initial)] = True
+        # New nodes linked to placed ones first, the others at random.
+        for _ in range(2):
+            counts = affinity @ placed.astype(np.float64)
+            reached = ~placed & (counts > 0)
+            positions[reached] = (affinity @ (positions * placed[:, None]))[reached] / counts[reached, None]
+            placed |= reached
+        positions[~placed] = rng.standard_normal((int((~placed).sum()), dim))
+        temperature = 0.1
+    else:
+        # The first column stays constant, the others converge to the eigenvectors
+        # after it, D-orthogonal to it and to each other.
+        vectors = rng.standard_normal((n, dim + 1))
+        vectors[:, 0] = 1.0
+        scale = np.sqrt(degrees)[:, None]
+        for _ in range(spectral_iterations):
+            vectors = 0.5 * (vectors + transition @ vectors)
+            vectors = np.linalg.qr(scale * vectors)[0] / scale
+        positions = vectors[:, 1:]
+        positions = (positions - positions.mean(axis=0)) / (positions.std(axis=0) + 1e-12)
+        positions *= np.cbrt(n) / 2
+        temperature = np.cbrt(n) / 4
+
+    rows = np.repeat(np.arange(n), np.diff(affinity.indptr))
+    columns = affinity.indices
+    cooling = (0.01 / max(temperature, 0.01)) ** (1 / max(iterations, 1))
+    for _ in range(iterations):
+        # Fruchterman-Reingold forces with an ideal distance of 1: d^2 pulls along
+        # edges, 1 / d pushes between nodes, estimated on a sample of them.
+        delta = positions[columns] - positions[rows]
+        squares = (delta**2).sum(axis=1) + 1e-9
+        attraction = delta * (np.sqrt(squares) - 1 / squares)[:, None]
+        forces = np.stack([np.bincount(rows, weights=attraction[:, d], minlength=n) for d in range(dim)], axis=1)
+        # Sums over no edges are integers.
+        forces = forces.astype(np.float64, copy=False)
+
+        samples = rng.integers(0, n, size=(n, negative))
+        delta = positions[:, None, :] - positions[samples]
+        squares = (delta**2).sum(axis=2) + 1e-9
+        forces += (delta / squares[:, :, None]).sum(axis=1) * ((n - 1) / negative)
+
+        lengths = np.linalg.norm(forces, axis=1) + 1e-12
+        positions += forces * (np.minimum(lengths, temperature) / lengths)[:, None]
+        temperature *= cooling
+
+    positions -= positions.mean(axis=0)
+    if len(edges):
+        lengths = np.linalg.norm(positions[heads] - positions[tails], axis=1)
+        positions *= LINK_DISTANCE / max(float(np.median(lengths)), 1e-9)
+    return positions.astype(np.float32)
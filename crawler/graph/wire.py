@@ -0,0 +1,51 @@
+import typing
+from typing import Dict, List
+
+__all__ = ["GraphEncoder"]
+
+
+class GraphEncoder:
+    """Compact wire format of plotted graphs, sent whole or in increments.
+
+    Node ids are sent once and links refer to nodes by their position, in a flat list
+    of (source, target, weight) triples. Colors are sent once in a palette that nodes
+    index into. Link colors and relations are derived from the weight by the client.
+    The encoder keeps its dictionaries between calls, so each increment only carries
+    new nodes, new colors and new links. Precomputed coordinates of nodes, when the
+    graph has a layout, come as a flat list of (x, y, z) triples, null for tags
+    outside the graph.
+    """
+
+    def __init__(self, precision: int = 3):
+        self.precision = precision
+        self.ids = {}
+        self.palette = {}
+
+    def __call__(self, nodes: List[Dict], links: List[Dict]) -> Dict[str, typing.Any]:
+        colors = len(self.palette)
+        encoded = {"nodes": [], "colors": [], "sizes": [], "links": []}
+        positions = []
+
+        for node in nodes:
+            if node["id"] in self.ids:
+                continue
+            self.ids[node["id"]] = len(self.ids)
+            encoded["nodes"].append(node["id"])
+            encoded["colors"].append(self.palette.setdefault(node["color"], len(self.palette)))
+            encoded["sizes"].append(node["size"])
+            positions.extend((node.get("x"), node.get("y"), node.get("z")))
+
+        for link in links:
+            encoded["links"].extend(
+                (
+                    self.ids[link["source"]],
+                    self.ids[link["target"]],
+                    round(link["value"], self.precision),
+                )
+            )
+
+        if any(value is not None for value in positions):
+            encoded["positions"] = positions
+        if len(self.palette) > colors:
+            encoded["palette"] = list(self.palette)[colors:]
+        return encoded
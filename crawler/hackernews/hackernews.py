@@ -2,7 +2,7 @@ import os
 import requests
 from bs4 import BeautifulSoup
 import datetime
-from typing import Dict, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 import concurrent.futures
 import logging
 import nltk
@@ -11,12 +11,32 @@ import re
 import math
 from pattern3.text.en import pluralize
 
+from ..crawl import Checkpoint, Telemetry
+from ..store import ContentStore
+
 class HackerNews:
-    def __init__(self, username: str, password: str, timeout: int = 10):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        timeout: int = 10,
+        checkpoint: Optional[str] = None,
+        max_pages: int = 10,
+        known: Optional[Iterable[str]] = None,
+        store: Optional[ContentStore] = None,
+    ):
         self.username = username
         self.password = password
         self.timeout = timeout
+        self.checkpoint = checkpoint
+        self.max_pages = max_pages
+        # Upvotes are listed newest first, the crawl stops at the page of a known url.
+        self.known = set(known) if known is not None else set()
+        # Full page text, kept apart from the summary of the document.
+        self.store = store
         self.logger = logging.getLogger(__name__)
+        self.telemetry = Telemetry("hackernews")
+        self._checkpoint = Checkpoint()
         self.base_url = "https://news.ycombinator.com"
         
         self._setup_nltk_resources()
@@ -206,48 +226,58 @@ class HackerNews:
 
     def _fetch_page_content(self, url: str) -> Optional[str]:
         try:
-            response = requests.get(url, timeout=self.timeout)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            for script in soup(["script", "style", "nav", "header", "footer"]):
-                script.decompose()
-            
-            content_tags = ['article', 'main', 'div', 'p']
-            content_text = []
+            response = self.telemetry.fetch(url, timeout=self.timeout)
             
-            for tag in content_tags:
-                elements = soup.find_all(tag, class_=lambda x: x and ('content' in x.lower() or 'article' in x.lower()))
-                content_text.extend([elem.get_text(strip=True) for elem in elements])
-            
-            if not content_text:
-                content_text = [soup.body.get_text(strip=True)] if soup.body else []
-            
-            return " ".join(content_text)
+            with self.telemetry.stage("parse"):
+                soup = BeautifulSoup(response.text, 'html.parser')
+                
+                for script in soup(["script", "style", "nav", "header", "footer"]):
+                    script.decompose()
+                
+                content_tags = ['article', 'main', 'div', 'p']
+                content_text = []
+                
+                for tag in content_tags:
+                    elements = soup.find_all(tag, class_=lambda x: x and ('content' in x.lower() or 'article' in x.lower()))
+                    content_text.extend([elem.get_text(strip=True) for elem in elements])
+                
+                if not content_text:
+                    content_text = [soup.body.get_text(strip=True)] if soup.body else []
+                
+                return " ".join(content_text)
         
         except requests.RequestException as e:
             self.logger.warning(f"Failed to fetch content for {url}: {e}")
             return None
 
-    def _parse_entry(self, entry: BeautifulSoup) -> Optional[Dict]:
-        try:
-            record = entry.find("a")
-            if not record:
-                return None
+    def _entry_link(self, entry: BeautifulSoup) -> Optional[Tuple[str, str]]:
+        """Url and title of an entry of the upvoted list."""
+        record = entry.find("a")
+        if not record:
+            return None
+
+        attributes = record.attrs
+        if not attributes or 'href' not in attributes:
+            return None
 
-            attributes = record.attrs
-            if not attributes or 'href' not in attributes:
-                return None
+        if self.username in attributes.get('href', '') or 'morelink' in attributes.get('class', []):
+            return None
+
+        url = attributes['href']
+        if not url.startswith(('http://', 'https://')):
+            url = urljoin(self.base_url, url)
 
-            if self.username in attributes.get('href', ''):
-                return None
+        return url, record.text.strip()
 
-            url = attributes['href']
-            if not url.startswith(('http://', 'https://')):
-                url = urljoin(self.base_url, url)
+    def _next_page(self, soup: BeautifulSoup) -> Optional[str]:
+        """Url of the next page of the upvoted list, from its "More" link."""
+        more = soup.find("a", class_="morelink")
+        if more is None or not more.get("href"):
+            return None
+        return urljoin(f"{self.base_url}/", more["href"])
 
-            title = record.text.strip()
+    def _parse_entry(self, url: str, title: str) -> Optional[Dict]:
+        try:
             tags = ["hackernews"]
             summary = ""
 
@@ -258,27 +288,39 @@ class HackerNews:
             else:
                 content = self._fetch_page_content(url)
                 if content:
-                    tags.extend(self._extract_tags(content))
-                    summary = self._generate_summary(content)
-
-            return {
-                url: {
-                    "title": f"HackerNews: {title}",
-                    "tags": list(set(tags)),
-                    "summary": summary,
-                    "date": datetime.datetime.today().strftime("%Y-%m-%d"),
-                }
+                    if self.store is not None:
+                        self.store.put(url, content)
+                    with self.telemetry.stage("nlp"):
+                        tags.extend(self._extract_tags(content))
+                        summary = self._generate_summary(content)
+
+            document = {
+                "title": f"HackerNews: {title}",
+                "tags": list(set(tags)),
+                "summary": summary,
+                "date": datetime.datetime.today().strftime("%Y-%m-%d"),
             }
+            self._checkpoint.add(url, document)
+            return {url: document}
         
         except Exception as e:
+            self.telemetry.failure("parse")
             self.logger.warning(f"Error parsing entry: {e}")
 
     def __call__(self) -> Dict:
+        """Crawls the upvoted list, page after page.
+
+        Entries are processed by a pool of threads while the next page is fetched. The
+        crawl stops after `max_pages` pages, or after the page holding a known url.
+        """
         logging.basicConfig(
             level=logging.INFO, 
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
 
+        # Entries parsed by an interrupted crawl of the same user are not fetched again.
+        self._checkpoint = Checkpoint(self.checkpoint, key=self.username, before_save=self._flush_store)
+
         with requests.Session() as session:
             session.headers.update({
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -287,30 +329,58 @@ class HackerNews:
             if not self._login(session):
                 return {}
 
+            data = dict(self._checkpoint.results)
+            futures: List[concurrent.futures.Future] = []
+            completed = True
             try:
-                response = session.get(
-                    f"{self.base_url}/upvoted?id={self.username}", 
-                    timeout=self.timeout
-                )
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.text, "html.parser")
-                entries = soup.find_all("td", class_="title")
-
-                data = {}
                 with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                    results = list(executor.map(self._parse_entry, entries))
-                    
-                    for result in results:
+                    url = f"{self.base_url}/upvoted?id={self.username}"
+                    for page in range(1, self.max_pages + 1):
+                        try:
+                            response = self.telemetry.fetch(url, session=session, timeout=self.timeout)
+                        except requests.RequestException as e:
+                            self.logger.error(f"Failed to fetch upvoted page {page}: {e}")
+                            completed = False
+                            break
+
+                        soup = BeautifulSoup(response.text, "html.parser")
+                        links = [
+                            link for link in map(self._entry_link, soup.find_all("td", class_="title"))
+                            if link is not None
+                        ]
+                        known = [link for link in links if link[0] in self.known]
+                        for link in links:
+                            if link[0] not in self.known and not self._checkpoint.done(link[0]):
+                                futures.append(executor.submit(self._parse_entry, *link))
+                        self.logger.info(f"HackerNews - Upvoted page {page}: {len(links)} entries, {len(known)} known")
+
+                        url = self._next_page(soup)
+                        if known or url is None:
+                            break
+
+                    for future in futures:
+                        result = future.result()
                         if result:
                             data.update(result)
 
-                return data
+            except BaseException:
+                self._checkpoint.save()
+                self._flush_store()
+                raise
+
+            self._flush_store()
+
+            if completed:
+                self._checkpoint.clear()
+            else:
+                self._checkpoint.save()
+            return data
+
+    def _flush_store(self) -> None:
+        # Entries saved in the checkpoint are not fetched again, their texts are flushed first.
+        if self.store is not None:
+            self.store.flush()
 
-            except requests.RequestException as e:
-                self.logger.error(f"Failed to fetch upvoted page: {e}")
-                return {}
-            
     def _get_github_info(self, url: str) -> tuple[str, list[str]]:
         try:
             path_parts = urlparse(url).path.strip('/').split('/')
@@ -322,14 +392,12 @@ class HackerNews:
             api_url = f"https://api.github.com/repos/{owner}/{repo}"
             headers = {'Accept': 'application/vnd.github.v3+json'}
             
-            response = requests.get(api_url, headers=headers, timeout=self.timeout)
-            response.raise_for_status()
+            response = self.telemetry.fetch(api_url, headers=headers, timeout=self.timeout)
             
             repo_data = response.json()
             
             topics_url = f"{api_url}/topics"
-            topics_response = requests.get(topics_url, headers=headers, timeout=self.timeout)
-            topics_response.raise_for_status()
+            topics_response = self.telemetry.fetch(topics_url, headers=headers, timeout=self.timeout)
             
             topics_data = topics_response.json()
             tags = topics_data.get('names', [])
@@ -0,0 +1,5 @@
+from .facets import Bitmap, Facets
+from .index import SparseIndex
+from .tagindex import TagIndex
+
+__all__ = ["Bitmap", "Facets", "SparseIndex", "TagIndex"]
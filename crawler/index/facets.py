@@ -0,0 +1,176 @@
+import typing
+from typing import Dict, List, Optional
+
+import numpy as np
+
+__all__ = ["Bitmap", "Facets"]
+
+# Day of the rows without a date, sorted after every date.
+MISSING_DAY = np.iinfo(np.int32).min
+
+
+class Bitmap:
+    """Immutable set of rows, stored as a sorted array of rows when sparse and as a
+    packed bitset otherwise, whichever takes less memory, as the containers of Roaring
+    bitmaps.
+
+    Most tags are on a few documents and take 4 bytes per document, frequent tags and
+    dates take one bit per row.
+    """
+
+    __slots__ = ("rows", "bits")
+
+    def __init__(self, rows: Optional[np.ndarray] = None, bits: Optional[np.ndarray] = None):
+        self.rows = rows
+        self.bits = bits
+
+    @classmethod
+    def from_rows(cls, rows: typing.Iterable[int]) -> "Bitmap":
+        rows = np.unique(np.asarray(rows, dtype=np.int32))
+        if len(rows) and len(rows) * 32 > int(rows[-1]) + 1:
+            mask = np.zeros(int(rows[-1]) + 1, dtype=bool)
+            mask[rows] = True
+            return cls(bits=np.packbits(mask, bitorder="little"))
+        return cls(rows=rows)
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "Bitmap":
+        return cls.from_rows(np.flatnonzero(mask))
+
+    def __len__(self) -> int:
+        if self.rows is not None:
+            return len(self.rows)
+        return int(np.bitwise_count(self.bits).sum())
+
+    @property
+    def nbytes(self) -> int:
+        return (self.rows if self.rows is not None else self.bits).nbytes
+
+    def to_rows(self) -> np.ndarray:
+        if self.rows is not None:
+            return self.rows
+        return np.flatnonzero(np.unpackbits(self.bits, bitorder="little")).astype(np.int32)
+
+    def mask(self, n: int) -> np.ndarray:
+        """Boolean mask of the rows below n."""
+        if self.rows is not None:
+            mask = np.zeros(n, dtype=bool)
+            mask[self.rows[self.rows < n]] = True
+            return mask
+        mask = np.unpackbits(self.bits, count=min(n, len(self.bits) * 8), bitorder="little").view(bool)
+        return np.concatenate([mask, np.zeros(n - len(mask), dtype=bool)]) if len(mask) < n else mask
+
+    def __contains__(self, row: int) -> bool:
+        if self.rows is not None:
+            position = np.searchsorted(self.rows, row)
+            return bool(position < len(self.rows) and self.rows[position] == row)
+        return row < len(self.bits) * 8 and bool(self.bits[row >> 3] >> (row & 7) & 1)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        if self.rows is not None and other.rows is not None:
+            return Bitmap(rows=np.intersect1d(self.rows, other.rows, assume_unique=True))
+        if self.rows is not None or other.rows is not None:
+            rows, bitmap = (self.rows, other) if self.rows is not None else (other.rows, self)
+            return Bitmap(rows=rows[bitmap.mask(int(rows[-1]) + 1 if len(rows) else 0)[rows]])
+        n = min(len(self.bits), len(other.bits))
+        return Bitmap.from_mask(np.unpackbits(self.bits[:n] & other.bits[:n], bitorder="little").view(bool))
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        if self.rows is not None and other.rows is not None:
+            return Bitmap.from_rows(np.union1d(self.rows, other.rows))
+        n = max(self._universe(), other._universe())
+        return Bitmap.from_mask(self.mask(n) | other.mask(n))
+
+    def _universe(self) -> int:
+        if self.rows is not None:
+            return int(self.rows[-1]) + 1 if len(self.rows) else 0
+        return len(self.bits) * 8
+
+
+class Facets:
+    """Bitmaps of the rows of each tag and of each date bucket, the year ("2024") and the
+    month ("2024-05"), used as pre-filters of retrieval.
+
+    Rows are never reused, so the bitmaps of removed documents are left as they are:
+    retrieval already skips removed rows. Dates are also kept as days since the epoch,
+    MISSING_DAY when missing, to sort documents without parsing them.
+    """
+
+    def __init__(self):
+        self.tags = {}
+        self.buckets = {}
+        self.days = np.zeros(0, dtype=np.int32)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.days)
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + sum(
+            bitmap.nbytes for bitmaps in (self.tags, self.buckets) for bitmap in bitmaps.values()
+        )
+
+    def add(self, offsets: np.ndarray, postings: np.ndarray, dates: List[str]) -> None:
+        """Appends rows, whose tag ids are the slices of postings delimited by offsets."""
+        rows = np.arange(self.n_rows, self.n_rows + len(dates), dtype=np.int32)
+        self._extend(self.tags, np.repeat(rows, np.diff(offsets)), postings)
+
+        days = np.array([parse_date(date) for date in dates], dtype="datetime64[D]")
+        known = ~np.isnat(days)
+        for unit in ("Y", "M"):
+            buckets = np.datetime_as_string(days[known].astype(f"datetime64[{unit}]"))
+            self._extend(self.buckets, rows[known], buckets)
+        self.days = np.concatenate(
+            [self.days, np.where(known, days.astype(np.int64), MISSING_DAY).astype(np.int32)]
+        )
+
+    @staticmethod
+    def _extend(bitmaps: Dict, rows: np.ndarray, keys: np.ndarray) -> None:
+        if not len(rows):
+            return
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        for key, group in zip(keys[starts].tolist(), np.split(rows, starts[1:])):
+            bitmap = Bitmap.from_rows(group)
+            bitmaps[key] = bitmap if key not in bitmaps else bitmaps[key] | bitmap
+
+    def filter(self, tags: typing.Iterable[int] = (), dates: typing.Iterable[str] = ()) -> Optional[Bitmap]:
+        """Rows with every tag, within any of the date buckets, None without a filter.
+
+        Unknown tags or buckets match no row. Intersections start from the smallest bitmap.
+        """
+        empty = Bitmap.from_rows([])
+        bitmaps = [self.tags.get(tag, empty) for tag in tags]
+        dates = list(dates)
+        if dates:
+            union = empty
+            for date in dates:
+                union = union | self.buckets.get(date, empty)
+            bitmaps.append(union)
+        if not bitmaps:
+            return None
+
+        bitmaps.sort(key=len)
+        selected = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            if not len(selected):
+                break
+            selected = selected & bitmap
+        return selected
+
+    def date_counts(self, rows: typing.Sequence[int]) -> Dict[str, int]:
+        """Number of rows of each year, most recent first."""
+        days = self.days[np.asarray(rows, dtype=np.int64)]
+        years = np.datetime_as_string(days[days != MISSING_DAY].astype("datetime64[D]").astype("datetime64[Y]"))
+        unique, counts = np.unique(years, return_counts=True)
+        return {year: int(count) for year, count in zip(unique[::-1].tolist(), counts[::-1].tolist())}
+
+
+def parse_date(date: str) -> np.datetime64:
+    """ISO dates, year-months and years, NaT for anything else."""
+    try:
+        return np.datetime64(date or "NaT", "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
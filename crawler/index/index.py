@@ -0,0 +1,777 @@
+import collections
+import functools
+import itertools
+import re
+import string
+import threading
+import typing
+import unicodedata
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+__all__ = ["SparseIndex"]
+
+_EPSILON = 1e-6
+_FIRST_BATCH = 8
+_PRUNING_MIN_POSTINGS = 50_000
+_SCALE = float(2**32)
+_MAX_SEGMENTS = 4
+
+
+# Version of analyze, indexes analyzed by another one are built again.
+ANALYZER_VERSION = 2
+
+_WHITE_SPACES = re.compile(r"\s\s+")
+_ASCII_PUNCTUATION = str.maketrans("", "", string.punctuation)
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+
+
+def analyze(text: str, ngram_range: Tuple[int, int]) -> List[str]:
+    """Char n-grams within word boundaries, as sklearn's char_wb analyzer.
+
+    Text is normalized as by lenlp: lowercased, stripped of accents and of punctuation,
+    so that "e-mail," is "email". Each word is padded with spaces.
+    """
+    text = text.casefold()
+    if text.isascii():
+        text = text.translate(_ASCII_PUNCTUATION)
+    else:
+        text = "".join(
+            char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char)
+        )
+        text = _PUNCTUATION.sub("", text)
+
+    min_n, max_n = ngram_range
+    grams = []
+    for word in _WHITE_SPACES.sub(" ", text).split():
+        word = f" {word} "
+        for n in range(min_n, max_n + 1):
+            offset = 0
+            grams.append(word[offset : offset + n])
+            while offset + n < len(word):
+                offset += 1
+                grams.append(word[offset : offset + n])
+            if offset == 0:
+                break
+    return grams
+
+
+class SparseIndex:
+    """Char n-gram index shared by every lexical retriever.
+
+    Documents are analyzed once over the widest n-gram range into segments. Documents
+    added later go to small delta segments and removed documents are masked; segments are
+    merged in the background, without analyzing documents again, once there are too many.
+    Rows are global and stable: the n-th document ever added is row n.
+
+    BM25 statistics are global: document frequencies, the number of documents and their
+    average length are summed over the live documents of every segment, so that every
+    segment scores as the index rebuilt from the live documents would. They are computed
+    again at the first search after changes, or by refresh once a batch of changes is
+    done, rather than after each add or remove.
+    """
+
+    def __init__(
+        self,
+        documents: typing.List[typing.Dict],
+        fields: typing.List[str],
+        ngram_range: Tuple[int, int] = (2, 7),
+        max_segments: int = _MAX_SEGMENTS,
+    ):
+        self.fields = list(fields)
+        self.ngram_range = ngram_range
+        self.max_segments = max_segments
+        self.analyzer = functools.partial(analyze, ngram_range=ngram_range)
+        self.analyzer_version = ANALYZER_VERSION
+        self.n_rows = 0
+        self.deleted = set()
+        self.segments = []
+        self._version = 0
+        self._statistics = {}
+        self._pairs = {}
+        self._lock = threading.Lock()
+        self._computing = threading.Lock()
+        self._merging = None
+        self.add(documents)
+
+    def __getstate__(self):
+        self.wait()
+        state = self.__dict__.copy()
+        del state["_lock"], state["_computing"], state["_merging"]
+        state["_pairs"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("_pairs", {})
+        self.__dict__.setdefault("analyzer_version", 1)
+        self._lock = threading.Lock()
+        self._computing = threading.Lock()
+        self._merging = None
+
+    @staticmethod
+    def segment(
+        documents: typing.List[typing.Dict],
+        rows: typing.Sequence[int],
+        fields: typing.List[str],
+        ngram_range: Tuple[int, int] = (2, 7),
+    ) -> "Segment":
+        """Segment of documents at rows, built apart, in another process for instance."""
+        return Segment.build(
+            documents=documents,
+            rows=np.asarray(rows, dtype=np.int64),
+            fields=list(fields),
+            analyzer=functools.partial(analyze, ngram_range=ngram_range),
+        )
+
+    @classmethod
+    def from_segments(
+        cls,
+        segments: typing.List["Segment"],
+        fields: typing.List[str],
+        ngram_range: Tuple[int, int] = (2, 7),
+        max_segments: int = _MAX_SEGMENTS,
+    ) -> "SparseIndex":
+        """Index of segments built apart, of consecutive rows from 0, merged into one."""
+        index = cls(documents=[], fields=fields, ngram_range=ngram_range, max_segments=max_segments)
+        index.segments = [Segment.merge(segments)] if len(segments) > 1 else list(segments)
+        index.n_rows = sum(segment.n_documents for segment in segments)
+        index._version += 1
+        return index
+
+    @property
+    def outdated(self) -> bool:
+        """Whether documents were analyzed by another version of analyze, in which case
+        the index is to be built again."""
+        return self.analyzer_version != ANALYZER_VERSION
+
+    @property
+    def n_documents(self) -> int:
+        return self.n_rows - len(self.deleted)
+
+    def add(self, documents: typing.List[typing.Dict]) -> List[int]:
+        """Indexes documents in a new segment and returns their rows."""
+        with self._lock:
+            rows = np.arange(self.n_rows, self.n_rows + len(documents))
+            self.n_rows += len(documents)
+
+        if not len(rows):
+            return []
+
+        segment = Segment.build(
+            documents=documents, rows=rows, fields=self.fields, analyzer=self.analyzer
+        )
+        with self._lock:
+            self.segments = self.segments + [segment]
+            self._version += 1
+
+        if len(self.segments) > self.max_segments:
+            self.merge(wait=False)
+        return rows.tolist()
+
+    def remove(self, rows: typing.Iterable[int]) -> None:
+        """Removes documents by row. They are dropped from the postings at the next merge."""
+        rows = np.unique(np.fromiter(rows, dtype=np.int64))
+        if not len(rows):
+            return
+        with self._lock:
+            self.deleted.update(rows.tolist())
+            for segment in self.segments:
+                segment.delete(rows)
+            self._version += 1
+
+    def merge(self, wait: bool = True) -> None:
+        """Merges every segment into one, in a background thread unless waiting."""
+        with self._lock:
+            if self._merging is None or not self._merging.is_alive():
+                self._merging = threading.Thread(target=self._merge, daemon=True)
+                self._merging.start()
+            merging = self._merging
+        if wait:
+            merging.join()
+
+    def wait(self) -> None:
+        """Waits for a background merge to complete."""
+        merging = self._merging
+        if merging is not None:
+            merging.join()
+
+    def _merge(self) -> None:
+        segments = self.segments
+        if len(segments) < 2 and not any(segment.n_deleted for segment in segments):
+            return
+
+        merged = Segment.merge(segments)
+
+        with self._lock:
+            # Documents removed during the merge are still live in the merged segment.
+            if self.deleted:
+                merged.delete(np.fromiter(self.deleted, dtype=np.int64))
+            self.segments = [merged] + self.segments[len(segments):]
+            self._version += 1
+        self.refresh()
+
+    def view(
+        self,
+        fields: typing.List[str],
+        ngram_range: Tuple[int, int],
+        k: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "View":
+        """Returns a BM25 retriever over a subset of fields and n-gram lengths."""
+        return View(index=self, fields=fields, ngram_range=ngram_range, k=k, k1=k1, b=b)
+
+    def statistics(
+        self, fields: typing.List[str], ngram_range: Tuple[int, int], k1: float, b: float
+    ) -> Dict:
+        """BM25 statistics of a view, computed once per version of the index.
+
+        Returns the segments they were computed for along with the statistics of each.
+        """
+        key = (tuple(fields), tuple(ngram_range), k1, b)
+        with self._computing:
+            version, statistics = self._statistics.get(key, (None, None))
+            if version == self._version:
+                return statistics
+
+            with self._lock:
+                version, segments = self._version, self.segments
+            frequencies = [
+                segment.frequencies(fields=fields, ngram_range=ngram_range) for segment in segments
+            ]
+            n = sum(segment.n_documents - segment.n_deleted for segment in segments)
+            length = sum(
+                float(frequency["document_length"][segment.live].sum())
+                for segment, frequency in zip(segments, frequencies)
+            )
+            average_length = (length / n if n else 0.0) or 1.0
+
+            statistics = {
+                "segments": segments,
+                "views": [
+                    segment.statistics(
+                        fields=fields,
+                        frequencies=frequency,
+                        df=df,
+                        n=n,
+                        average_length=average_length,
+                        k1=k1,
+                        b=b,
+                    )
+                    for segment, frequency, df in zip(
+                        segments, frequencies, self._document_frequencies(segments, frequencies)
+                    )
+                ],
+                "average_length": average_length,
+            }
+            self._statistics[key] = (version, statistics)
+            return statistics
+
+    def _document_frequencies(self, segments: List["Segment"], frequencies: List[Dict]) -> List[np.ndarray]:
+        """Document frequencies of the columns of each segment, summed over every segment.
+
+        Pairs of segments are matched by looking up the n-grams of the smaller vocabulary
+        in the larger one, so a delta segment costs the size of its own vocabulary. The
+        vocabularies of segments do not change, matches are kept for every view and
+        version until a segment is merged.
+        """
+        totals = [frequency["df"].astype(np.int64) for frequency in frequencies]
+        pairs = {}
+        for i, j in itertools.combinations(range(len(segments)), 2):
+            if len(segments[i].vocabulary) > len(segments[j].vocabulary):
+                i, j = j, i
+            key = (segments[i], segments[j])
+            matches = self._pairs.get(key)
+            if matches is None:
+                vocabulary = segments[j].vocabulary
+                matches = np.array(
+                    [
+                        (column, vocabulary[gram])
+                        for gram, column in segments[i].vocabulary.items()
+                        if gram in vocabulary
+                    ],
+                    dtype=np.int64,
+                ).reshape(-1, 2).T
+            pairs[key] = matches
+            small, large = matches
+            totals[i][small] += frequencies[j]["df"][large]
+            totals[j][large] += frequencies[i]["df"][small]
+        self._pairs = pairs
+        return totals
+
+    def refresh(self) -> None:
+        """Computes again the statistics of the views searched so far, after changes."""
+        for fields, ngram_range, k1, b in list(self._statistics):
+            self.statistics(fields=list(fields), ngram_range=ngram_range, k1=k1, b=b)
+
+    def query_weights(
+        self, grams: typing.Dict[str, int], statistics: Dict, k1: float, b: float
+    ) -> Dict[str, float]:
+        """BM25 weights of the query n-grams known to a view, normalized to unit length.
+
+        The query is weighted as a document, as the BM25 vectorizers of lenlp did.
+        """
+        idf = {}
+        for gram in grams:
+            for segment, view in zip(statistics["segments"], statistics["views"]):
+                column = segment.vocabulary.get(gram)
+                if column is not None and view["idf"][column] > 0:
+                    idf[gram] = float(view["idf"][column])
+                    break
+        if not idf:
+            return {}
+
+        length = sum(grams[gram] for gram in idf)
+        regularization = k1 * (1 - b + b * length / statistics["average_length"])
+        weights = {
+            gram: idf[gram] * grams[gram] * (k1 + 1) / (grams[gram] + regularization)
+            for gram in idf
+        }
+        norm = np.sqrt(sum(weight**2 for weight in weights.values()))
+        return {gram: weight / norm for gram, weight in weights.items()}
+
+    def search(
+        self,
+        q: str,
+        fields: typing.List[str],
+        ngram_range: Tuple[int, int],
+        k: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+        pruning: bool = True,
+        allowed: typing.Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """Returns the top k (row, score) pairs of a view for a query across segments.
+
+        With a boolean mask of allowed rows, only those are scored, so the top k is the
+        top k of the allowed rows rather than a filtered top k.
+        """
+        if k <= 0:
+            return []
+
+        grams = collections.Counter(self.analyzer(q))
+        if not grams:
+            return []
+
+        statistics = self.statistics(fields=fields, ngram_range=ngram_range, k1=k1, b=b)
+        query = self.query_weights(grams=grams, statistics=statistics, k1=k1, b=b)
+        if not query:
+            return []
+
+        results = []
+        for segment, view in zip(statistics["segments"], statistics["views"]):
+            if allowed is not None:
+                segment_allowed = np.zeros(segment.n_documents, dtype=bool)
+                inside = segment.rows < len(allowed)
+                segment_allowed[inside] = allowed[segment.rows[inside]]
+                if not segment_allowed.any():
+                    continue
+            results.extend(
+                segment.search(
+                    query=query,
+                    statistics=view,
+                    fields=fields,
+                    k=k,
+                    k1=k1,
+                    b=b,
+                    pruning=pruning,
+                    allowed=None if allowed is None else segment_allowed,
+                )
+            )
+        results.sort(key=lambda result: (-result[1], result[0]))
+        return results[:k]
+
+
+class Segment:
+    """Char n-gram postings of a batch of documents.
+
+    Each field keeps its own count matrix, so a BM25 retriever over any subset of fields
+    and any narrower n-gram range is a view that only stores a few per-document vectors.
+    Segments are immutable apart from their deletion mask.
+    """
+
+    def __init__(
+        self,
+        rows: np.ndarray,
+        vocabulary: typing.Dict[str, int],
+        matrices: typing.Dict[str, sparse.csc_matrix],
+    ):
+        self.rows = rows
+        self.vocabulary = vocabulary
+        self.matrices = matrices
+        self.n_documents = len(rows)
+        self.live = np.ones(self.n_documents, dtype=bool)
+        self.n_deleted = 0
+
+        self.lengths = np.zeros(len(vocabulary), dtype=np.int8)
+        for gram, column in vocabulary.items():
+            self.lengths[column] = len(gram)
+
+        for matrix in self.matrices.values():
+            matrix.sort_indices()
+        self._frequencies = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_frequencies"] = {}
+        return state
+
+    @classmethod
+    def build(
+        cls,
+        documents: typing.List[typing.Dict],
+        rows: np.ndarray,
+        fields: typing.List[str],
+        analyzer: typing.Callable[[str], List[str]],
+    ) -> "Segment":
+        """Analyzes the fields of the documents in a single pass."""
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        vectorizer = CountVectorizer(analyzer=analyzer, dtype=np.int32)
+        texts = [str(document.get(field) or "") for document in documents for field in fields]
+
+        try:
+            matrix = vectorizer.fit_transform(texts).tocsr()
+            vocabulary = vectorizer.vocabulary_
+        except ValueError:
+            matrix = sparse.csr_matrix((len(texts), 0), dtype=np.int32)
+            vocabulary = {}
+
+        return cls(
+            rows=rows,
+            vocabulary=vocabulary,
+            matrices={
+                field: matrix[position::len(fields)].tocsc()
+                for position, field in enumerate(fields)
+            },
+        )
+
+    @classmethod
+    def merge(cls, segments: typing.List["Segment"]) -> "Segment":
+        """Merges segments without analyzing documents again, dropping deleted rows."""
+        vocabulary = dict(segments[0].vocabulary)
+        remaps = [None]
+        for segment in segments[1:]:
+            remap = np.empty(len(segment.vocabulary), dtype=np.int64)
+            for gram, column in segment.vocabulary.items():
+                remap[column] = vocabulary.setdefault(gram, len(vocabulary))
+            remaps.append(remap)
+
+        matrices = {}
+        for field in segments[0].matrices:
+            blocks = []
+            for segment, remap in zip(segments, remaps):
+                matrix = segment.matrices[field]
+                if segment.n_deleted:
+                    matrix = matrix[segment.live]
+                if remap is None:
+                    indptr = np.concatenate([
+                        matrix.indptr,
+                        np.full(len(vocabulary) - matrix.shape[1], matrix.indptr[-1]),
+                    ])
+                    matrix = sparse.csc_matrix(
+                        (matrix.data, matrix.indices, indptr),
+                        shape=(matrix.shape[0], len(vocabulary)),
+                    )
+                else:
+                    matrix = matrix.tocoo()
+                    matrix = sparse.csc_matrix(
+                        (matrix.data, (matrix.row, remap[matrix.col])),
+                        shape=(matrix.shape[0], len(vocabulary)),
+                    )
+                blocks.append(matrix)
+            matrices[field] = sparse.vstack(blocks, format="csc")
+
+        rows = np.concatenate([segment.rows[segment.live] for segment in segments])
+        return cls(rows=rows, vocabulary=vocabulary, matrices=matrices)
+
+    def delete(self, rows: np.ndarray) -> None:
+        """Masks the global rows that belong to this segment."""
+        positions = np.searchsorted(self.rows, rows)
+        positions = positions[positions < self.n_documents]
+        self.live[positions[np.isin(self.rows[positions], rows)]] = False
+        self.n_deleted = int(self.n_documents - self.live.sum())
+
+    def frequencies(self, fields: typing.List[str], ngram_range: Tuple[int, int]) -> Dict:
+        """Document frequencies of the live documents, and document lengths, of a view."""
+        key = (tuple(fields), tuple(ngram_range), self.n_deleted)
+        if key in self._frequencies:
+            return self._frequencies[key]
+
+        mask = (self.lengths >= ngram_range[0]) & (self.lengths <= ngram_range[1])
+        rows, columns, tf = self._postings(fields=fields, mask=mask)
+        frequencies = {
+            "mask": mask,
+            "df": np.bincount(columns[self.live[rows]], minlength=len(self.lengths)),
+            "document_length": np.bincount(rows, weights=tf, minlength=self.n_documents),
+        }
+        # Frequencies before a deletion are not used again.
+        self._frequencies = {
+            cached: value for cached, value in self._frequencies.items() if cached[2] == self.n_deleted
+        }
+        self._frequencies[key] = frequencies
+        return frequencies
+
+    def statistics(
+        self,
+        fields: typing.List[str],
+        frequencies: Dict,
+        df: np.ndarray,
+        n: int,
+        average_length: float,
+        k1: float,
+        b: float,
+    ) -> Dict:
+        """BM25 statistics of a view, from document frequencies of the columns, the number
+        of documents and their average length over every segment."""
+        mask, document_length = frequencies["mask"], frequencies["document_length"]
+        rows, columns, tf = self._postings(fields=fields, mask=mask)
+
+        idf = np.log(1.0 + (max(n, 1) - df + 0.5) / (df + 0.5)).astype(np.float32)
+        idf[~mask | (df == 0)] = 0.0
+
+        weights = self._weights(
+            tf=tf,
+            idf=idf[columns],
+            document_length=document_length[rows],
+            average_length=average_length,
+            k1=k1,
+            b=b,
+        )
+        norms = np.sqrt(np.bincount(rows, weights=weights**2, minlength=self.n_documents))
+        norms[norms == 0] = 1.0
+
+        # Largest normalized contribution of each column, used by MaxScore pruning.
+        upper_bounds = np.zeros(len(self.lengths), dtype=np.float32)
+        if len(columns):
+            starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+            upper_bounds[columns[starts]] = np.maximum.reduceat(weights / norms[rows], starts)
+            upper_bounds *= 1 + _EPSILON
+
+        return {
+            "idf": idf,
+            "document_length": document_length.astype(np.float32),
+            "average_length": float(average_length),
+            "norms": norms.astype(np.float32),
+            "upper_bounds": upper_bounds,
+        }
+
+    def search(
+        self,
+        query: typing.Dict[str, float],
+        statistics: Dict,
+        fields: typing.List[str],
+        k: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+        pruning: bool = True,
+        allowed: typing.Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """Returns the top k (row, score) pairs of a view for weighted query n-grams.
+
+        Query terms are scored by decreasing upper bound, in batches of growing size. When
+        the postings are long enough to be worth pruning (MaxScore), once the remaining
+        upper bounds cannot lift an unseen document above the current k-th score, later
+        batches only score the surviving candidates, and candidates that cannot reach the
+        k-th score are dropped. Contributions are rounded to multiples of 2**-32 so sums are
+        exact whatever the batching, and the top k is identical to exhaustive scoring.
+        Rows outside the allowed mask start out pruned, their postings are never scored.
+        """
+        terms = self.terms(query=query)
+        if not terms:
+            return []
+
+        columns = np.fromiter(terms.keys(), dtype=np.int64, count=len(terms))
+        query_weights = np.fromiter(terms.values(), dtype=np.float32, count=len(terms))
+        upper_bounds = statistics["upper_bounds"][columns].astype(np.float64) * query_weights
+
+        order = np.argsort(-upper_bounds, kind="stable")
+        columns, query_weights, upper_bounds = columns[order], query_weights[order], upper_bounds[order]
+
+        n_postings = sum(
+            int((self.matrices[field].indptr[columns + 1] - self.matrices[field].indptr[columns]).sum())
+            for field in fields
+        )
+
+        if not pruning or n_postings < _PRUNING_MIN_POSTINGS:
+            batches = [len(columns)]
+        else:
+            batches = [min(_FIRST_BATCH << step, len(columns)) for step in range(len(columns))]
+            batches = sorted(set(batches))
+
+        scores = np.zeros(self.n_documents)
+        alive = None if allowed is None else allowed.copy()
+        start = 0
+
+        for end in batches:
+            counts = self._counts(fields=fields, columns=columns[start:end])
+            positions = np.repeat(np.arange(start, end), np.diff(counts.indptr))
+            rows, tf = counts.indices, counts.data
+
+            if alive is not None:
+                keep = alive[rows]
+                positions, rows, tf = positions[keep], rows[keep], tf[keep]
+
+            weights = self._weights(
+                tf=tf,
+                idf=statistics["idf"][columns[positions]],
+                document_length=statistics["document_length"][rows],
+                average_length=statistics["average_length"],
+                k1=k1,
+                b=b,
+            )
+            weights = weights * query_weights[positions] / statistics["norms"][rows]
+            scores += np.bincount(
+                rows, weights=np.round(weights * _SCALE), minlength=self.n_documents
+            )
+            if self.n_deleted:
+                scores[~self.live] = 0.0
+            start = end
+
+            if start == len(columns):
+                break
+
+            remaining = upper_bounds[start:].sum() * _SCALE + 0.5 * (len(columns) - start)
+            candidates = np.flatnonzero(scores > 0) if alive is None else np.flatnonzero(alive)
+            if len(candidates) < k:
+                continue
+
+            partial = scores[candidates]
+            threshold = np.partition(partial, len(partial) - k)[len(partial) - k] - 1.0
+
+            if alive is None and remaining >= threshold:
+                continue
+
+            alive = np.zeros(self.n_documents, dtype=bool)
+            alive[candidates[partial + remaining >= threshold]] = True
+
+        if alive is not None:
+            scores[~alive] = 0.0
+        return [
+            (int(self.rows[row]), score)
+            for row, score in self.top_k(scores=scores / _SCALE, k=k)
+        ]
+
+    def terms(self, query: typing.Dict[str, float]) -> Dict[int, float]:
+        """Maps the weights of query n-grams to the columns of the segment."""
+        terms = {}
+        for gram, weight in query.items():
+            column = self.vocabulary.get(gram)
+            if column is not None:
+                terms[column] = weight
+        return terms
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top k rows by decreasing score, ties broken by row."""
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            kth = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+            above = candidates[scores[candidates] > kth]
+            ties = candidates[scores[candidates] == kth][: k - len(above)]
+            candidates = np.concatenate([above, ties])
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(row), float(scores[row])) for row in candidates]
+
+    @staticmethod
+    def _weights(tf, idf, document_length, average_length, k1, b):
+        tf = tf.astype(np.float32)
+        return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * document_length / average_length))
+
+    def _postings(self, fields: typing.List[str], mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows, columns and counts of the postings of the fields in the masked columns."""
+        counts = self._counts(fields=fields, columns=None)
+        columns = np.repeat(np.arange(counts.shape[1]), np.diff(counts.indptr))
+        keep = mask[columns]
+        return counts.indices[keep], columns[keep], counts.data[keep]
+
+    def _counts(self, fields: typing.List[str], columns) -> sparse.csc_matrix:
+        """Sums the count matrices of the fields, optionally on a subset of columns."""
+        counts = None
+        for field in fields:
+            matrix = self.matrices[field]
+            if columns is not None:
+                matrix = matrix[:, columns]
+            counts = matrix if counts is None else counts + matrix
+        return counts.tocsc()
+
+
+class View:
+    """BM25 retriever served by a SparseIndex.
+
+    Retrievers take an optional boolean mask of the rows allowed by filters.
+    """
+
+    def __init__(
+        self,
+        index: SparseIndex,
+        fields: typing.List[str],
+        ngram_range: Tuple[int, int],
+        k: int,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.index = index
+        self.fields = list(fields)
+        self.ngram_range = tuple(ngram_range)
+        self.k = k
+        self.k1 = k1
+        self.b = b
+
+    def __call__(self, q: str, allowed: typing.Optional[np.ndarray] = None) -> List[int]:
+        """Returns the ranked rows of the documents."""
+        return [row for row, _ in self.scores(q, allowed=allowed)]
+
+    def scores(self, q: str, allowed: typing.Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        return self.index.search(
+            q=q,
+            fields=self.fields,
+            ngram_range=self.ngram_range,
+            k=self.k,
+            k1=self.k1,
+            b=self.b,
+            allowed=allowed,
+        )
+
+    def __or__(self, other) -> "Union":
+        return Union([self, other])
+
+    def __and__(self, other) -> "Intersection":
+        return Intersection([self, other])
+
+
+class Union:
+    """Rows retrieved by any view, ranked in the order of the views."""
+
+    def __init__(self, models: typing.List):
+        self.models = models
+
+    def __call__(self, q: str, allowed: typing.Optional[np.ndarray] = None) -> List[int]:
+        rows = {}
+        for model in self.models:
+            for row in model(q, allowed=allowed):
+                rows.setdefault(row, True)
+        return list(rows)
+
+    def __or__(self, other) -> "Union":
+        return Union(self.models + [other])
+
+
+class Intersection:
+    """Rows retrieved by every view, ranked by the first view."""
+
+    def __init__(self, models: typing.List):
+        self.models = models
+
+    def __call__(self, q: str, allowed: typing.Optional[np.ndarray] = None) -> List[int]:
+        rows = self.models[0](q, allowed=allowed)
+        for model in self.models[1:]:
+            found = set(model(q, allowed=allowed))
+            rows = [row for row in rows if row in found]
+        return rows
+
+    def __and__(self, other) -> "Intersection":
+        return Intersection(self.models + [other])
@@ -0,0 +1,116 @@
+import collections
+import re
+import typing
+from typing import Dict, List
+
+__all__ = ["TagIndex"]
+
+_TOP = 10
+
+
+def normalize(text: str) -> str:
+    """Tags are lowercase words joined by hyphens."""
+    return re.sub(r"[\s_]+", "-", text.strip().lower())
+
+
+def ngrams(text: str, n: int = 3) -> typing.Set[str]:
+    text = f" {text} "
+    return {text[i : i + n] for i in range(max(len(text) - n + 1, 1))}
+
+
+class TagIndex:
+    """Exact, prefix and fuzzy lookups over the tag vocabulary.
+
+    A trie keyed by characters stores, at every node, the most frequent tags of its
+    subtree, so completing a prefix only walks the prefix. A char 3-gram posting index
+    gives fuzzy candidates ranked by Dice similarity, with tag frequency as tie-breaker.
+    Frequencies are the number of documents tagged with each tag.
+    """
+
+    def __init__(self, frequencies: typing.Dict[str, int]):
+        self.tags = sorted(frequencies, key=lambda tag: (-frequencies[tag], tag))
+        self.frequencies = [frequencies[tag] for tag in self.tags]
+        self.tag_to_id = {tag: idx for idx, tag in enumerate(self.tags)}
+
+        self.trie = {"children": {}, "top": []}
+        self.postings = collections.defaultdict(list)
+        self.n_grams = []
+
+        # Tags are inserted by decreasing frequency, so each node keeps its top tags.
+        for idx, tag in enumerate(self.tags):
+            node = self.trie
+            for char in normalize(tag):
+                node = node["children"].setdefault(char, {"children": {}, "top": []})
+                if len(node["top"]) < _TOP:
+                    node["top"].append(idx)
+
+            grams = ngrams(normalize(tag))
+            self.n_grams.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(idx)
+
+        self.postings = dict(self.postings)
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __call__(self, q: str, k: int = 10) -> List[str]:
+        """Returns the tags matching the words of a query.
+
+        Words and pairs of adjacent words are matched exactly, by prefix and fuzzily.
+        Exact matches come first, then prefix matches by frequency, then tags by
+        similarity with the closest query term.
+        """
+        words = [normalize(word) for word in q.split() if word.strip()]
+        terms = words + [f"{head}-{tail}" for head, tail in zip(words[:-1], words[1:])]
+
+        scores = {}
+        for term in terms:
+            idx = self.tag_to_id.get(term)
+            if idx is not None:
+                scores[idx] = 2.0
+            if len(term) >= 3:
+                for idx in self._prefixed(term):
+                    scores[idx] = max(scores.get(idx, 0.0), 1.0)
+            for idx, score in self.fuzzy(term).items():
+                if scores.get(idx, 0.0) < score:
+                    scores[idx] = score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.tags[idx] for idx, _ in ranked[:k]]
+
+    def complete(self, prefix: str, k: int = 10) -> List[str]:
+        """Most frequent tags starting with a prefix, then fuzzy matches of the prefix."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        completions = self._prefixed(prefix)[:k]
+        if len(completions) < k:
+            found = set(completions)
+            fuzzy = sorted(self.fuzzy(prefix).items(), key=lambda item: (-item[1], item[0]))
+            completions.extend(idx for idx, _ in fuzzy if idx not in found)
+        return [self.tags[idx] for idx in completions[:k]]
+
+    def fuzzy(self, term: str, threshold: float = 0.4) -> Dict[int, float]:
+        """Tags sharing enough char 3-grams with a term, scored by Dice similarity."""
+        grams = ngrams(term)
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        scores = {}
+        for idx, count in shared.items():
+            score = 2 * count / (len(grams) + self.n_grams[idx])
+            if score >= threshold:
+                scores[idx] = score
+        return scores
+
+    def _prefixed(self, prefix: str) -> List[int]:
+        """Most frequent tags starting with a normalized prefix."""
+        node = self.trie
+        for char in prefix:
+            node = node["children"].get(char)
+            if node is None:
+                return []
+        return list(node["top"])
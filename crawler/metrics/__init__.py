@@ -0,0 +1,21 @@
+from .metrics import (
+    LATENCY_BUCKETS,
+    REGISTRY,
+    SIZE_BUCKETS,
+    Histogram,
+    Registry,
+    observe,
+    span,
+    trace,
+)
+
+__all__ = [
+    "Histogram",
+    "LATENCY_BUCKETS",
+    "Registry",
+    "REGISTRY",
+    "SIZE_BUCKETS",
+    "observe",
+    "span",
+    "trace",
+]
@@ -0,0 +1,165 @@
+import bisect
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+import typing
+from typing import Dict, Tuple
+
+__all__ = [
+    "Histogram",
+    "LATENCY_BUCKETS",
+    "Registry",
+    "REGISTRY",
+    "SIZE_BUCKETS",
+    "observe",
+    "span",
+    "trace",
+]
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, as exposed by Prometheus."""
+
+    def __init__(self, buckets: typing.Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms, counters and gauges, rendered in the Prometheus text format.
+
+    Gauges are callables evaluated at render time, so components expose their own
+    statistics without pushing them. Each metric family is preceded by its HELP and
+    TYPE lines, help texts being given with describe.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = collections.Counter()
+        self.gauges = {}
+        self.help = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+        **labels: str,
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def describe(self, name: str, help: str) -> None:
+        """Sets the HELP text of a histogram or counter."""
+        self.help[name] = help
+
+    def count(self, name: str, value: float = 1, **labels: str) -> None:
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def gauge(self, name: str, function: typing.Callable[[], Dict[Tuple, float]], help: str = "") -> None:
+        """Registers a callable returning values keyed by tuples of (label, value) pairs."""
+        self.gauges[name] = function
+        self.help[name] = help
+
+    def render(self) -> str:
+        lines, family = [], None
+        with self._lock:
+            histograms = sorted(
+                (key, list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                for key, histogram in self.histograms.items()
+            )
+            counters = sorted(self.counters.items())
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            if name != family:
+                family = name
+                lines.extend(self._header(name, "histogram"))
+            cumulative = 0
+            for bound, bucket in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for (name, labels), value in counters:
+            if name != family:
+                family = name
+                lines.extend(self._header(name, "counter"))
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for name, function in sorted(self.gauges.items()):
+            try:
+                values = function()
+            except Exception:
+                continue
+            lines.extend(self._header(name, "gauge"))
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def _header(self, name: str, kind: str) -> typing.List[str]:
+        lines = [f"# TYPE {name} {kind}"]
+        if self.help.get(name):
+            help = self.help[name].replace("\\", "\\\\").replace("\n", "\\n")
+            lines.insert(0, f"# HELP {name} {help}")
+        return lines
+
+
+def _labels(labels: typing.Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+REGISTRY = Registry()
+REGISTRY.describe("stage_seconds", "Time spent in each stage of a request.")
+
+
+def observe(name: str, value: float, buckets: typing.Sequence[float] = LATENCY_BUCKETS, **labels: str) -> None:
+    REGISTRY.observe(name, value, buckets=buckets, **labels)
+
+
+@contextlib.contextmanager
+def span(stage: str):
+    """Times a stage into the stage_seconds histogram and into the current trace, if any."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe("stage_seconds", elapsed, stage=stage)
+        spans = _trace.get()
+        if spans is not None:
+            spans[stage] = spans.get(stage, 0.0) + elapsed
+
+
+@contextlib.contextmanager
+def trace():
+    """Collects the total time of each stage run within the block, in this context."""
+    spans = {}
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
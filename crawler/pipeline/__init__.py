@@ -1,3 +1,5 @@
+from . import shared
 from .pipeline import Pipeline
+from . import build
 
-__all__ = ["Pipeline"]
\ No newline at end of file
+__all__ = ["Pipeline", "build", "shared"]
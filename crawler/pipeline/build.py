@@ -0,0 +1,341 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+import typing
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from . import shared
+from ..graph import Graph
+from ..index.index import ANALYZER_VERSION
+from ..retriever import Retriever
+from ..retriever.retriever import load_encoder
+from ..spelling import Speller, general_dictionary
+from ..tags import get_extra_tags, get_tags_triples
+from .pipeline import Pipeline
+
+__all__ = ["Build", "index_build"]
+
+
+class Build:
+    """Stages of a build, run by a pool of processes as soon as their dependencies are built.
+
+    A stage is a module-level function, called with the artifacts of its dependencies as
+    keyword arguments, along with its own keyword arguments. Its artifact is written to
+    `directory/<name>.pkl` with shared.dump, so the stages depending on it map its arrays
+    rather than receive a copy. `<name>.json` records the key of the artifact, a hash of
+    the function, the canonical JSON of its arguments, or the key the stage declares
+    for arguments that are not JSON, and the keys of its dependencies: later builds reuse
+    artifacts whose key has not changed, so an interrupted build resumes after its last
+    built stage and unchanged inputs are not built again. Keys do not cover the code of
+    stages, the directory is to be removed after changing it.
+
+    Workers are spawned rather than forked, the API builds from a thread of a process
+    running others. With a single worker, stages run in the calling process.
+
+    Parameters
+    ----------
+    directory
+        Directory of the artifacts.
+    workers
+        Number of processes, the number of cores by default.
+
+    """
+
+    def __init__(self, directory: str, workers: Optional[int] = None):
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.stages = {}
+        self.keys = {}
+        self.timings = {}
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.pkl")
+
+    def input(self, name: str, value: typing.Any) -> None:
+        """Adds a value as an artifact, keyed by its JSON."""
+        self.keys[name] = _hash(orjson.dumps(value, option=orjson.OPT_SORT_KEYS))
+        self.stages[name] = (None, [], {})
+        if not self.done(name):
+            start = time.perf_counter()
+            shared.dump(value, self.path(name))
+            self._built(name, time.perf_counter() - start)
+
+    def stage(
+        self,
+        name: str,
+        function: typing.Callable,
+        dependencies: List[str] = (),
+        key: typing.Any = None,
+        **kwargs,
+    ) -> None:
+        """Adds a stage building an artifact from those of dependencies, added before.
+
+        Keyword arguments are keyed by their JSON. With arguments that are not JSON, such
+        as a model, key is a JSON value standing for all of them, such as a model name.
+        """
+        dependencies = list(dependencies)
+        try:
+            arguments = orjson.dumps(kwargs if key is None else key, option=orjson.OPT_SORT_KEYS)
+        except TypeError as error:
+            raise TypeError(f"Arguments of stage {name} are not JSON, give it a key: {error}") from error
+        self.keys[name] = _hash(
+            orjson.dumps(
+                [name, f"{function.__module__}.{function.__qualname__}", arguments.decode()]
+                + [self.keys[dependency] for dependency in dependencies]
+            )
+        )
+        self.stages[name] = (function, dependencies, kwargs)
+
+    def done(self, name: str) -> bool:
+        """Whether the artifact of a stage is built with its current key."""
+        try:
+            with open(os.path.join(self.directory, f"{name}.json"), "r") as f:
+                return json.load(f)["key"] == self.keys[name] and os.path.exists(self.path(name))
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _built(self, name: str, seconds: float) -> None:
+        path = os.path.join(self.directory, f"{name}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"key": self.keys[name], "seconds": seconds}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def __call__(self, *targets: str, writable: bool = False) -> Dict[str, typing.Any]:
+        """Builds the stages targets depend on, when not built yet, and loads the targets.
+
+        Loaded artifacts are read-only and mapped from the directory, unless writable.
+        """
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name][1])
+
+        pending = {name for name in needed if not self.done(name)}
+        start = time.perf_counter()
+        self.timings = {name: {"seconds": 0.0, "start": 0.0, "end": 0.0, "cached": True} for name in needed - pending}
+
+        def submit(run, name):
+            function, dependencies, kwargs = self.stages[name]
+            self.timings[name] = {"start": time.perf_counter() - start, "cached": False}
+            paths = {dependency: self.path(dependency) for dependency in dependencies}
+            return run(_run, function, self.path(name), paths, kwargs)
+
+        def record(name, seconds):
+            self._built(name, seconds)
+            self.timings[name].update(seconds=seconds, end=time.perf_counter() - start)
+            self.logger.info(f"Built {name} in {seconds:.2f}s")
+
+        if self.workers == 1:
+            for name in self._order(pending):
+                record(name, submit(lambda run, *args: run(*args), name))
+        else:
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as executor:
+                running = {}
+                while pending or running:
+                    unbuilt = pending | set(running.values())
+                    # Stages are submitted as workers free up, so that they start when submitted.
+                    for name in sorted(pending):
+                        if len(running) == self.workers:
+                            break
+                        if not any(dependency in unbuilt for dependency in self.stages[name][1]):
+                            running[submit(executor.submit, name)] = name
+                    pending -= set(running.values())
+                    done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            record(name, future.result())
+                        except BaseException:
+                            executor.shutdown(cancel_futures=True)
+                            raise
+
+        if any(not timing["cached"] for timing in self.timings.values()):
+            self.logger.info(f"Build of {', '.join(targets)}:\n{self.breakdown()}")
+        return {name: shared.load(self.path(name), writable=writable) for name in targets}
+
+    def _order(self, names: typing.Set[str]) -> List[str]:
+        """Names in the order stages were added, dependencies first."""
+        return [name for name in self.stages if name in names]
+
+    def summary(self) -> Dict[str, typing.Any]:
+        """Seconds of each stage of the last call, their sum, the wall time and the critical path.
+
+        The critical path is the longest chain of dependent stages, the wall time of the
+        build with enough cores.
+        """
+        longest = {}
+        for name in self._order(set(self.timings)):
+            dependencies = [dependency for dependency in self.stages[name][1] if dependency in longest]
+            longest[name] = self.timings[name]["seconds"] + max((longest[d] for d in dependencies), default=0.0)
+        return {
+            "wall_seconds": max((timing["end"] for timing in self.timings.values()), default=0.0),
+            "stages_seconds": sum(timing["seconds"] for timing in self.timings.values()),
+            "critical_path_seconds": max(longest.values(), default=0.0),
+            "stages": self.timings,
+        }
+
+    def breakdown(self) -> str:
+        """Table of the stages of the last call, in the order they started."""
+        summary = self.summary()
+        lines = [f"{'stage':<24}{'seconds':>10}{'start':>10}{'end':>10}"]
+        for name, timing in sorted(self.timings.items(), key=lambda item: (item[1]["start"], item[0])):
+            if timing["cached"]:
+                lines.append(f"{name:<24}{'cached':>10}")
+            else:
+                lines.append(f"{name:<24}{timing['seconds']:>10.2f}{timing['start']:>10.2f}{timing['end']:>10.2f}")
+        lines.append(
+            f"wall {summary['wall_seconds']:.2f}s, stages {summary['stages_seconds']:.2f}s, "
+            f"critical path {summary['critical_path_seconds']:.2f}s"
+        )
+        return "\n".join(lines)
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _run(function: typing.Callable, path: str, dependencies: Dict[str, str], kwargs: Dict) -> float:
+    """Builds the artifact of a stage from those of its dependencies, in a worker."""
+    start = time.perf_counter()
+    artifacts = {name: shared.load(dependency) for name, dependency in dependencies.items()}
+    shared.dump(function(**artifacts, **kwargs), path)
+    return time.perf_counter() - start
+
+
+def index_build(
+    data: Dict,
+    excluded_tags: Optional[Dict] = None,
+    directory: str = "database/build",
+    workers: Optional[int] = None,
+    extra_tags: bool = True,
+    shards: Optional[int] = None,
+    encoder=None,
+    encoder_key: Optional[str] = None,
+    max_edit_distance: int = 2,
+) -> Build:
+    """Stages of the documents, tags triples and pipeline built from crawled documents.
+
+    The artifacts are "documents", with their extra tags unless extra_tags is False,
+    "triples" and "pipeline". Extra tags are matched, and the sparse index built, in
+    shards of the documents, one per worker by default. Embeddings, the sparse index,
+    the spelling dictionary and the graph are built concurrently. encoder_key names the
+    encoder in the key of the embeddings, its class by default, so that embeddings are
+    built again when it changes.
+    """
+    build = Build(directory=directory, workers=workers)
+    shards = shards or build.workers
+    if extra_tags:
+        build.input("deduplicated", data)
+        for shard in range(shards):
+            build.stage(f"extra_tags_{shard}", tag_shard, ["deduplicated"], shard=shard, shards=shards)
+        build.stage("documents", merge_extra_tags, ["deduplicated"] + [f"extra_tags_{shard}" for shard in range(shards)])
+    else:
+        build.input("documents", data)
+
+    build.stage("triples", get_tags_triples_of, ["documents"], excluded_tags=excluded_tags)
+    build.stage("graph", graph_of, ["triples"])
+    if encoder_key is None and encoder is not None:
+        encoder_key = f"{type(encoder).__module__}.{type(encoder).__qualname__}"
+    build.stage("embeddings", embeddings_of, ["documents"], key={"encoder": encoder_key}, encoder=encoder)
+    for shard in range(shards):
+        build.stage(
+            f"index_{shard}",
+            index_shard,
+            ["documents"],
+            key={"shard": shard, "shards": shards, "analyzer": ANALYZER_VERSION},
+            shard=shard,
+            shards=shards,
+        )
+    build.stage("index", merge_index, [f"index_{shard}" for shard in range(shards)])
+    build.stage("speller", speller_of, ["documents"], max_edit_distance=max_edit_distance)
+    build.stage("retriever", retriever_of, ["documents", "embeddings", "index"])
+    build.stage(
+        "pipeline",
+        pipeline_of,
+        ["retriever", "graph", "speller"],
+        excluded_tags=excluded_tags,
+        max_edit_distance=max_edit_distance,
+    )
+    return build
+
+
+def tag_shard(deduplicated: Dict, shard: int, shards: int) -> Dict[str, List[str]]:
+    """Extra tags of a shard of the documents."""
+    urls = sorted(deduplicated)[shard::shards]
+    return {url: document["extra-tags"] for url, document in get_extra_tags(data=deduplicated, urls=urls).items()}
+
+
+def merge_extra_tags(deduplicated: Dict, **shards: Dict[str, List[str]]) -> Dict:
+    extra_tags = {}
+    for shard in shards.values():
+        extra_tags.update(shard)
+    return {url: {**document, "extra-tags": extra_tags[url]} for url, document in deduplicated.items()}
+
+
+def get_tags_triples_of(documents: Dict, excluded_tags: Optional[Dict] = None) -> List[Dict]:
+    return get_tags_triples(data=documents, excluded_tags=excluded_tags)
+
+
+def graph_of(triples: List[Dict]) -> Graph:
+    return Graph(triples=triples)
+
+
+def _documents(documents: Dict) -> List[Dict]:
+    return [{"url": url, **document} for url, document in documents.items()]
+
+
+def embeddings_of(documents: Dict, encoder=None):
+    return Retriever.embed(encoder if encoder is not None else load_encoder(), _documents(documents))
+
+
+def index_shard(documents: Dict, shard: int, shards: int):
+    """Segment of the sparse index of a range of consecutive rows."""
+    bounds = np.linspace(0, len(documents), shards + 1).astype(int)
+    rows = range(bounds[shard], bounds[shard + 1])
+    return Retriever.index_segment(_documents(documents)[rows.start : rows.stop], rows=rows)
+
+
+def merge_index(**shards):
+    return Retriever.merge_index([shards[f"index_{shard}"] for shard in range(len(shards))])
+
+
+def speller_of(documents: Dict, max_edit_distance: int = 2) -> Speller:
+    return Speller.from_documents(
+        documents=documents.values(),
+        general=general_dictionary(),
+        max_edit_distance=max_edit_distance,
+    )
+
+
+def retriever_of(documents: Dict, embeddings, index) -> Retriever:
+    return Retriever(documents=documents, embeddings=embeddings, index=index)
+
+
+def pipeline_of(
+    retriever: Retriever,
+    graph: Graph,
+    speller: Speller,
+    excluded_tags: Optional[Dict] = None,
+    max_edit_distance: int = 2,
+) -> Pipeline:
+    return Pipeline(
+        documents=None,
+        triples=None,
+        excluded_tags=excluded_tags,
+        max_edit_distance=max_edit_distance,
+        retriever=retriever,
+        graph=graph,
+        speller=speller,
+    )
@@ -1,77 +1,151 @@
-import codecs
+import threading
 from ..retriever import Retriever
 from ..graph import Graph
-from typing import Dict, Tuple
-import pkg_resources
-from symspellpy import SymSpell, Verbosity
+from ..metrics import span
+from ..spelling import Speller, general_dictionary
+from ..tags import get_tags_triples
+from typing import Dict, Optional, Tuple
 
 class Pipeline:
-    def __init__(self, documents, triples, excluded_tags=None, max_edit_distance=2):
-        self.retriever = Retriever(documents=documents)
+    def __init__(
+        self,
+        documents,
+        triples,
+        excluded_tags=None,
+        max_edit_distance=2,
+        encoder=None,
+        cross_encoder=None,
+        retriever: Optional[Retriever] = None,
+        graph: Optional[Graph] = None,
+        speller: Optional[Speller] = None,
+    ):
+        """The retriever, graph and speller are built from documents and triples unless given."""
+        self.retriever = (
+            retriever if retriever is not None
+            else Retriever(documents=documents, encoder=encoder, cross_encoder=cross_encoder)
+        )
         self.excluded_tags = {} if excluded_tags is None else excluded_tags
-        self.graph = Graph(triples=triples)
-        self.spell_checker = SymSpell(max_dictionary_edit_distance=max_edit_distance)
-        dictionary_path = pkg_resources.resource_filename(
-            "symspellpy", "frequency_dictionary_en_500_000.txt"
+        self.graph = graph if graph is not None else Graph(triples=triples)
+        self.max_edit_distance = max_edit_distance
+        self._speller = speller
+        self._speller_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_speller_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("max_edit_distance", 2)
+        self.__dict__.setdefault("_speller", None)
+        self._speller_lock = threading.Lock()
+
+    @property
+    def speller(self) -> Speller:
+        """Spelling dictionary of the corpus, built on first use after documents change."""
+        if self._speller is None:
+            with self._speller_lock:
+                if self._speller is None:
+                    documents = self.retriever._documents(range(len(self.retriever.table)))
+                    self._speller = Speller.from_documents(
+                        documents=documents,
+                        general=general_dictionary(),
+                        max_edit_distance=self.max_edit_distance,
+                    )
+        return self._speller
+
+    def warmup(self) -> None:
+        """Loads the models and the spelling dictionary before the first request."""
+        self.retriever.warmup()
+        self.speller
+        self.search(q="warmup")
+
+    def add(self, documents: Dict) -> None:
+        """Makes new or updated documents searchable and links their tags in the graph."""
+        self.update(added=documents)
+
+    def remove(self, urls) -> None:
+        """Removes documents by url, and the links of their tags no other document has."""
+        self.update(removed=urls)
+
+    def update(self, added: Optional[Dict] = None, removed=()) -> None:
+        """Removes documents by url and adds new or updated ones.
+
+        BM25 statistics, landmarks and the layout of the graph are computed once, after
+        every change, rather than after each step.
+        """
+        added = {} if added is None else added
+        removed = [url for url in removed if url not in added]
+        replaced = self._stored(removed + list(added))
+        if not added and not replaced:
+            return
+        self.retriever.remove(urls=removed)
+        if added:
+            self.retriever.add(documents=added)
+            self.graph.add(triples=get_tags_triples(data=added, excluded_tags=self.excluded_tags), update=False)
+        self._unlink(replaced)
+        self.graph.update()
+        self.retriever.refresh()
+        self._update_speller(added=added.values(), removed=replaced.values())
+
+    def _stored(self, urls) -> Dict:
+        """Documents of urls as they are indexed, before they change."""
+        rows = self.retriever.url_to_row
+        return {url: self.retriever.table[rows[url]] for url in urls if url in rows}
+
+    def _unlink(self, documents: Dict) -> None:
+        """Removes the links between tags of documents that no document has together anymore."""
+        triples = get_tags_triples(data=documents, excluded_tags=self.excluded_tags)
+        self.graph.remove(
+            triples=[
+                triple for triple in triples
+                if not len(self.retriever.tagged([triple["head"], triple["tail"]]))
+            ],
+            update=False,
         )
-        with codecs.open(dictionary_path, 'r', encoding='cp437') as dictionary_file:
-            self.spell_checker._load_dictionary_stream(
-                dictionary_file,
-                term_index=0,
-                count_index=1
-            )
+
+    def _update_speller(self, added, removed) -> None:
+        """Updates the word counts of the spelling dictionary, which is built again on first
+        use only when its vocabulary changes."""
+        if self._speller is None:
+            return
+        counts = Speller.counts(added)
+        counts.subtract(Speller.counts(removed))
+        if not self._speller.update(counts):
+            self._speller = None
 
     def get_spelling_suggestion(self, text: str) -> Dict[str, str]:
         """Returns spelling suggestion and its confidence"""
-        suggestions = self.spell_checker.lookup_compound(
-            text, 
-            max_edit_distance=2,
-            transfer_casing=True,
-            ignore_non_words=True
-        )
-        
-        if not suggestions:
-            words = text.split()
-            corrected_words = []
-            
-            for word in words:
-                word_suggestions = self.spell_checker.lookup(
-                    word,
-                    Verbosity.ALL,
-                    max_edit_distance=2,
-                    transfer_casing=True,
-                    include_unknown=True
-                )
-                
-                if word_suggestions:
-                    best_suggestion = word_suggestions[0]
-                    if best_suggestion.distance <= 1:
-                        corrected_words.append(best_suggestion.term)
-                    else:
-                        corrected_words.append(word)
-                else:
-                    corrected_words.append(word)
-            
-            corrected_text = " ".join(corrected_words)
-            
-            if corrected_text != text:
-                return {
-                    "suggestion": corrected_text,
-                    "confidence": "high" if all(w in word_suggestions and w.distance <= 1 for w in words) else "medium"
-                }
-            
-        elif suggestions[0].term != text:
-            return {
-                "suggestion": suggestions[0].term,
-                "confidence": "high" if suggestions[0].distance <= 1 else "medium"
-            }
-            
-        return {"suggestion": None, "confidence": None}
-
-    def search(self, q: str, tags: bool = False, top_k: int = 100):
+        return self.speller.suggest(text)
+
+    def autocomplete(self, q: str, k: int = 10) -> Dict[str, list]:
+        """Completes the last words of a query with tags."""
+        words = q.split()
+        if not words or q[-1].isspace():
+            return {"tags": []}
+
+        prefixes = [" ".join(words[-2:]), words[-1]] if len(words) > 1 else words
+        completions = {}
+        for prefix in prefixes:
+            for tag in self.retriever.complete_tags(prefix, k=k):
+                if tag not in self.excluded_tags:
+                    completions[tag] = True
+        return {"tags": list(completions)[:k]}
+
+    def search(self, q: str, tags: bool = False, top_k: int = 100, filters=None):
+        """Reranked documents, restricted by filters such as {"tags": [...], "dates": ["2024"]}."""
         if tags:
-            return self.retriever.documents_tags(q, top_k)
-        return self.retriever.documents(q, top_k)
+            return self.retriever.documents_tags(q, top_k, filters=filters)
+        return self.retriever.documents(q, top_k, filters=filters)
+
+    def lexical_search(self, q: str, tags: bool = False, top_k: int = 100, filters=None):
+        """BM25 results, available before the rerank of search completes."""
+        return self.retriever.candidates(q, tags=tags, filters=filters)[:top_k]
+
+    def facets(self, documents, k_tags: int = 10) -> Dict[str, Dict[str, int]]:
+        """Counts of the most frequent tags and of the years of documents."""
+        return self.retriever.facet_counts(documents, k=k_tags, excluded=self.excluded_tags)
 
     def __call__(
         self,
@@ -80,45 +154,60 @@ class Pipeline:
         k_yens: int = 3,
         k_walk: int = 3,
         top_k: int = 10,
+        rerank: bool = False,
     ):
-        documents = self.retriever.documents(q, top_k)
+        """Top documents of a query and the graph of their tags.
+
+        Documents come from the ranking of a preceding search of the query, or from the
+        bi-encoder or BM25 order, unless rerank runs the cross-encoder.
+        """
+        with span("retrieval"):
+            rows = self.retriever.ranked(q, top_k, rerank=rerank)
+        with span("plot_tags"):
+            top_tags, retrieved_tags = self._plot_tags(q=q, rows=rows, k_tags=k_tags)
+
+        with span("graph"):
+            nodes, links = self.graph(
+                tags=top_tags,
+                retrieved_tags=retrieved_tags,
+                k_yens=k_yens,
+                k_walk=k_walk,
+            )
+        return self.retriever._documents(rows), nodes, links
+
+    def _plot_tags(self, q: str, rows: list, k_tags: int) -> Tuple[list, list]:
+        """Most frequent tags of the documents and tags matching the query."""
         retrieved_tags = [tag for tag in self.retriever.tags(q) if tag not in self.excluded_tags]
+        top_tags = self.retriever.top_tags(rows, k=k_tags, excluded=self.excluded_tags)
+        return top_tags, retrieved_tags
 
-        tags = {}
-        for document in documents:
-            doc_tags = [tag for tag in (document.get("tags", []) + document.get("extra-tags", [])) 
-                    if tag not in self.excluded_tags]
-            for tag in doc_tags:
-                tags[tag] = tags.get(tag, 0) + 1
-
-        sorted_tags = sorted(tags.items(), key=lambda x: x[1], reverse=True)
-        top_tags = [tag for tag, _ in sorted_tags[:k_tags]]
-
-        triples = []
-        for doc in documents:
-            doc_tags = [tag for tag in (doc.get("tags", []) + doc.get("extra-tags", []))
-                    if tag not in self.excluded_tags]
-            for i, tag1 in enumerate(doc_tags):
-                for tag2 in doc_tags[i+1:]:
-                    if tag1 != tag2:
-                        triples.append({
-                            "head": tag1,
-                            "tail": tag2
-                        })
-
-        nodes, links = self.graph(
+    def plot_stream(
+        self,
+        q: str,
+        k_tags: int = 20,
+        k_yens: int = 3,
+        k_walk: int = 3,
+        top_k: int = 10,
+        rerank: bool = False,
+    ):
+        """Yields the nodes and links of plot as the paths between tags are found."""
+        with span("retrieval"):
+            rows = self.retriever.ranked(q, top_k, rerank=rerank)
+        with span("plot_tags"):
+            top_tags, retrieved_tags = self._plot_tags(q=q, rows=rows, k_tags=k_tags)
+        yield from self.graph.stream(
             tags=top_tags,
             retrieved_tags=retrieved_tags,
             k_yens=k_yens,
             k_walk=k_walk,
         )
-        return documents, nodes, links
 
-    def plot(self, q: str, k_tags: int = 20, k_yens: int = 3, k_walk: int = 3):
+    def plot(self, q: str, k_tags: int = 20, k_yens: int = 3, k_walk: int = 3, rerank: bool = False):
         _, nodes, links = self(
             q=q, 
             k_tags=k_tags, 
             k_yens=k_yens, 
-            k_walk=k_walk
+            k_walk=k_walk,
+            rerank=rerank,
         )
         return nodes, links
\ No newline at end of file
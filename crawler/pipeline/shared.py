@@ -0,0 +1,86 @@
+import glob
+import mmap
+import os
+import pickle
+import typing
+import uuid
+
+__all__ = ["dump", "load", "nbytes"]
+
+_ALIGNMENT = 64
+_ATTEMPTS = 3
+
+
+def dump(obj: typing.Any, path: str) -> None:
+    """Pickles an object with its arrays stored apart, in a buffers file next to `path`.
+
+    Contiguous numpy arrays, including the arrays of scipy sparse matrices, are written
+    out-of-band (pickle protocol 5) at aligned offsets. Loading maps them from the
+    file instead of copying them, so processes loading the same file share the pages.
+
+    Each dump writes its own `path.<generation>.buffers` file, named in the pickle, and
+    then replaces the pickle atomically, so the pickle never meets buffers of another
+    dump. Previous buffers files are removed, processes mapping them keep them.
+    """
+    buffers = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    name = f"{os.path.basename(path)}.{uuid.uuid4().hex[:16]}.buffers"
+    offsets = []
+    with open(os.path.join(os.path.dirname(path), name), "wb") as f:
+        for buffer in buffers:
+            view = buffer.raw()
+            f.write(b"\0" * (-f.tell() % _ALIGNMENT))
+            offsets.append((f.tell(), view.nbytes))
+            f.write(view)
+        f.flush()
+        os.fsync(f.fileno())
+
+    with open(f"{path}.tmp", "wb") as f:
+        pickle.dump((name, offsets, payload), f, protocol=5)
+    os.replace(f"{path}.tmp", path)
+
+    for previous in _buffers(path) + glob.glob(f"{glob.escape(path)}.buffers"):
+        if os.path.basename(previous) != name:
+            os.remove(previous)
+
+
+def load(path: str, writable: bool = False) -> typing.Any:
+    """Loads an object saved with dump, mapping its arrays from its buffers file.
+
+    Arrays are read-only and shared between processes, unless writable, in which case
+    pages are copied on write and changes stay private to the process.
+    """
+    for attempt in range(_ATTEMPTS):
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        if len(saved) == 2:
+            # Saved before buffers files were named in the pickle.
+            saved = (f"{os.path.basename(path)}.buffers", *saved)
+        name, offsets, payload = saved
+
+        if not offsets:
+            return pickle.loads(payload)
+
+        try:
+            with open(os.path.join(os.path.dirname(path), name), "rb") as f:
+                mapped = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_COPY if writable else mmap.ACCESS_READ
+                )
+        except FileNotFoundError:
+            # Replaced by a dump after the pickle was read, whose new version is read again.
+            if attempt == _ATTEMPTS - 1:
+                raise
+            continue
+
+        view = memoryview(mapped)
+        return pickle.loads(payload, buffers=[view[start : start + size] for start, size in offsets])
+
+
+def nbytes(path: str) -> int:
+    """Bytes of a dumped object on disk, its buffers included."""
+    return os.path.getsize(path) + sum(os.path.getsize(buffers) for buffers in _buffers(path))
+
+
+def _buffers(path: str) -> typing.List[str]:
+    return glob.glob(f"{glob.escape(path)}.*.buffers")
@@ -1,3 +1,4 @@
+from .batcher import Batcher
 from .retriever import Retriever
 
-__all__ = ["Retriever"]
\ No newline at end of file
+__all__ = ["Batcher", "Retriever"]
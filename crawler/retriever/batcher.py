@@ -0,0 +1,110 @@
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+import typing
+from typing import Dict, List
+
+from ..metrics import REGISTRY, SIZE_BUCKETS, observe
+from ..scheduler import waiting
+
+__all__ = ["Batcher"]
+
+REGISTRY.describe("model_batch_requests", "Requests per model batch.")
+REGISTRY.describe("model_batch_size", "Inputs per model batch.")
+
+
+def _bucket(size: int) -> int:
+    """Smallest power of two greater than or equal to size."""
+    return 1 << max(size - 1, 0).bit_length()
+
+
+class Batcher:
+    """Gathers the inputs of concurrent calls into one call of a batched function.
+
+    A single thread runs the function over the inputs of every queued call. When more
+    than one call is queued, it waits up to `window` seconds for more, so a lone request
+    is never delayed while concurrent requests share one batch. Callers on a Scheduler
+    worker free their slot while they wait, so batches are not capped by the number of
+    workers. Batch sizes are counted in power-of-two buckets, by calls and by inputs.
+    """
+
+    def __init__(
+        self,
+        function: typing.Callable[[List], typing.Sequence],
+        window: float = 0.005,
+        max_size: int = 256,
+        name: str = "batch",
+    ):
+        self.function = function
+        self.name = name
+        self.window = window
+        self.max_size = max_size
+        self.queue = queue.Queue()
+        self.requests = collections.Counter()
+        self.inputs = collections.Counter()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs: List) -> List:
+        """Returns function(inputs), computed along with the inputs of concurrent calls."""
+        if not inputs:
+            return []
+
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, daemon=True)
+                    self._thread.start()
+
+        future = concurrent.futures.Future()
+        self.queue.put((list(inputs), future))
+        with waiting():
+            return future.result()
+
+    def statistics(self) -> Dict[str, Dict[int, int]]:
+        """Histograms of batch sizes, by number of calls and number of inputs."""
+        return {"requests": dict(sorted(self.requests.items())), "inputs": dict(sorted(self.inputs.items()))}
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            size = len(batch[0][0])
+
+            # Take every call already queued, then wait for more only under load.
+            deadline = None
+            while size < self.max_size:
+                try:
+                    if deadline is None:
+                        batch.append(self.queue.get_nowait())
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    if deadline is not None or len(batch) == 1 or self.window <= 0:
+                        break
+                    deadline = time.monotonic() + self.window
+                    continue
+                size += len(batch[-1][0])
+
+            self.requests[_bucket(len(batch))] += 1
+            self.inputs[_bucket(size)] += 1
+            observe("model_batch_requests", len(batch), buckets=SIZE_BUCKETS, model=self.name)
+            observe("model_batch_size", size, buckets=SIZE_BUCKETS, model=self.name)
+            self._run(batch)
+
+    def _run(self, batch: List) -> None:
+        try:
+            outputs = self.function([item for inputs, _ in batch for item in inputs])
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+
+        start = 0
+        for inputs, future in batch:
+            future.set_result(outputs[start : start + len(inputs)])
+            start += len(inputs)
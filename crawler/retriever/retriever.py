@@ -1,107 +1,357 @@
-import copy
+import collections
+import threading
 import typing
-from typing import List, Dict
+from typing import List, Dict, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from neural_search import retrieve
-from lenlp import sparse
+from ..index import Facets, SparseIndex, TagIndex
+from ..index.facets import MISSING_DAY
+from ..metrics import REGISTRY, SIZE_BUCKETS, observe, span
+from ..table import DocumentTable
+from .batcher import Batcher
+
+REGISTRY.describe("retrieval_candidates", "Candidates retrieved per search, before ranking.")
+
+# Rankings of the latest searches, reused by plot.
+_RANKED_CACHE = 256
+
+FIELDS = ["title", "tags", "summary", "date"]
+NGRAM_RANGE = (2, 7)
+
+
+def load_encoder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+
+def filtering(filters: Optional[Dict]) -> bool:
+    return bool(filters) and bool(filters.get("tags") or filters.get("dates"))
 
 class Retriever:
-    def __init__(self, documents: typing.Dict):
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
-        self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-        
-        updated_documents = copy.deepcopy(documents)
+    def __init__(
+        self,
+        documents: typing.Dict,
+        batch_window: float = 0.005,
+        encoder=None,
+        cross_encoder=None,
+        embeddings: Optional[np.ndarray] = None,
+        index: Optional[SparseIndex] = None,
+    ):
+        """Embeddings and the sparse index of documents, in their order, are built unless given."""
+        # Models default to the sentence-transformers ones, loaded on first use.
+        self._encoder = encoder
+        self._cross_encoder = cross_encoder
+        self._models_lock = threading.Lock()
+        self.batch_window = batch_window
+        self._batchers()
+
+        # Rows of the sparse index, of the document table and of the embeddings.
+        documents = [{"url": url, **document} for url, document in documents.items()]
+        self.table = DocumentTable(documents)
+        self.url_to_row = {document["url"]: row for row, document in enumerate(documents)}
+        self._ranked = collections.OrderedDict()
+        self._ranked_lock = threading.Lock()
+
+        self.facets = Facets()
+        self._add_facets(documents)
+
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        if embeddings is None:
+            self._encode(documents)
+        else:
+            self.embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        self.fields = list(FIELDS)
+        self.index = index if index is not None else self.build_index(documents)
+
+        self.retriever = (
+            self.index.view(fields=self.fields, ngram_range=(4, 7), k=100, k1=1.5, b=0.75)
+            | self.index.view(fields=self.fields, ngram_range=(2, 5), k=20)
+        )
+
+        self.retriever_documents_tags = (
+            self.index.view(fields=self.fields, ngram_range=(4, 7), k=60)
+            & self.index.view(fields=["tags"], ngram_range=(4, 7), k=60)
+        )
+
+        self.tag_frequencies = collections.Counter()
+        self._count_tags(range(len(self.table)), 1)
+        self._index_tags()
+
+    def __getstate__(self):
+        """Models are not serialized, they are loaded again on first use."""
+        state = self.__dict__.copy()
+        state["_encoder"] = None
+        state["_cross_encoder"] = None
+        del state["_models_lock"], state["encode_batcher"], state["predict_batcher"]
+        del state["_ranked"], state["_ranked_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("batch_window", 0.005)
+        self._models_lock = threading.Lock()
+        self._ranked = collections.OrderedDict()
+        self._ranked_lock = threading.Lock()
+        self._batchers()
+        if "table" not in state:
+            self._columns(state)
+
+    def _columns(self, state: Dict) -> None:
+        """Moves the documents and embeddings of a pickle of dictionaries to columns."""
+        for name in ("tag_ids", "tag_names", "tag_offsets", "tag_postings", "facets"):
+            self.__dict__.pop(name, None)
+        documents = self.__dict__.pop("documents_list")
+        embeddings = self.__dict__.pop("document_embeddings")
+
+        self.table = DocumentTable([document or {"url": ""} for document in documents])
+        self.table.remove(row for row, document in enumerate(documents) if document is None)
+        self.facets = Facets()
+        self._add_facets([document or {} for document in documents])
+
+        dimension = len(next(iter(embeddings.values()))) if embeddings else 0
+        self.embeddings = np.zeros((len(documents), dimension), dtype=np.float32)
+        for row, document in enumerate(documents):
+            if document is not None and document["url"] in embeddings:
+                self.embeddings[row] = embeddings[document["url"]]
+
+    def _batchers(self) -> None:
+        """Concurrent queries are encoded, and their pairs scored, in shared batches."""
+        self.encode_batcher = Batcher(
+            lambda queries: self.encoder.encode(queries),
+            window=self.batch_window,
+            max_size=64,
+            name="encoder",
+        )
+        self.predict_batcher = Batcher(
+            lambda pairs: self.cross_encoder.predict(pairs),
+            window=self.batch_window,
+            max_size=512,
+            name="cross_encoder",
+        )
+
+    def batching_statistics(self) -> Dict[str, Dict]:
+        """Batch size histograms of the encoder and of the cross-encoder."""
+        return {
+            "encoder": self.encode_batcher.statistics(),
+            "cross_encoder": self.predict_batcher.statistics(),
+        }
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._models_lock:
+                if self._encoder is None:
+                    self._encoder = load_encoder()
+        return self._encoder
+
+    @property
+    def cross_encoder(self):
+        if self._cross_encoder is None:
+            with self._models_lock:
+                if self._cross_encoder is None:
+                    from sentence_transformers import CrossEncoder
+                    self._cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+        return self._cross_encoder
+
+    def warmup(self) -> None:
+        """Loads the models and runs a dummy query through them."""
+        self.simple_rerank("warmup", [{"url": "", "title": "warmup", "summary": ""}], top_k=1)
+
+    def add(self, documents: typing.Dict) -> None:
+        """Indexes new or updated documents in a delta segment, without a full rebuild."""
+        self._drop(list(documents))
         documents = [{"url": url, **document} for url, document in documents.items()]
+        if not documents:
+            return
+
+        self._encode(documents)
+        rows = self.table.append(documents)
+        for row, document in zip(rows, documents):
+            self.url_to_row[document["url"]] = row
+        self._add_facets(documents)
+        self.index.add(self._index_documents(documents))
+        self._forget_ranked()
+        self._count_tags(rows, 1)
+        self._index_tags()
 
-        self.document_embeddings = {}
-        for doc in documents:
-            text = f"{doc['title']} {doc['summary']}"
-            self.document_embeddings[doc['url']] = self.encoder.encode(text, convert_to_tensor=True)
+    def remove(self, urls: typing.List[str]) -> None:
+        """Removes documents by url."""
+        if self._drop(urls):
+            self._index_tags()
+            self._forget_ranked()
 
-        updated_documents = [
+    def refresh(self) -> None:
+        """Computes the BM25 statistics of the index once a batch of changes is done."""
+        self.index.refresh()
+
+    def _drop(self, urls: typing.List[str]) -> bool:
+        """Removes documents by url, leaving the tag index to be built again by the caller.
+        Returns whether any was stored."""
+        rows = [self.url_to_row.pop(url) for url in urls if url in self.url_to_row]
+        if not rows:
+            return False
+
+        self.index.remove(rows)
+        self._count_tags(rows, -1)
+        self.table.remove(rows)
+        return True
+
+    def _encode(self, documents: List[Dict]) -> None:
+        """Appends the embeddings of documents, which take the next rows."""
+        if not documents:
+            return
+        embeddings = self.embed(self.encoder, documents)
+        self.embeddings = embeddings if not self.embeddings.size else np.concatenate([self.embeddings, embeddings])
+
+    def _similarities(self, query_embedding: np.ndarray, rows: List[int]) -> np.ndarray:
+        """Dot products of the query with the embeddings of rows, 0 for rows without one."""
+        rows = np.asarray(rows, dtype=np.int64)
+        similarities = np.zeros(len(rows), dtype=np.float32)
+        known = rows < len(self.embeddings)
+        similarities[known] = self.embeddings[rows[known]] @ np.asarray(query_embedding, dtype=np.float32)
+        return similarities
+
+    @staticmethod
+    def embed(encoder, documents: List[Dict]) -> np.ndarray:
+        texts = [f"{doc['title']} {doc['summary']}" for doc in documents]
+        return np.asarray(encoder.encode(texts), dtype=np.float32)
+
+    @classmethod
+    def build_index(cls, documents: List[Dict]) -> SparseIndex:
+        return SparseIndex(documents=cls._index_documents(documents), fields=FIELDS, ngram_range=NGRAM_RANGE)
+
+    @classmethod
+    def index_segment(cls, documents: List[Dict], rows: typing.Sequence[int]):
+        """Segment of the sparse index of documents at rows, for an index built in shards."""
+        return SparseIndex.segment(cls._index_documents(documents), rows=rows, fields=FIELDS, ngram_range=NGRAM_RANGE)
+
+    @staticmethod
+    def merge_index(segments: List) -> SparseIndex:
+        """Sparse index of the segments of shards, in the order of their rows."""
+        return SparseIndex.from_segments(segments, fields=FIELDS, ngram_range=NGRAM_RANGE)
+
+    @staticmethod
+    def _index_documents(documents: List[Dict]) -> List[Dict]:
+        return [
             {
-                **{
-                    "url": url,
-                    "tags": " ".join(document.pop("tags", []) + document.pop("extra-tags", [])),
-                },
                 **document,
+                "tags": " ".join(document.get("tags", []) + document.get("extra-tags", [])),
             }
-            for url, document in updated_documents.items()
+            for document in documents
         ]
 
-        self.retriever = (
-            retrieve.TfIdf(
-                key="url",
-                attr=["title", "tags", "summary", "date"],
-                k=100,
-                tfidf=sparse.BM25Vectorizer(
-                    normalize=True,
-                    ngram_range=(4, 7),
-                    analyzer="char_wb",
-                    b=0.75,
-                    k1=1.5,
-                ),
-                documents=updated_documents,
-            )
-            | retrieve.TfIdf(
-                key="url",
-                attr=["title", "tags", "summary", "date"],
-                k=20,
-                tfidf=sparse.BM25Vectorizer(
-                    normalize=True,
-                    ngram_range=(2, 5),
-                    analyzer="char_wb",
-                ),
-                documents=updated_documents,
-            )
-        ) + documents
+    def _count_tags(self, rows: typing.Iterable[int], sign: int) -> None:
+        """Counts each tag once per row, tags and extra tags together."""
+        rows = np.fromiter(rows, dtype=np.int64)
+        table = self.table
+        lengths = table.tag_offsets[rows + 1] - table.tag_offsets[rows]
+        ids = np.concatenate([table.tags(row) for row in rows.tolist()] or [table.tag_postings[:0]])
+        keys = np.unique(np.repeat(rows, lengths) * len(table.tag_names) + ids)
+        counts = np.bincount(keys % max(len(table.tag_names), 1), minlength=len(table.tag_names))
+        for idx in np.flatnonzero(counts).tolist():
+            self.tag_frequencies[table.tag_names[idx]] += sign * int(counts[idx])
+        self.tag_frequencies = +self.tag_frequencies
 
-        self.retriever_documents_tags = (
-            retrieve.TfIdf(
-                key="url",
-                attr=["title", "tags", "summary", "date"],
-                k=60,
-                tfidf=sparse.BM25Vectorizer(
-                    normalize=True,
-                    ngram_range=(4, 7),
-                    analyzer="char_wb",
-                ),
-                documents=updated_documents,
-            )
-            & retrieve.TfIdf(
-                key="url",
-                attr=["tags"],
-                k=60,
-                tfidf=sparse.BM25Vectorizer(
-                    normalize=True,
-                    ngram_range=(4, 7),
-                    analyzer="char_wb",
-                ),
-                documents=updated_documents,
-            )
-        ) + documents
-
-        tags = {}
-        for document in documents:
-            for tag in document.get("tags", []) + document.get("extra-tags", []):
-                tags[tag] = True
-        self.tags_list = [{"tag": tag} for tag in tags]
-
-        self.retriever_tags = (
-            retrieve.TfIdf(
-                key="tag",
-                attr=["tag"],
-                k=10,
-                tfidf=sparse.BM25Vectorizer(
-                    normalize=True,
-                    ngram_range=(3, 7),
-                    analyzer="char_wb",
-                ),
-                documents=self.tags_list,
+    def _index_tags(self) -> None:
+        self.tags_index = TagIndex(frequencies=self.tag_frequencies)
+
+    def _add_facets(self, documents: List[Dict]) -> None:
+        """Adds the facets of documents, the last rows of the table."""
+        table = self.table
+        first = len(table) - len(documents)
+        offsets = table.tag_offsets[first:] - table.tag_offsets[first]
+        postings = table.tag_postings[table.tag_offsets[first] :]
+        self.facets.add(offsets, postings, [str(document.get("date") or "") for document in documents])
+
+    def top_tags(self, rows: List[int], k: int, excluded: typing.Iterable[str] = ()) -> List[str]:
+        """Most frequent tags of rows, ties in order of first appearance."""
+        return list(self.tag_counts(rows, k=k, excluded=excluded))
+
+    def tag_counts(self, rows: List[int], k: int, excluded: typing.Iterable[str] = ()) -> Dict[str, int]:
+        """Number of rows of the k most frequent tags of rows, ties in order of first appearance."""
+        if not rows:
+            return {}
+        ids = np.concatenate([self.table.tags(row) for row in rows])
+        excluded = [self.table.tag_ids[tag] for tag in excluded if tag in self.table.tag_ids]
+        if excluded:
+            ids = ids[~np.isin(ids, excluded)]
+        if not len(ids):
+            return {}
+        unique, first, counts = np.unique(ids, return_index=True, return_counts=True)
+        order = np.lexsort((first, -counts))[:k]
+        return {self.table.tag_names[idx]: int(count) for idx, count in zip(unique[order], counts[order])}
+
+    def allowed(self, filters: Optional[Dict[str, typing.List[str]]] = None) -> Optional[np.ndarray]:
+        """Mask of the rows matching filters: every tag of "tags", any date of "dates".
+
+        Dates are years such as "2024" or months such as "2024-05". None without filters.
+        """
+        if not filtering(filters):
+            return None
+        with span("facets"):
+            selected = self.facets.filter(
+                tags=[self.table.tag_ids.get(tag, -1) for tag in filters.get("tags") or []],
+                dates=filters.get("dates") or [],
             )
-            + self.tags_list
+            return selected.mask(len(self.table))
+
+    def tagged(self, tags: typing.List[str]) -> np.ndarray:
+        """Rows of the documents with every tag."""
+        rows = self.facets.filter(tags=[self.table.tag_ids.get(tag, -1) for tag in tags]).to_rows()
+        return rows[self.table.live[rows]]
+
+    def facet_counts(self, documents: List[Dict], k: int = 10, excluded: typing.Iterable[str] = ()) -> Dict:
+        """Number of documents of their k most frequent tags and of each year."""
+        rows = [self.url_to_row[document["url"]] for document in documents if document["url"] in self.url_to_row]
+        return {"tags": self.tag_counts(rows, k=k, excluded=excluded), "dates": self.facets.date_counts(rows)}
+
+    def sort_by_date(self, documents: List[Dict]) -> List[Dict]:
+        """Most recent documents first, those without a date last, from the dates parsed at indexing."""
+        days = np.asarray(
+            [
+                self.facets.days[self.url_to_row[document["url"]]] if document["url"] in self.url_to_row else MISSING_DAY
+                for document in documents
+            ],
+            dtype=np.int64,
         )
+        return [documents[idx] for idx in np.argsort(-days, kind="stable")]
+
+    def _remember_ranked(self, q: str, documents: List[Dict]) -> None:
+        rows = [self.url_to_row[document["url"]] for document in documents if document["url"] in self.url_to_row]
+        with self._ranked_lock:
+            self._ranked[q] = rows
+            self._ranked.move_to_end(q)
+            if len(self._ranked) > _RANKED_CACHE:
+                self._ranked.popitem(last=False)
+
+    def _forget_ranked(self) -> None:
+        with self._ranked_lock:
+            self._ranked.clear()
+
+    def ranked(self, q: str, top_k: int = 10, rerank: bool = False) -> List[int]:
+        """Rows of the top documents of a query, without the cross-encoder unless rerank.
+
+        Reuses the ranking of a preceding unfiltered search of the query in documents, not
+        of a search by tags. Otherwise, candidates are ordered by the bi-encoder once it is
+        loaded, and left in BM25 order before.
+        """
+        with self._ranked_lock:
+            rows = self._ranked.get(q)
+        if rows is not None:
+            return rows[:top_k]
+        if rerank:
+            return [self.url_to_row[document["url"]] for document in self.documents(q, top_k)]
+
+        rows = [self.url_to_row[document["url"]] for document in self.candidates(q)]
+        if rows and self._encoder is not None:
+            with span("encode"):
+                query_embedding = self.encode_batcher([q])[0]
+            similarities = self._similarities(query_embedding, rows)
+            rows = [rows[idx] for idx in np.argsort(-similarities, kind="stable")]
+        return rows[:top_k]
+
+    def _documents(self, rows: typing.Iterable[int]) -> List[Dict]:
+        return self.table.documents(rows)
 
     def simple_rerank(self, query: str, documents: List[Dict], top_k: int = 10) -> List[Dict]:
         """
@@ -110,23 +360,19 @@ class Retriever:
         if not documents:
             return []
             
-        query_embedding = self.encoder.encode(query, convert_to_tensor=True)
+        with span("encode"):
+            query_embedding = self.encode_batcher([query])[0]
         
         # Calculate bi-encoder similarities
-        similarities = []
-        for doc in documents:
-            try:
-                doc_embedding = self.document_embeddings[doc['url']]
-                similarity = np.dot(query_embedding, doc_embedding)
-                similarities.append(similarity)
-            except KeyError:
-                similarities.append(0.0)
+        rows = [self.url_to_row.get(doc['url'], len(self.embeddings)) for doc in documents]
+        similarities = self._similarities(query_embedding, rows).tolist()
                 
         pairs = [[query, f"{doc['title']} {doc['summary']}" ] for doc in documents]
         
         # Only run cross-encoder if have pairs
         if pairs:
-            cross_scores = self.cross_encoder.predict(pairs)
+            with span("cross_encoder"):
+                cross_scores = self.predict_batcher(pairs)
         else:
             cross_scores = []
             
@@ -142,15 +388,33 @@ class Retriever:
         
         return [doc for doc, _ in scored_docs[:top_k]]
 
-    def documents(self, q: str, top_k: int = 10) -> List[Dict]:
-        if not q.strip():
+    def candidates(self, q: str, tags: bool = False, filters: Optional[Dict] = None) -> List[Dict]:
+        """Documents retrieved lexically, in BM25 order, before reranking.
+
+        Filters restrict the rows scored by BM25, so the reranked candidates all match.
+        """
+        if not tags and not q.strip():
             return []
-        initial_results = self.retriever(q)
-        return self.simple_rerank(q, initial_results, top_k)
+        allowed = self.allowed(filters)
+        with span("bm25"):
+            retriever = self.retriever_documents_tags if tags else self.retriever
+            documents = self._documents(retriever(q, allowed=allowed))
+        observe("retrieval_candidates", len(documents), buckets=SIZE_BUCKETS)
+        return documents
+
+    def documents(self, q: str, top_k: int = 10, filters: Optional[Dict] = None) -> List[Dict]:
+        documents = self.simple_rerank(q, self.candidates(q, filters=filters), top_k)
+        # Plot ranks the whole corpus, filtered rankings are not reused.
+        if not filtering(filters):
+            self._remember_ranked(q, documents)
+        return documents
+
+    def tags(self, q: str, k: int = 10) -> List[str]:
+        return self.tags_index(q, k=k)
 
-    def tags(self, q: str) -> List[str]:
-        return [tag["tag"] for tag in self.retriever_tags(q)]
+    def complete_tags(self, prefix: str, k: int = 10) -> List[str]:
+        return self.tags_index.complete(prefix, k=k)
 
-    def documents_tags(self, q: str, top_k: int = 10) -> List[Dict]:
-        initial_results = self.retriever_documents_tags(q)
-        return self.simple_rerank(q, initial_results, top_k)
\ No newline at end of file
+    def documents_tags(self, q: str, top_k: int = 10, filters: Optional[Dict] = None) -> List[Dict]:
+        # Plot ranks the documents of the query itself, tag rankings are not reused.
+        return self.simple_rerank(q, self.candidates(q, tags=True, filters=filters), top_k)
\ No newline at end of file
@@ -0,0 +1,3 @@
+from .scheduler import QueueTimeout, Scheduler, configure_torch, waiting
+
+__all__ = ["QueueTimeout", "Scheduler", "configure_torch", "waiting"]
@@ -0,0 +1,142 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+import typing
+
+from ..metrics import REGISTRY, observe
+
+__all__ = ["QueueTimeout", "Scheduler", "configure_torch", "waiting"]
+
+logger = logging.getLogger(__name__)
+
+REGISTRY.describe("scheduler_queue_seconds", "Time inference requests waited for a worker.")
+REGISTRY.describe("scheduler_coalesced_total", "Requests served by an identical request in flight.")
+REGISTRY.describe("scheduler_expired_total", "Requests that waited longer than the queue timeout.")
+
+_torch_configured = threading.Event()
+_slots = threading.local()
+
+
+class QueueTimeout(TimeoutError):
+    """A request waited longer than the queue timeout before a worker picked it up."""
+
+
+def configure_torch(workers: int) -> None:
+    """Splits the cores between the inference workers, once per process.
+
+    Each worker runs its own inference, so torch's intra-op threads are capped to the
+    worker's share of the cores and inter-op parallelism is disabled.
+    """
+    if _torch_configured.is_set():
+        return
+    _torch_configured.set()
+
+    try:
+        import torch
+    except ImportError:
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Inter-op threads can only be set before torch runs parallel work.
+        pass
+    logger.info(f"Configured torch with {threads} threads per inference worker")
+
+
+@contextlib.contextmanager
+def waiting():
+    """Frees the slot of the calling worker while it waits, for a shared batch for instance.
+
+    Outside of a Scheduler worker, does nothing.
+    """
+    slots = getattr(_slots, "semaphore", None)
+    if slots is None:
+        yield
+        return
+    slots.release()
+    try:
+        yield
+    finally:
+        slots.acquire()
+
+
+class Scheduler:
+    """Runs blocking inference on a fixed number of workers.
+
+    At most `workers` requests compute at once. A request waiting for a batch of the
+    models frees its slot, so up to `concurrency` requests are in progress and their
+    queries are batched together, however few the workers. Requests sharing a key
+    while one is in flight wait for the same result instead of being computed again. A
+    request still queued after `timeout` seconds is dropped with QueueTimeout, so a
+    backlog sheds load instead of growing latency.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 10.0, concurrency: int = 64):
+        self.workers = workers
+        self.timeout = timeout
+        self.concurrency = max(concurrency, workers)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix="inference",
+            initializer=configure_torch,
+            initargs=(workers,),
+        )
+        self.slots = threading.Semaphore(workers)
+        self.in_flight = {}
+        self.coalesced = 0
+        self.expired = 0
+        self._lock = threading.RLock()
+
+    async def __call__(
+        self, key: typing.Hashable, function: typing.Callable, *args, **kwargs
+    ) -> typing.Any:
+        """Runs function(*args, **kwargs) on a worker, or joins the in-flight run for key."""
+        with self._lock:
+            future = self.in_flight.get(key)
+            if future is None:
+                # Runs in a copy of the caller's context, so its trace collects the spans.
+                future = self.executor.submit(
+                    contextvars.copy_context().run,
+                    self._run,
+                    time.monotonic(),
+                    function,
+                    *args,
+                    **kwargs,
+                )
+                self.in_flight[key] = future
+                future.add_done_callback(lambda _: self._done(key, future))
+            else:
+                self.coalesced += 1
+                REGISTRY.count("scheduler_coalesced_total")
+        # Shielded, so a client disconnecting does not cancel the run for the others.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def _run(self, enqueued: float, function: typing.Callable, *args, **kwargs) -> typing.Any:
+        with self.slots:
+            waited = time.monotonic() - enqueued
+            observe("scheduler_queue_seconds", waited)
+            if waited > self.timeout:
+                self.expired += 1
+                REGISTRY.count("scheduler_expired_total")
+                raise QueueTimeout(f"Request waited {waited:.1f}s for an inference worker")
+            _slots.semaphore = self.slots
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _slots.semaphore = None
+
+    def _done(self, key: typing.Hashable, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,3 @@
+from .spelling import Speller, general_dictionary
+
+__all__ = ["Speller", "general_dictionary"]
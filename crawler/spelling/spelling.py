@@ -0,0 +1,288 @@
+import collections
+import functools
+import json
+import logging
+import os
+import re
+import typing
+import zlib
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+__all__ = ["Speller", "general_dictionary"]
+
+logger = logging.getLogger(__name__)
+
+_WORDS = re.compile(r"[a-z]+")
+_CACHE_SIZE = 4096
+
+
+def general_dictionary(n_words: int = 30_000) -> Dict[str, int]:
+    """Most frequent English words from the dictionary shipped with symspellpy, if installed."""
+    try:
+        from importlib import resources
+
+        path = resources.files("symspellpy") / "frequency_dictionary_en_82_765.txt"
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except Exception as e:
+        logger.warning(f"General spelling dictionary unavailable, using the corpus only: {e}")
+        return {}
+
+    counts = {}
+    for line in lines:
+        term, _, count = line.partition(" ")
+        if term and count.strip().isdigit():
+            counts[term] = int(count)
+    return dict(sorted(counts.items(), key=lambda item: -item[1])[:n_words])
+
+
+def deletes(word: str, max_edit_distance: int) -> typing.Set[str]:
+    """The word and every string obtained by deleting up to max_edit_distance characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(max_edit_distance):
+        frontier = {
+            term[:i] + term[i + 1 :] for term in frontier if len(term) > 1 for i in range(len(term))
+        }
+        found |= frontier
+    return found
+
+
+def distance(source: str, target: str, max_distance: int) -> int:
+    """Optimal string alignment distance, or max_distance + 1 when it is larger."""
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = source[i - 1] != target[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (
+                previous_previous is not None
+                and j > 1
+                and source[i - 1] == target[j - 2]
+                and source[i - 2] == target[j - 1]
+            ):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def _replace(path: str, write: typing.Callable) -> None:
+    with open(f"{path}.tmp", "wb") as f:
+        write(f)
+    os.replace(f"{path}.tmp", path)
+
+
+class Speller:
+    """Symmetric delete spelling correction over the corpus vocabulary.
+
+    Words from titles and tags are merged with a trimmed general dictionary. Corpus words
+    are never corrected and are preferred over general words at the same edit distance,
+    so technical terms are left alone. Terms and their deletes are stored in flat numpy
+    arrays, sorted by crc32 hash, which can be saved and memory-mapped.
+    """
+
+    def __init__(
+        self,
+        corpus: typing.Dict[str, int],
+        general: typing.Optional[typing.Dict[str, int]] = None,
+        max_edit_distance: int = 2,
+        prefix_length: int = 7,
+    ):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.path = None
+
+        general = {} if general is None else general
+        terms = sorted(set(corpus) | set(general))
+        encoded = [term.encode("utf-8") for term in terms]
+
+        self.offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(term) for term in encoded])
+        self.characters = np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+        self.corpus_counts = np.array([corpus.get(term, 0) for term in terms], dtype=np.int64)
+        self.general_counts = np.array([general.get(term, 0) for term in terms], dtype=np.int64)
+
+        hashes, ids = [], []
+        for idx, term in enumerate(terms):
+            for delete in deletes(term[: self.prefix_length], self.max_edit_distance):
+                hashes.append(zlib.crc32(delete.encode("utf-8")))
+                ids.append(idx)
+
+        hashes = np.array(hashes, dtype=np.uint32)
+        order = np.argsort(hashes, kind="stable")
+        self.hashes = hashes[order]
+        self.ids = np.array(ids, dtype=np.uint32)[order]
+        self._cache()
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: typing.Iterable[typing.Dict],
+        general: typing.Optional[typing.Dict[str, int]] = None,
+        **kwargs,
+    ) -> "Speller":
+        """Builds the dictionary from the titles and tags of the documents."""
+        return cls(corpus=cls.counts(documents), general=general, **kwargs)
+
+    @staticmethod
+    def counts(documents: typing.Iterable[typing.Dict]) -> typing.Counter[str]:
+        """Counts of the words of the titles and tags of the documents."""
+        corpus = collections.Counter()
+        for document in documents:
+            text = " ".join(
+                [document.get("title", "")]
+                + document.get("tags", [])
+                + document.get("extra-tags", [])
+            )
+            corpus.update(_WORDS.findall(text.lower()))
+        return corpus
+
+    def update(self, counts: typing.Dict[str, int]) -> bool:
+        """Adds counts of corpus words in place, negative for words of removed documents.
+
+        Only possible while the terms stay the same: returns False, leaving the dictionary
+        unchanged, when a word is not a term yet or a term would leave both the corpus and
+        the general dictionary. The dictionary is then to be built again.
+        """
+        totals = {}
+        for word, count in counts.items():
+            if not count:
+                continue
+            idx = self.index(word)
+            if idx is None:
+                return False
+            totals[idx] = int(self.corpus_counts[idx]) + count
+            if totals[idx] <= 0 and not self.general_counts[idx]:
+                return False
+
+        if totals:
+            # Counts mapped from a saved dictionary are copied, and saved again with save.
+            corpus_counts = np.array(self.corpus_counts)
+            corpus_counts[list(totals)] = list(totals.values())
+            self.corpus_counts = corpus_counts
+            self.path = None
+            self._cache()
+        return True
+
+    def save(self, path: str) -> None:
+        """Writes the arrays as .npy files that load memory-mapped.
+
+        Files are replaced atomically, so a process reading a previous version keeps it.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ("offsets", "characters", "corpus_counts", "general_counts", "hashes", "ids"):
+            _replace(os.path.join(path, f"{name}.npy"), lambda f: np.save(f, getattr(self, name)))
+        config = {"max_edit_distance": self.max_edit_distance, "prefix_length": self.prefix_length}
+        _replace(os.path.join(path, "config.json"), lambda f: f.write(json.dumps(config).encode()))
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str) -> "Speller":
+        """Memory-maps a saved dictionary."""
+        speller = cls.__new__(cls)
+        with open(os.path.join(path, "config.json")) as f:
+            speller.__dict__.update(json.load(f))
+        for name in ("offsets", "characters", "corpus_counts", "general_counts", "hashes", "ids"):
+            setattr(speller, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        speller.path = path
+        speller._cache()
+        return speller
+
+    def __getstate__(self):
+        """A saved dictionary is serialized as its path and memory-mapped again."""
+        if self.path is not None and os.path.exists(os.path.join(self.path, "config.json")):
+            return {"path": self.path}
+        state = self.__dict__.copy()
+        del state["lookup"], state["suggest"]
+        return state
+
+    def __setstate__(self, state):
+        if list(state) == ["path"]:
+            state = Speller.load(state["path"]).__dict__
+            del state["lookup"], state["suggest"]
+        self.__dict__.update(state)
+        self._cache()
+
+    def _cache(self) -> None:
+        self.lookup = functools.lru_cache(maxsize=_CACHE_SIZE)(self._lookup)
+        self.suggest = functools.lru_cache(maxsize=_CACHE_SIZE)(self._suggest)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def term(self, idx: int) -> str:
+        return self.characters[self.offsets[idx] : self.offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def index(self, word: str) -> Optional[int]:
+        """Index of a term, None if the word is not one. Terms are sorted."""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.term(middle) < word:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self) and self.term(low) == word else None
+
+    def _candidates(self, word: str) -> np.ndarray:
+        hashes = np.array(
+            [
+                zlib.crc32(delete.encode("utf-8"))
+                for delete in deletes(word[: self.prefix_length], self.max_edit_distance)
+            ],
+            dtype=np.uint32,
+        )
+        starts = np.searchsorted(self.hashes, hashes, side="left")
+        ends = np.searchsorted(self.hashes, hashes, side="right")
+        if not (ends > starts).any():
+            return np.empty(0, dtype=np.uint32)
+        return np.unique(
+            np.concatenate([self.ids[start:end] for start, end in zip(starts, ends) if end > start])
+        )
+
+    def _lookup(self, word: str) -> Tuple[Optional[str], int]:
+        """Closest term to a lowercase word and its edit distance, the word itself if known."""
+        best, best_key = None, None
+        for idx in self._candidates(word).tolist():
+            term = self.term(idx)
+            if term == word:
+                return word, 0
+            edits = distance(word, term, self.max_edit_distance)
+            if edits > self.max_edit_distance:
+                continue
+            key = (edits, -int(self.corpus_counts[idx]), -int(self.general_counts[idx]), term)
+            if best_key is None or key < best_key:
+                best, best_key = term, key
+        return best, best_key[0] if best_key is not None else self.max_edit_distance + 1
+
+    def _suggest(self, text: str) -> Dict[str, Optional[str]]:
+        """Corrects each word of a query. Short words and words with digits are kept."""
+        corrected, distances = [], []
+        for word in text.split():
+            lower = word.lower()
+            if len(lower) < 3 or not lower.isalpha():
+                corrected.append(word)
+                continue
+
+            term, edits = self.lookup(lower)
+            if term is None or edits == 0:
+                corrected.append(word)
+                continue
+
+            corrected.append(term.capitalize() if word[:1].isupper() else term)
+            distances.append(edits)
+
+        if not distances:
+            return {"suggestion": None, "confidence": None}
+        return {
+            "suggestion": " ".join(corrected),
+            "confidence": "high" if max(distances) <= 1 else "medium",
+        }
@@ -0,0 +1,3 @@
+from .store import ContentStore
+
+__all__ = ["ContentStore"]
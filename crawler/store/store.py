@@ -0,0 +1,191 @@
+import collections
+import json
+import logging
+import os
+import threading
+import typing
+from typing import Dict, Iterator, Optional, Tuple
+
+import zstandard
+
+__all__ = ["ContentStore"]
+
+
+class ContentStore:
+    """Full text of the documents, keyed by url, compressed with zstd in blocks.
+
+    Texts are appended to the open block, which is compressed as one zstd frame once it
+    holds `block_size` bytes: texts of neighbouring documents compress together, while
+    reading a text only decompresses its own block. `blocks.zst` holds the frames one
+    after the other and `index.json` the offset and size of each frame, and the block,
+    start and end of each text in the decompressed block.
+
+    The index is replaced atomically on flush. Frames written after the last flush are
+    unknown to the index and truncated when the store is opened again. Texts stored
+    again or removed leave their bytes behind until `compact`, which writes the blocks
+    to the other of two files and switches to it with the index. A store is written by
+    one process at a time.
+
+    Parameters
+    ----------
+    path
+        Directory of the store.
+    block_size
+        Bytes of text per block, before compression.
+    level
+        zstd compression level.
+    cache
+        Number of decompressed blocks kept for reads.
+
+    """
+
+    def __init__(self, path: str, block_size: int = 64 * 1024, level: int = 3, cache: int = 8):
+        self.path = path
+        self.block_size = block_size
+        self.level = level
+        self.cache = cache
+        self.file = "blocks.zst"
+        self.blocks = []
+        self.texts = {}
+        self.logger = logging.getLogger(__name__)
+        self._pending = bytearray()
+        self._decompressed = collections.OrderedDict()
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def _blocks_path(self) -> str:
+        return os.path.join(self.path, self.file)
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    def _load(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, "r") as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Ignoring unreadable index of {self.path}: {e}")
+                index = {"file": self.file, "blocks": [], "texts": {}}
+            self.file = index["file"]
+            self.blocks = [tuple(block) for block in index["blocks"]]
+            self.texts = {url: tuple(location) for url, location in index["texts"].items()}
+
+        end = self.blocks[-1][0] + self.blocks[-1][1] if self.blocks else 0
+        if not os.path.exists(self._blocks_path) or os.path.getsize(self._blocks_path) < end:
+            if self.blocks:
+                self.logger.error(f"Ignoring content store {self.path}, blocks of its index are missing")
+                self.blocks, self.texts = [], {}
+            open(self._blocks_path, "wb").close()
+        elif os.path.getsize(self._blocks_path) > end:
+            self.logger.warning(f"Truncating blocks of {self.path} written after its last flush")
+            os.truncate(self._blocks_path, end)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.texts
+
+    @property
+    def nbytes(self) -> int:
+        """Compressed bytes of the flushed blocks."""
+        return sum(size for _, size in self.blocks)
+
+    def put(self, url: str, text: str) -> None:
+        """Stores the text of a url, replacing any previous one."""
+        encoded = text.encode("utf-8")
+        with self._lock:
+            start = len(self._pending)
+            self._pending += encoded
+            self.texts[url] = (len(self.blocks), start, len(self._pending))
+            if len(self._pending) >= self.block_size:
+                self._write_block()
+
+    def update(self, texts: Dict[str, str]) -> None:
+        for url, text in texts.items():
+            self.put(url, text)
+
+    def get(self, url: str) -> Optional[str]:
+        """Text of a url, None if it is not stored."""
+        with self._lock:
+            location = self.texts.get(url)
+            if location is None:
+                return None
+            block, start, end = location
+            return bytes(self._block(block)[start:end]).decode("utf-8")
+
+    def remove(self, urls: typing.Iterable[str]) -> None:
+        with self._lock:
+            for url in urls:
+                self.texts.pop(url, None)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """Urls and texts in storage order, decompressing each block once."""
+        with self._lock:
+            by_block = collections.defaultdict(list)
+            for url, location in self.texts.items():
+                by_block[location[0]].append((url, location))
+        for block in sorted(by_block):
+            with self._lock:
+                data = self._block(block)
+            for url, (_, start, end) in by_block[block]:
+                yield url, bytes(data[start:end]).decode("utf-8")
+
+    def flush(self) -> None:
+        """Writes the open block and saves the index."""
+        with self._lock:
+            if self._pending:
+                self._write_block()
+            self._save()
+
+    def compact(self) -> None:
+        """Writes the stored texts again into full blocks, dropping replaced and removed ones."""
+        texts = list(self.items())
+        with self._lock:
+            previous = self._blocks_path
+            self.file = "blocks-compacted.zst" if self.file == "blocks.zst" else "blocks.zst"
+            self._pending = bytearray()
+            self._decompressed.clear()
+            self.blocks, self.texts = [], {}
+            open(self._blocks_path, "wb").close()
+        self.update(dict(texts))
+        self.flush()
+        os.remove(previous)
+
+    def _block(self, block: int) -> bytes:
+        """Decompressed block, the open one included."""
+        if block == len(self.blocks):
+            return self._pending
+        if block in self._decompressed:
+            self._decompressed.move_to_end(block)
+            return self._decompressed[block]
+
+        offset, size = self.blocks[block]
+        with open(self._blocks_path, "rb") as f:
+            f.seek(offset)
+            data = self._decompressor.decompress(f.read(size))
+        if self.cache:
+            self._decompressed[block] = data
+            if len(self._decompressed) > self.cache:
+                self._decompressed.popitem(last=False)
+        return data
+
+    def _write_block(self) -> None:
+        frame = self._compressor.compress(bytes(self._pending))
+        with open(self._blocks_path, "ab") as f:
+            offset = f.tell()
+            f.write(frame)
+        self.blocks.append((offset, len(frame)))
+        self._pending = bytearray()
+
+    def _save(self) -> None:
+        index = {"file": self.file, "blocks": self.blocks, "texts": self.texts}
+        with open(f"{self._index_path}.tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(f"{self._index_path}.tmp", self._index_path)
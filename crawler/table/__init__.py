@@ -0,0 +1,3 @@
+from .table import DocumentTable
+
+__all__ = ["DocumentTable"]
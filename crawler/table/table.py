@@ -0,0 +1,138 @@
+import sys
+import typing
+from typing import Dict, List, Optional
+
+import numpy as np
+
+__all__ = ["DocumentTable"]
+
+# Text columns, stored as UTF-8 bytes delimited by offsets.
+TEXT_FIELDS = ("url", "title", "summary", "date")
+
+
+class TextColumn:
+    """Strings of the rows, concatenated in one UTF-8 buffer and delimited by offsets."""
+
+    def __init__(self):
+        self.data = np.zeros(0, dtype=np.uint8)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[self.offsets[row] : self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+    def extend(self, texts: List[str]) -> None:
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        self.data = np.concatenate([self.data, np.frombuffer(b"".join(encoded), dtype=np.uint8)])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+
+
+class DocumentTable:
+    """Documents in columns, addressed by row: the n-th document ever added is row n.
+
+    Url, title, summary and date are text columns. Tags are interned in a vocabulary,
+    each tag string is stored once, and rows hold tag ids: the slice of `tag_postings`
+    delimited by `tag_offsets` lists the tags of a row then its extra tags, the first
+    `n_tags` of them being tags. Other fields, such as duplicates, are rare and kept in
+    a dictionary by row. Documents are built again from the columns when read, removed
+    rows read as None.
+
+    Every column is a numpy array, so the pickled table is mapped from disk and shared
+    by the worker processes rather than copied.
+    """
+
+    def __init__(self, documents: typing.Iterable[Dict] = ()):
+        self.columns = {field: TextColumn() for field in TEXT_FIELDS}
+        self.tag_ids = {}
+        self.tag_names = []
+        self.tag_offsets = np.zeros(1, dtype=np.int64)
+        self.tag_postings = np.zeros(0, dtype=np.int32)
+        self.n_tags = np.zeros(0, dtype=np.int32)
+        self.live = np.zeros(0, dtype=bool)
+        self.extras = {}
+        self.append(list(documents))
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            sum(column.nbytes for column in self.columns.values())
+            + sum(array.nbytes for array in (self.tag_offsets, self.tag_postings, self.n_tags, self.live))
+            + sum(len(tag.encode("utf-8")) for tag in self.tag_names)
+        )
+
+    def append(self, documents: List[Dict]) -> List[int]:
+        """Appends documents, which have a url, and returns their rows."""
+        rows = list(range(len(self), len(self) + len(documents)))
+        if not documents:
+            return rows
+
+        for field, column in self.columns.items():
+            column.extend([str(document.get(field) or "") for document in documents])
+
+        ids, lengths, n_tags = [], [], []
+        for row, document in zip(rows, documents):
+            tags = list(document.get("tags") or [])
+            extra_tags = list(document.get("extra-tags") or [])
+            for tag in tags + extra_tags:
+                if tag not in self.tag_ids:
+                    self.tag_ids[tag] = len(self.tag_names)
+                    self.tag_names.append(sys.intern(tag))
+            ids.extend(self.tag_ids[tag] for tag in tags + extra_tags)
+            lengths.append(len(tags) + len(extra_tags))
+            n_tags.append(len(tags))
+
+            extras = {
+                field: value for field, value in document.items()
+                if field not in TEXT_FIELDS and field not in ("tags", "extra-tags")
+            }
+            if extras:
+                self.extras[row] = extras
+
+        self.tag_offsets = np.concatenate(
+            [self.tag_offsets, self.tag_offsets[-1] + np.cumsum(lengths, dtype=np.int64)]
+        )
+        self.tag_postings = np.concatenate([self.tag_postings, np.asarray(ids, dtype=np.int32)])
+        self.n_tags = np.concatenate([self.n_tags, np.asarray(n_tags, dtype=np.int32)])
+        self.live = np.concatenate([self.live, np.ones(len(documents), dtype=bool)])
+        return rows
+
+    def remove(self, rows: typing.Iterable[int]) -> None:
+        rows = np.fromiter(rows, dtype=np.int64)
+        if len(rows):
+            # Arrays mapped read-only from a pickle are copied before the first change.
+            if not self.live.flags.writeable:
+                self.live = self.live.copy()
+            self.live[rows] = False
+            for row in rows.tolist():
+                self.extras.pop(row, None)
+
+    def tags(self, row: int) -> np.ndarray:
+        """Tag ids of a row, tags then extra tags."""
+        return self.tag_postings[self.tag_offsets[row] : self.tag_offsets[row + 1]]
+
+    def text(self, row: int, field: str) -> str:
+        return self.columns[field][row]
+
+    def __getitem__(self, row: int) -> Optional[Dict]:
+        if not self.live[row]:
+            return None
+        ids = self.tags(row).tolist()
+        n_tags = int(self.n_tags[row])
+        return {
+            **{field: column[row] for field, column in self.columns.items()},
+            "tags": [self.tag_names[idx] for idx in ids[:n_tags]],
+            "extra-tags": [self.tag_names[idx] for idx in ids[n_tags:]],
+            **self.extras.get(row, {}),
+        }
+
+    def documents(self, rows: typing.Iterable[int]) -> List[Dict]:
+        """Documents of rows, skipping removed ones."""
+        documents = (self[row] for row in rows)
+        return [document for document in documents if document is not None]
@@ -3,9 +3,6 @@ import itertools
 import typing
 from functools import lru_cache
 
-from neural_search import retrieve
-from sklearn.feature_extraction.text import TfidfVectorizer
-
 __all__ = ["get_extra_tags", "get_tags_triples"]
 
 
@@ -29,14 +26,22 @@ def get_tags_triples(data: typing.Dict, excluded_tags=None):
 
     return triples
 
-def get_extra_tags(data: typing.Dict) -> typing.Dict:
+def get_extra_tags(data: typing.Dict, urls: typing.Optional[typing.Iterable[str]] = None) -> typing.Dict:
+    """Documents with the tags of other documents their title and summary match, as extra tags.
+
+    Only the documents of urls are returned when given, matched against the tags of every
+    document, so that shards of the documents are tagged apart.
+    """
+    from neural_search import retrieve
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
     documents = {}
     tagged = {}
 
     for url, document in data.items():
-        doc_tags = set(document["tags"])
-        documents.update((tag, True) for tag in doc_tags)
-        tagged[url] = doc_tags
+        # Tags in order of appearance, the same in every process whatever the hash seed.
+        documents.update((tag, True) for tag in document["tags"])
+        tagged[url] = set(document["tags"])
 
     documents_list = [{"tag": tag} for tag in documents]
 
@@ -59,8 +64,10 @@ def get_extra_tags(data: typing.Dict) -> typing.Dict:
         )
     ).add(documents_list)
 
+    selected = data if urls is None else {url: data[url] for url in urls}
+
     extra_tags = {}
-    for url, document in data.items():
+    for url, document in selected.items():
         query_text = f"{document.get('title', '')} {document.get('summary', '')}"
         
         extra_tags[url] = [
@@ -72,5 +79,5 @@ def get_extra_tags(data: typing.Dict) -> typing.Dict:
 
     return {
         url: {**document, "extra-tags": extra_tags[url]} 
-        for url, document in data.items()
+        for url, document in selected.items()
     }
\ No newline at end of file
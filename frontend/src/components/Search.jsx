@@ -74,6 +74,57 @@ const PaginationComponent = ({ totalItems, itemsPerPage, currentPage, onPageChan
   );
 };
 
+// Calls onLine with each object of an NDJSON response, as soon as its line arrives.
+const readLines = async (res, onLine) => {
+  if (!res.body) {
+    onLine(await res.json());
+    return;
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.filter(line => line.trim()).forEach(line => onLine(JSON.parse(line)));
+  }
+  if (buffer.trim()) onLine(JSON.parse(buffer));
+};
+
+// Appends an increment of the compact graph format: nodes are listed once and links
+// refer to them by position as flat (source, target, weight) triples. Nodes are pinned
+// at the coordinates of the layout precomputed by the server, when it sends them.
+const decodeGraph = (increment, graph) => {
+  graph.palette.push(...(increment.palette || []));
+  increment.nodes.forEach((id, index) => {
+    const node = {
+      id,
+      color: graph.palette[increment.colors[index]],
+      size: increment.sizes[index],
+    };
+    const x = increment.positions?.[3 * index];
+    if (x !== undefined && x !== null) {
+      node.fx = node.x = x;
+      node.fy = node.y = increment.positions[3 * index + 1];
+      node.fz = node.z = increment.positions[3 * index + 2];
+    }
+    graph.nodes.push(node);
+  });
+  for (let i = 0; i < increment.links.length; i += 3) {
+    const value = increment.links[i + 2];
+    graph.links.push({
+      source: graph.nodes[increment.links[i]].id,
+      target: graph.nodes[increment.links[i + 1]].id,
+      relation: 'link',
+      value,
+      color: `rgba(150,150,150,${Math.max(0.3, Math.min(0.8, value / 3))})`,
+    });
+  }
+};
+
 // Document Component
 const Document = React.memo(({ doc, hoveredNode, onTagClick, highlight }) => (
   <div className={`document ${hoveredNode && doc.tags.includes(hoveredNode.id) ? 'highlighted' : ''}`}>
@@ -97,6 +148,9 @@ const Document = React.memo(({ doc, hoveredNode, onTagClick, highlight }) => (
 ));
 
 const Graph = React.memo(({ graphData, hoveredNode, onNodeHover, onNodeClick }) => {
+  // Nodes pinned by the server layout are shown at rest, without running the simulation.
+  const pinned = graphData.nodes.length > 0 && graphData.nodes.every(node => node.fx !== undefined);
+
   const rendererConfig = useCallback(canvas => {
     const renderer = new THREE.WebGLRenderer({
       canvas,
@@ -149,8 +203,8 @@ const Graph = React.memo(({ graphData, hoveredNode, onNodeHover, onNodeClick })
       d3AlphaMin={0.001}
       d3AlphaDecay={0.02}
       d3VelocityDecay={0.3}
-      warmupTicks={50}
-      cooldownTicks={1000}
+      warmupTicks={pinned ? 0 : 50}
+      cooldownTicks={pinned ? 0 : 1000}
       cooldownTime={2000}
       onEngineStop={() => {
         if (controlsRef.current) {
@@ -204,9 +258,13 @@ const Search = () => {
   const [currentPage, setCurrentPage] = useState(1);
   const [isLoading, setIsLoading] = useState(false);
   const [spellingSuggestion, setSpellingSuggestion] = useState(null);
+  const [completions, setCompletions] = useState([]);
   const itemsPerPage = 20;
   const documentsRef = useRef(null);
   const spellCheckTimeoutRef = useRef(null);
+  const completionTimeoutRef = useRef(null);
+  const searchIdRef = useRef(0);
+  const plotIdRef = useRef(0);
 
   // URL parameter handling
   useEffect(() => {
@@ -253,6 +311,29 @@ const Search = () => {
     }, 500);
   }, []);
 
+  const completeTags = useCallback((text) => {
+    if (completionTimeoutRef.current) {
+      clearTimeout(completionTimeoutRef.current);
+    }
+    if (!text.trim() || text.endsWith(' ')) {
+      setCompletions([]);
+      return;
+    }
+    completionTimeoutRef.current = setTimeout(() => {
+      fetch(`http://localhost:5000/autocomplete/${encodeURIComponent(text)}`)
+        .then(res => res.json())
+        .then(data => {
+          const words = text.split(/\s+/);
+          const head = words.slice(0, -1).join(' ');
+          setCompletions((data.tags || []).map(tag => (head ? `${head} ${tag}` : tag)));
+        })
+        .catch(error => {
+          console.error('Autocomplete error:', error);
+          setCompletions([]);
+        });
+    }, 100);
+  }, []);
+
   const processGraphData = useCallback((data) => {
     const maxNodes = 75;
     const nodes = (data.nodes || [])
@@ -315,24 +396,39 @@ const Search = () => {
   }, [query, node]);
 
   const handleSearch = useCallback((searchQuery, k, sort = false) => {
+    // Each search supersedes the previous one, whose late events are dropped.
+    const searchId = ++searchIdRef.current;
     setIsLoading(true);
-    fetch(`http://localhost:5000/search/${sort}/${node}/${k}/${searchQuery.replace("/", "")}`)
-      .then(res => res.json())
-      .then(data => {
-        setDocuments(Object.values(data.documents));
-        setCurrentPage(1);
+
+    const showDocuments = (data) => {
+      if (searchId !== searchIdRef.current || !data.documents) return;
+      setDocuments(Object.values(data.documents));
+      setIsLoading(false);
+      if (data.stage !== 'reranked') setCurrentPage(1);
+    };
+
+    // BM25 results arrive first as one NDJSON line, then the reranked ones.
+    fetch(`http://localhost:5000/stream/search/${sort}/${node}/${k}/${searchQuery.replace("/", "")}`)
+      .then(async res => {
+        await readLines(res, showDocuments);
       })
       .catch(error => console.error('Search error:', error))
-      .finally(() => setIsLoading(false));
+      .finally(() => {
+        if (searchId === searchIdRef.current) setIsLoading(false);
+      });
   }, [node]);
 
   const plotGraph = useCallback((queryText, k) => {
-    fetch(`http://localhost:5000/plot/${k}/${queryText.replace("/", "")}`)
-      .then(res => res.json())
-      .then(data => {
-        const processedData = processGraphData(data);
-        setGraphData(processedData);
-      })
+    const plotId = ++plotIdRef.current;
+    const graph = { palette: [], nodes: [], links: [] };
+
+    // The graph grows as increments arrive: the query tags first, then the paths between them.
+    fetch(`http://localhost:5000/stream/plot/${k}/${queryText.replace("/", "")}`)
+      .then(res => readLines(res, increment => {
+        if (plotId !== plotIdRef.current || !increment.nodes) return;
+        decodeGraph(increment, graph);
+        setGraphData(processGraphData({ nodes: [...graph.nodes], links: [...graph.links] }));
+      }))
       .catch(error => console.error('Graph plot error:', error));
   }, [processGraphData]);
 
@@ -340,6 +436,7 @@ const Search = () => {
     const newValue = event.target.value.toLowerCase();
     setInputValue(newValue);
     checkSpelling(newValue);
+    completeTags(newValue);
   };
 
   const handleSuggestionClick = () => {
@@ -410,8 +507,15 @@ const Search = () => {
               value={inputValue}
               onChange={handleInputChange}
               onKeyDown={handleKeyPress}
+              list="tag-completions"
+              autoComplete="off"
               autoFocus
             />
+            <datalist id="tag-completions">
+              {completions.map(completion => (
+                <option key={completion} value={completion} />
+              ))}
+            </datalist>
             {spellingSuggestion && (
               <div className="spelling-suggestion">
                 Did you mean:{' '}
@@ -3,7 +3,7 @@ import os
 
 def main():
     frontend_cmd = 'cd frontend && npm start'
-    backend_cmd = 'uvicorn run:app --host 0.0.0.0 --port 5000'
+    backend_cmd = 'python run.py'
     if os.name == 'nt':
         subprocess.Popen(['start', 'cmd', '/k', frontend_cmd], shell=True)
     else:
@@ -1,22 +1,40 @@
-import datetime
+import asyncio
+import copy
 import json
 import os
-import pickle
+import threading
+import time
 import typing
 import logging
-from fastapi import FastAPI
+import orjson
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import ORJSONResponse
-from crawler import hackernews, pipeline, tags, googleresearch
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
+from crawler import metrics
+from crawler.scheduler import QueueTimeout, Scheduler
 import os
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+# Server-Timing headers with the time spent in each stage of a request.
+TIMING_HEADERS = os.getenv("TIMING_HEADERS", "false").lower() in ("1", "true", "yes")
+
 def initialize_knowledge_base():
+    """Crawls new documents and updates the saved pipeline, or builds it from scratch.
+
+    The pipeline is updated on a copy loaded from disk, never on the one being served,
+    which the returned pipeline replaces once complete.
+    """
+    # Crawlers and models are imported here so the API answers before they are loaded.
+    from crawler import dedup, hackernews, pipeline, googleresearch
+    from crawler.store import ContentStore
+
     data = {}
+    # Full texts, while documents only keep a summary of 500 characters.
+    store = ContentStore("database/content")
 
     try:
         if os.path.exists("database/database.json"):
@@ -27,14 +45,22 @@ def initialize_knowledge_base():
         logger.error(f"Error loading existing database: {e}")
         data = {}
 
+    previous = copy.deepcopy(data)
+
     try:
         logger.info("Fetching Hackernews upvotes")
         knowledge_crawler = hackernews.HackerNews(
             username=os.getenv('HACKERNEWS_USERNAME'),
             password=os.getenv('HACKERNEWS_PASSWORD'),
+            checkpoint="database/checkpoints/hackernews.json",
+            max_pages=int(os.getenv('HACKERNEWS_MAX_PAGES', 10)),
+            # Near-duplicates merged into another document are known as well.
+            known=set(data).union(*(document.get('duplicates', []) for document in data.values())),
+            store=store,
         )
         
         knowledge = knowledge_crawler()
+        logger.info(f"Hackernews crawl: {json.dumps(knowledge_crawler.telemetry.summary())}")
         
         for url, document in knowledge.items():
             if url not in data:
@@ -58,12 +84,17 @@ def initialize_knowledge_base():
     try:
         logger.info("Fetching Google Research publications")
         google_crawler = googleresearch.GoogleResearch(
-            max_pages=1,
-            category="data-mining-and-modeling&category=distributed-systems-and-parallel-computing&category=information-retrieval-and-the-web&category=natural-language-processing&category=networking&category=security-privacy-and-abuse-prevention&category=software-engineering&category=software-systems&category=speech-processing"
+            max_pages=int(os.getenv('GOOGLE_RESEARCH_MAX_PAGES', 1)),
+            category="data-mining-and-modeling&category=distributed-systems-and-parallel-computing&category=information-retrieval-and-the-web&category=natural-language-processing&category=networking&category=security-privacy-and-abuse-prevention&category=software-engineering&category=software-systems&category=speech-processing",
+            checkpoint="database/checkpoints/googleresearch.json",
+            parallel_categories=True,
         )
         publications = google_crawler()
+        logger.info(f"Google Research crawl: {json.dumps(google_crawler.telemetry.summary())}")
         
         for url, publication in publications.items():
+            if url not in store:
+                store.put(url, publication["abstract"])
             if url not in data:
                 document = {
                     "title": publication["title"],
@@ -85,6 +116,7 @@ def initialize_knowledge_base():
                     )),
                 })
         
+        store.flush()
         logger.info(f"Found {len(publications)} Google Research publications")
     
     except Exception as e:
@@ -99,16 +131,33 @@ def initialize_knowledge_base():
         if not isinstance(document.get('tags'), list):
             document['tags'] = []
         
-        document['tags'] = list(set(document['tags']))
+        document['tags'] = sorted(set(document['tags']))
         
         if len(document.get('summary', '')) > 500:
             document['summary'] = document['summary'][:500] + '...'
 
+    logger.info("Merging near-duplicate documents")
+    try:
+        data = dedup.deduplicate(data)
+    except Exception as e:
+        logger.error(f"Error merging near-duplicate documents: {e}")
+
+    excluded_tags = {
+        "hackernews": True,
+        "github": True,
+        "google-research": True,
+    }
+
+    # Stages run in parallel processes, artifacts of unchanged inputs are not built again.
+    workers = int(os.getenv("BUILD_WORKERS", "0")) or None
+    build = pipeline.build.index_build(data, excluded_tags=excluded_tags, workers=workers)
+
     logger.info("Adding extra tags")
     try:
-        data = tags.get_extra_tags(data=data)
+        data = build("documents")["documents"]
     except Exception as e:
         logger.error(f"Error adding extra tags: {e}")
+        build = pipeline.build.index_build(data, excluded_tags=excluded_tags, workers=workers, extra_tags=False)
 
     try:
         os.makedirs("database", exist_ok=True)
@@ -119,14 +168,8 @@ def initialize_knowledge_base():
         logger.error(f"Error saving database: {e}")
 
     try:
-        excluded_tags = {
-            "hackernews": True,
-            "github": True,
-            "google-research": True,
-        }
-
         logger.info("Exporting tree of tags.")
-        triples = tags.get_tags_triples(data=data, excluded_tags=excluded_tags)
+        triples = build("triples")["triples"]
         with open("database/triples.json", "w") as f:
             json.dump(triples, f, indent=4)
         logger.info("Exported tags triples")
@@ -134,21 +177,33 @@ def initialize_knowledge_base():
         logger.error(f"Error exporting tags triples: {e}")
 
     try:
-        knowledge_pipeline = pipeline.Pipeline(
-            documents=data,
-            triples=triples,
-            excluded_tags=excluded_tags
-        )
-        with open("database/pipeline.pkl", "wb") as f:
-            pickle.dump(knowledge_pipeline, f)
+        knowledge_pipeline = None
+        if os.path.exists("database/pipeline.pkl"):
+            knowledge_pipeline = pipeline.shared.load("database/pipeline.pkl", writable=True)
+        if knowledge_pipeline is not None and knowledge_pipeline.retriever.index.outdated:
+            logger.info("Rebuilding knowledge pipeline, its documents were analyzed differently")
+            knowledge_pipeline = None
+        if knowledge_pipeline is not None:
+            updated = {url: document for url, document in data.items() if previous.get(url) != document}
+            removed = [url for url in previous if url not in data]
+            knowledge_pipeline.update(added=updated, removed=removed)
+            logger.info(f"Updated knowledge pipeline with {len(updated)} documents, removed {len(removed)}")
+    except Exception as e:
+        logger.error(f"Error updating existing pipeline, rebuilding it: {e}")
+        knowledge_pipeline = None
+
+    try:
+        if knowledge_pipeline is None:
+            knowledge_pipeline = build("pipeline", writable=True)["pipeline"]
+        # Saved apart so the pickle only references it and loading memory-maps it.
+        knowledge_pipeline.speller.save("database/spelling")
+        pipeline.shared.dump(knowledge_pipeline, "database/pipeline.pkl")
         logger.info("Serialized knowledge pipeline")
     except Exception as e:
         logger.error(f"Error serializing pipeline: {e}")
 
     logger.info("Knowledge acquisition and processing complete")
-    return True
-
-initialize_knowledge_base()
+    return knowledge_pipeline
 
 app = FastAPI(
     description="Personal Knowledge Graph Search Engine",
@@ -172,25 +227,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    """Times each request, with per-stage Server-Timing headers when TIMING_HEADERS is set."""
+    start = time.perf_counter()
+    with metrics.trace() as spans:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    endpoint = request.scope.get("endpoint")
+    metrics.observe(
+        "http_request_seconds",
+        elapsed,
+        endpoint=endpoint.__name__ if endpoint is not None else "unmatched",
+    )
+    if TIMING_HEADERS:
+        timings = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in spans.items()]
+        response.headers["Server-Timing"] = ", ".join(timings + [f"total;dur={elapsed * 1000:.2f}"])
+    return response
+
 class PipelineWrapper:
     def __init__(self) -> None:
         self.pipeline = None
         self.is_ready = False
 
     def start(self):
-        """Load the pipeline."""
-        with open("database/pipeline.pkl", "rb") as f:
-            self.pipeline = pickle.load(f)
-        self.is_ready = True
+        """Load the pipeline in the background, so the server answers right away."""
+        threading.Thread(target=self._load, daemon=True).start()
         return self
 
+    def _load(self):
+        """Serves the cached pipeline, warms it up, then refreshes it with new documents.
+
+        Workers started by serve() map the pipeline read-only and never refresh it.
+        """
+        from crawler.pipeline import shared
+
+        read_only = os.getenv("PIPELINE_READ_ONLY", "false").lower() in ("1", "true", "yes")
+        try:
+            if os.path.exists("database/pipeline.pkl"):
+                self.pipeline = shared.load("database/pipeline.pkl", writable=not read_only)
+                self.is_ready = True
+                logger.info("Loaded cached knowledge pipeline")
+        except Exception as e:
+            logger.error(f"Error loading cached pipeline: {e}")
+
+        if self.pipeline is not None:
+            self._warmup(self.pipeline)
+
+        if read_only or (
+            self.pipeline is not None
+            and os.getenv("CRAWL_ON_STARTUP", "true").lower() in ("0", "false", "no")
+        ):
+            return
+
+        knowledge_pipeline = initialize_knowledge_base()
+        if knowledge_pipeline is not None:
+            self._warmup(knowledge_pipeline)
+            # Requests see the previous pipeline or the updated one, never a partial update.
+            self.pipeline = knowledge_pipeline
+            self.is_ready = True
+
+    def _warmup(self, knowledge_pipeline):
+        try:
+            knowledge_pipeline.warmup()
+            logger.info("Warmed up knowledge pipeline")
+        except Exception as e:
+            logger.error(f"Error warming up pipeline: {e}")
+
     def search(
         self,
         q: str,
         tags: str,
+        filters: typing.Optional[typing.Dict] = None,
     ) -> typing.Dict:
         """Returns the documents."""
-        return self.pipeline.search(q=q, tags=tags)
+        return self.pipeline.search(q=q, tags=tags, filters=filters)
 
     def plot(
         self,
@@ -208,51 +320,295 @@ class PipelineWrapper:
         )
         return {"nodes": nodes, "links": links}
 
+    def plot_compact(
+        self,
+        q: str,
+        k_tags: int,
+        k_yens: int = 1,
+        k_walk: int = 3,
+    ) -> typing.Dict:
+        """Returns the graph in the compact wire format."""
+        from crawler.graph import GraphEncoder
+
+        graph = self.plot(q=q, k_tags=k_tags, k_yens=k_yens, k_walk=k_walk)
+        return GraphEncoder()(nodes=graph["nodes"], links=graph["links"])
+
+    def plot_stream(
+        self,
+        q: str,
+        k_tags: int,
+        k_yens: int = 1,
+        k_walk: int = 3,
+        interval: float = 0.05,
+    ) -> typing.Iterator[typing.Dict]:
+        """Yields the graph in compact increments, the query tags first, then at most one per interval."""
+        from crawler.graph import GraphEncoder
+
+        encoder = GraphEncoder()
+        nodes, links, flushed = [], [], None
+        for new_nodes, new_links in self.pipeline.plot_stream(
+            q=q, k_tags=k_tags, k_yens=k_yens, k_walk=k_walk
+        ):
+            nodes.extend(new_nodes)
+            links.extend(new_links)
+            if flushed is None or time.monotonic() - flushed >= interval:
+                yield encoder(nodes=nodes, links=links)
+                nodes, links, flushed = [], [], time.monotonic()
+        if nodes or links:
+            yield encoder(nodes=nodes, links=links)
+
 pw = PipelineWrapper()
 
+# Inference runs on a fixed pool rather than Starlette's threadpool, so concurrent
+# requests do not oversubscribe the cores.
+scheduler = Scheduler(
+    workers=int(os.getenv("INFERENCE_WORKERS", "2")),
+    timeout=float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "10")),
+    concurrency=int(os.getenv("INFERENCE_CONCURRENCY", "64")),
+)
+
+def cache_hit_ratios():
+    """Hit ratios of the LRU caches of the spelling engine."""
+    speller = pw.pipeline._speller if pw.pipeline is not None else None
+    if speller is None:
+        return {}
+    ratios = {}
+    for name in ("lookup", "suggest"):
+        info = getattr(speller, name).cache_info()
+        if info.hits + info.misses:
+            ratios[(("cache", f"spelling_{name}"),)] = info.hits / (info.hits + info.misses)
+    return ratios
+
+metrics.REGISTRY.describe("http_request_seconds", "Latency of HTTP requests, by endpoint.")
+metrics.REGISTRY.gauge("cache_hit_ratio", cache_hit_ratios, help="Hit ratio of in-process caches.")
+metrics.REGISTRY.gauge(
+    "scheduler_in_flight",
+    lambda: {(): len(scheduler.in_flight)},
+    help="Inference requests queued or running.",
+)
+
+def overloaded(error: QueueTimeout):
+    logger.warning(str(error))
+    return JSONResponse(status_code=503, content={"error": "Server is overloaded, try again"})
+
 @app.get("/status")
 async def get_status():
     """Check if the backend is ready."""
     return {"status": "ready" if pw.is_ready else "loading"}
 
 @app.get("/spelling/{q}")
-def get_spelling_suggestion(q: str):
+async def get_spelling_suggestion(q: str):
     """Get spelling suggestion for a query."""
     if not pw.is_ready:
         return {"error": "System is still initializing"}
-    
-    return pw.pipeline.get_spelling_suggestion(q)
 
-@app.get("/search/{sort}/{tags}/{k_tags}/{q}")
-def search(k_tags: int, tags: str, sort: bool, q: str):
-    """Search for documents."""
+    try:
+        return await scheduler(("spelling", q), pw.pipeline.get_spelling_suggestion, q)
+    except QueueTimeout as error:
+        return overloaded(error)
+
+@app.get("/autocomplete/{q}")
+def autocomplete(q: str):
+    """Complete the last words of a query with tags."""
     if not pw.is_ready:
         return {"error": "System is still initializing"}
-    
+
+    return pw.pipeline.autocomplete(q)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Latency histograms, candidate counts, batch sizes and cache hit ratios, for Prometheus."""
+    return metrics.REGISTRY.render()
+
+@app.get("/batching")
+async def batching():
+    """Batch size histograms of the encoder and the cross-encoder."""
+    if not pw.is_ready:
+        return {"error": "System is still initializing"}
+
+    return pw.pipeline.retriever.batching_statistics()
+
+def search_filters(tag: typing.List[str], date: typing.List[str]) -> typing.Optional[typing.Dict]:
+    """Filters of the tag and date query parameters: every tag, any year or month."""
+    if not tag and not date:
+        return None
+    return {"tags": sorted(set(tag)), "dates": sorted(set(date))}
+
+@app.get("/search/{sort}/{tags}/{k_tags}/{q}", response_class=ORJSONResponse)
+async def search(
+    k_tags: int,
+    tags: str,
+    sort: bool,
+    q: str,
+    tag: typing.List[str] = Query(default=[]),
+    date: typing.List[str] = Query(default=[]),
+):
+    """Search for documents, with the counts of their k_tags most frequent tags and of their years.
+
+    Repeated tag and date query parameters restrict results to documents with every tag
+    and from any of the dates, such as ?tag=distributed-systems&date=2024.
+    """
+    if not pw.is_ready:
+        return {"error": "System is still initializing"}
+
     tags = tags != "null"
-    documents = pw.search(q=q, tags=tags)
+    filters = search_filters(tag, date)
+    # The same pipeline for the whole request, even if an updated one replaces it meanwhile.
+    # Requests are only coalesced with requests to the same pipeline.
+    knowledge_pipeline = pw.pipeline
+    key = ("search", id(knowledge_pipeline), q, tags, json.dumps(filters))
+    try:
+        documents = await scheduler(key, knowledge_pipeline.search, q=q, tags=tags, filters=filters)
+    except QueueTimeout as error:
+        return overloaded(error)
     if bool(sort):
-        documents = [
-            document
-            for _, document in sorted(
-                [(document["date"], document) for document in documents],
-                key=lambda document: datetime.datetime.strptime(
-                    document[0], "%Y-%m-%d"
-                ),
-                reverse=True,
+        with metrics.span("date_sort"):
+            documents = knowledge_pipeline.retriever.sort_by_date(documents)
+    facets = knowledge_pipeline.facets(documents, k_tags=k_tags)
+    # A response, rather than a dict, is not converted by jsonable_encoder first.
+    with metrics.span("serialize"):
+        return ORJSONResponse({"documents": documents, "facets": facets})
+
+@app.get("/stream/search/{sort}/{tags}/{k_tags}/{q}")
+async def stream_search(
+    k_tags: int,
+    tags: str,
+    sort: bool,
+    q: str,
+    tag: typing.List[str] = Query(default=[]),
+    date: typing.List[str] = Query(default=[]),
+):
+    """Search for documents, streamed as NDJSON: BM25 results first, then the reranked ones."""
+    if not pw.is_ready:
+        return {"error": "System is still initializing"}
+
+    tags = tags != "null"
+    filters = search_filters(tag, date)
+    knowledge_pipeline = pw.pipeline
+
+    def sorted_documents(documents):
+        return knowledge_pipeline.retriever.sort_by_date(documents) if sort else documents
+
+    async def events():
+        # The rerank is queued first, the lexical stage is cheap enough to skip the queue.
+        reranked = asyncio.ensure_future(
+            scheduler(
+                ("search", id(knowledge_pipeline), q, tags, json.dumps(filters)),
+                knowledge_pipeline.search,
+                q=q,
+                tags=tags,
+                filters=filters,
             )
-        ]
-    return {"documents": documents}
+        )
+        try:
+            documents = await asyncio.to_thread(
+                knowledge_pipeline.lexical_search, q=q, tags=tags, filters=filters
+            )
+            yield event("lexical", sorted_documents(documents))
+
+            documents = await reranked
+            yield event(
+                "reranked",
+                sorted_documents(documents),
+                facets=knowledge_pipeline.facets(documents, k_tags=k_tags),
+            )
+        except QueueTimeout as error:
+            logger.warning(str(error))
+            yield orjson.dumps({"stage": "error", "error": "Server is overloaded, try again"}) + b"\n"
+        finally:
+            reranked.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def event(stage: str, documents: typing.List[typing.Dict], facets: typing.Optional[typing.Dict] = None) -> bytes:
+    payload = {"stage": stage, "documents": documents}
+    if facets is not None:
+        payload["facets"] = facets
+    return orjson.dumps(payload) + b"\n"
 
 @app.get("/plot/{k_tags}/{q}", response_class=ORJSONResponse)
-def plot(k_tags: int, q: str):
+async def plot(k_tags: int, q: str):
     """Plot tags."""
     if not pw.is_ready:
         return {"error": "System is still initializing"}
-    
-    return pw.plot(q=q, k_tags=k_tags)
+
+    try:
+        graph = await scheduler(("plot", q, k_tags), pw.plot, q=q, k_tags=k_tags)
+    except QueueTimeout as error:
+        return overloaded(error)
+    return ORJSONResponse(graph)
+
+@app.get("/plot/compact/{k_tags}/{q}", response_class=ORJSONResponse)
+async def plot_compact(k_tags: int, q: str):
+    """Plot tags, with dictionary-encoded nodes and flat links."""
+    if not pw.is_ready:
+        return {"error": "System is still initializing"}
+
+    try:
+        graph = await scheduler(("plot-compact", q, k_tags), pw.plot_compact, q=q, k_tags=k_tags)
+    except QueueTimeout as error:
+        return overloaded(error)
+    return ORJSONResponse(graph)
+
+@app.get("/stream/plot/{k_tags}/{q}")
+async def stream_plot(k_tags: int, q: str):
+    """Plot tags, streamed as NDJSON increments of the compact format."""
+    if not pw.is_ready:
+        return {"error": "System is still initializing"}
+
+    loop = asyncio.get_running_loop()
+    lines = asyncio.Queue()
+
+    def produce():
+        for increment in pw.plot_stream(q=q, k_tags=k_tags):
+            loop.call_soon_threadsafe(lines.put_nowait, orjson.dumps(increment) + b"\n")
+
+    async def events():
+        # Streams hold a worker while they run, they are never coalesced.
+        produced = asyncio.ensure_future(scheduler(object(), produce))
+        try:
+            while True:
+                line = asyncio.ensure_future(lines.get())
+                await asyncio.wait({line, produced}, return_when=asyncio.FIRST_COMPLETED)
+                if line.done():
+                    yield line.result()
+                    continue
+                line.cancel()
+                while not lines.empty():
+                    yield lines.get_nowait()
+                produced.result()
+                break
+        except QueueTimeout as error:
+            logger.warning(str(error))
+            yield orjson.dumps({"error": "Server is overloaded, try again"}) + b"\n"
+        finally:
+            produced.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @app.on_event("startup")
 def start():
     """Initialize the pipeline."""
-    return pw.start()
\ No newline at end of file
+    return pw.start()
+
+@app.on_event("shutdown")
+def stop():
+    """Stop the inference workers."""
+    scheduler.shutdown()
+
+def serve(host: str = "0.0.0.0", port: int = 5000, workers: int = 1):
+    """Serves the API, with several worker processes sharing one copy of the index.
+
+    With more than one worker, the pipeline is built or refreshed once here, then each
+    worker maps its arrays read-only from the buffers file of database/pipeline.pkl, so
+    postings, embeddings and the spelling dictionary are shared through the page cache.
+    """
+    import uvicorn
+
+    if workers > 1:
+        initialize_knowledge_base()
+        os.environ["PIPELINE_READ_ONLY"] = "true"
+    uvicorn.run("run:app", host=host, port=port, workers=workers)
+
+if __name__ == "__main__":
+    serve(workers=int(os.getenv("WORKERS", "1")))